@@ -12,12 +12,18 @@ SRC_DIR = SELF_DIR / Path("src")
 BUILD_DIR = SELF_DIR / Path("build")
 MPY_CROSS = "mpy-cross"
 MPREMOTE = "mpremote"
+# Native/viper code in .mpy needs the target arch: rv32imc (ESP32-C3, the joint boards),
+# xtensawin (classic ESP32). Without it fastpath_native fails to compile and the board runs
+# the pure-Python fastpath.
+DEFAULT_MARCH = "rv32imc"
+NODE_CONFIG_VERSION = 1  # config_store.NODE.version
 
 
 # Eveything but the main.py is compiled into mpy.
 # Destination is build/nodex
-# if node.json doesn't already exists, copy the node index into it.
-def compile_all(node_index: int) -> Path:
+# if node.json doesn't already exist, write the node index into it
+# (same layout as src/config_store.py writes, schema version included).
+def compile_all(node_index: int, march: str = DEFAULT_MARCH) -> Path:
     BUILD_DIR.mkdir(parents=True, exist_ok=True)
     build_folder = BUILD_DIR / Path(f"node{node_index}")
 
@@ -26,7 +32,8 @@ def compile_all(node_index: int) -> Path:
     for src_path in SRC_DIR.rglob("*.py"):
         rel_path = src_path.relative_to(SRC_DIR)
 
-        dest_path = build_folder / rel_path
+        # Flattened: the board imports everything from /, so src/webserver/webserver.py -> webserver.mpy
+        dest_path = build_folder / rel_path.name
         dest_path.parent.mkdir(parents=True, exist_ok=True)
 
         if rel_path == Path("main.py"):
@@ -37,7 +44,10 @@ def compile_all(node_index: int) -> Path:
             dest_path = dest_path.with_suffix(".mpy")
             print(f"Compiling {src_path}")
             try:
-                subprocess.run([MPY_CROSS, str(src_path), "-o", str(dest_path)], check=True)
+                cmd = [MPY_CROSS, str(src_path), "-o", str(dest_path)]
+                if march:
+                    cmd.append(f"-march={march}")
+                subprocess.run(cmd, check=True)
             except subprocess.CalledProcessError:
                 print(f"E: Failed to compile {src_path}")
             except Exception as e:
@@ -45,12 +55,12 @@ def compile_all(node_index: int) -> Path:
 
     # Create special Node config file.
     node_info_file = build_folder / Path("node.json")
-    if node_info_file.exists:
+    if node_info_file.exists():
         print(f"Node info {node_info_file} already exists, skipping")
     else:
         print(f"Genering node info file")
         with open(node_info_file, 'w') as f:
-            json.dump({"node_index": node_index}, f)
+            json.dump({"node_index": node_index, "_v": NODE_CONFIG_VERSION}, f)
 
     return build_folder
 
@@ -89,7 +99,14 @@ def main():
                         help="Serial port for mpremote (e.g. /dev/ttyUSB0) — optional positional")
     parser.add_argument("-p", "--port", dest="port", help="Serial port for mpremote (e.g. /dev/ttyUSB0)")
 
-    parser.add_argument("-n", "--node", type=int, required=True, help="the node index.")
+    parser.add_argument("-n",
+                        "--node",
+                        type=int,
+                        required=True,
+                        help="the node id, 1-based as in the chain tags; node n drives joint n - 1.")
+    parser.add_argument("--march",
+                        default=DEFAULT_MARCH,
+                        help="mpy-cross -march for native code (rv32imc, xtensawin; empty to skip)")
     parser.add_argument("--no-upload", action="store_true", help="Skip upload even if port is provided")
 
     args = parser.parse_args()
@@ -101,7 +118,7 @@ def main():
         print("E: Did not supply a node index!")
         exit(1)
 
-    build_folder = compile_all(node_index)
+    build_folder = compile_all(node_index, args.march)
 
     if port and not args.no_upload:
         upload_all(port, build_folder)
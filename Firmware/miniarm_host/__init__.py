@@ -0,0 +1,12 @@
+# Host-side tools for esp-miniarm (runs on CPython, never uploaded to the board).
+import sys
+from pathlib import Path
+
+FIRMWARE_SRC = Path(__file__).resolve().parent.parent / "src"
+
+
+def add_firmware_path():
+    # Make the firmware modules in src/ importable from host code.
+    src = str(FIRMWARE_SRC)
+    if src not in sys.path:
+        sys.path.insert(0, src)
@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+# Whole-arm simulator for evaluating control changes on the host.
+# All state is (B, N) NumPy arrays: N joints times B independent copies of the arm, so a
+# parameter sweep (B gain sets) costs about the same as one run. Per joint: DC motor with
+# breakaway deadband and first-order speed response, gearbox, and an output-shaft encoder
+# quantized to 12 bit (AS5600) or 14 bit (MT6701) like the firmware sees it.
+# Controllers:
+#   VectorCascade     - cascade.Cascade + pid_control.set_motor math, batched
+#   FirmwareCascade   - the real pid_control.CascadeLoop per joint (slow, for cross-checks)
+# Forward kinematics maps joint angles to the end effector with DH parameters.
+#   python -m miniarm_host.armsim --seconds 60
+#   python -m miniarm_host.armsim --sweep-vel-kp 0.02 0.2 8
+
+import argparse
+import time
+
+import numpy as np
+
+RES_AS5600 = 4096
+RES_MT6701 = 1 << 14
+FULL_SCALE = 1023.0  # motor_out.FULL_SCALE
+
+
+def _bn(value, shape, dtype=float):
+    # Scalar, per-joint (N,) or per-copy (B, N) -> (B, N) array.
+    return np.broadcast_to(np.asarray(value, dtype=dtype), shape).copy()
+
+
+def wrap(x, res):
+    """pid_control.angle_diff for arrays: wrap into [-res/2, res/2)."""
+    half = res // 2
+    return (x + half) % res - half
+
+
+# ========== Plant ==========
+
+
+class JointParams:
+    """
+    Plant parameters, each a scalar, (N,) or (B, N):
+    motor_rps_per_duty: motor no-load speed (rev/s) per duty count above the deadband
+    gear_ratio: motor turns per joint turn
+    tau: mechanical time constant (s)
+    deadband: breakaway duty; below it the joint does not move
+    flip: motor wired reversed (pid_control.motor_flip)
+    resolution: encoder counts per joint turn
+    noise_counts: std of the encoder noise (counts, before quantization)
+    """
+
+    def __init__(self,
+                 motor_rps_per_duty=0.15,
+                 gear_ratio=30.0,
+                 tau=0.03,
+                 deadband=120.0,
+                 flip=False,
+                 resolution=RES_MT6701,
+                 noise_counts=0.0):
+        self.motor_rps_per_duty = motor_rps_per_duty
+        self.gear_ratio = gear_ratio
+        self.tau = tau
+        self.deadband = deadband
+        self.flip = flip
+        self.resolution = resolution
+        self.noise_counts = noise_counts
+
+    def vel_per_duty(self):
+        """Steady joint speed per duty in counts/s, the quantity motor_char measures."""
+        return np.asarray(self.motor_rps_per_duty) / np.asarray(self.gear_ratio) * np.asarray(self.resolution)
+
+
+class ArmPlant:
+
+    def __init__(self, params, n_joints, batch=1, seed=0):
+        shape = (batch, n_joints)
+        self.shape = shape
+        # joint turns/s per duty
+        self.k = _bn(np.asarray(params.motor_rps_per_duty) / np.asarray(params.gear_ratio), shape)
+        self.tau = _bn(params.tau, shape)
+        self.deadband = _bn(params.deadband, shape)
+        self.sign = np.where(_bn(params.flip, shape, bool), -1.0, 1.0)
+        self.res = _bn(params.resolution, shape, np.int64)
+        self.noise = _bn(params.noise_counts, shape)
+        self.rng = np.random.default_rng(seed)
+        self.turns = np.zeros(shape)  # joint angle, turns (unwrapped)
+        self.vel = np.zeros(shape)  # turns/s
+        self.duty = np.zeros(shape)
+
+    def reset(self, turns=0.0):
+        self.turns = _bn(turns, self.shape)
+        self.vel[:] = 0.0
+        self.duty[:] = 0.0
+
+    def step(self, duty, dt):
+        """duty: raw H-bridge command (B, N), -1023..1023, as motor_out.MotorOutput.set() gets it."""
+        duty = np.clip(duty, -FULL_SCALE, FULL_SCALE)
+        self.duty = duty
+        mag = np.abs(duty) - self.deadband
+        drive = np.where(mag > 0, np.sign(duty) * mag, 0.0) * self.sign
+        # Exact first-order step, stable for any dt/tau.
+        a = 1.0 - np.exp(-dt / self.tau)
+        v_ss = self.k * drive
+        new_vel = self.vel + (v_ss - self.vel) * a
+        # Stiction: inside the deadband an already stopped joint stays stopped.
+        new_vel = np.where((drive == 0) & (np.abs(new_vel) < 1e-4), 0.0, new_vel)
+        self.turns += 0.5 * (self.vel + new_vel) * dt
+        self.vel = new_vel
+
+    def counts(self):
+        """Encoder reading per joint: single-turn counts 0..res-1, quantized like the chip."""
+        raw = self.turns * self.res
+        if self.noise.any():
+            raw = raw + self.rng.normal(0.0, 1.0, self.shape) * self.noise
+        return np.floor(raw).astype(np.int64) % self.res
+
+
+# ========== Controllers ==========
+
+
+class VectorCascade:
+    """
+    cascade.Cascade (outer position PI every `divider` ticks, inner velocity PI, both with
+    back-calculation) followed by pid_control.set_motor's flip + deadband compensation
+    (the full breakaway duty added to any nonzero command, as the firmware does).
+    Any gain may be (B, N) for sweeps. Works on the wrapped single-turn encoder counts.
+    """
+
+    def __init__(self, shape, param=None, deadband_comp=0.0, flip=False, **gains):
+        from . import add_firmware_path
+        add_firmware_path()
+        import cascade  # pure arithmetic, importable on the host
+
+        p = param or cascade.CascadeParam()
+        g = {
+            "pos_kp": p.pos_kp,
+            "pos_ki": p.pos_ki,
+            "vel_limit": p.vel_limit,
+            "vel_kp": p.vel_kp,
+            "vel_ki": p.vel_ki,
+            "out_limit": p.out_limit,
+            "vel_kff": p.vel_kff,
+            "vel_alpha": p.vel_alpha,
+        }
+        g.update(gains)
+        for name, value in g.items():
+            setattr(self, name, _bn(value, shape))
+        # PIStage default tracking gain: ki / kp
+        self.pos_kt = self._kt(self.pos_kp, self.pos_ki)
+        self.vel_kt = self._kt(self.vel_kp, self.vel_ki)
+        self.divider = int(p.divider)
+        self.deadband_comp = _bn(deadband_comp, shape)
+        self.sign = np.where(_bn(flip, shape, bool), -1.0, 1.0)
+        self.shape = shape
+        self.reset()
+
+    def reset(self, counts=None):
+        z = np.zeros(self.shape)
+        self.pos_i = z.copy()
+        self.vel_i = z.copy()
+        self.vel_cmd = z.copy()
+        self.vel_est = z.copy()
+        self.output = z.copy()
+        self.saturated = np.zeros(self.shape, bool)
+        self.tick = 0
+        self._outer_dt = 0.0
+        self.last = None if counts is None else np.array(counts)
+
+    @staticmethod
+    def _kt(kp, ki):
+        return np.where(kp != 0, ki / np.where(kp != 0, kp, 1.0), 0.0)
+
+    @staticmethod
+    def _pi(kp, ki, kt, integ, limit, err, dt, ff):
+        u = kp * err + integ + ff
+        us = np.clip(u, -limit, limit)
+        integ += (ki * err + kt * (us - u)) * dt
+        return us, u != us
+
+    def update(self, counts, target, res, dt, vel_ff=0.0):
+        """counts/target: (B, N) encoder counts; returns raw motor duty (B, N)."""
+        if self.last is None:
+            self.last = counts.copy()
+        err = wrap(target - counts, res)
+        vel = wrap(counts - self.last, res) / dt
+        self.last = counts.copy()
+        self.vel_est += self.vel_alpha * (vel - self.vel_est)
+
+        self._outer_dt += dt
+        if self.tick == 0:
+            out, _ = self._pi(self.pos_kp, self.pos_ki, self.pos_kt, self.pos_i, self.vel_limit, err,
+                              self._outer_dt, 0.0)
+            self.vel_cmd = out + vel_ff
+            self._outer_dt = 0.0
+        self.tick = (self.tick + 1) % self.divider
+
+        out, sat = self._pi(self.vel_kp, self.vel_ki, self.vel_kt, self.vel_i, self.out_limit,
+                            self.vel_cmd - self.vel_est, dt, self.vel_kff * self.vel_cmd)
+        self.output = out
+        self.saturated = sat
+        self.err = err
+        # set_motor(): flip, then deadband per raw direction
+        raw = out * self.sign
+        return np.where(raw > 0, raw + self.deadband_comp, np.where(raw < 0, raw - self.deadband_comp, 0.0))
+
+
+class _SimEncoder:
+    # encoders.Encoder interface over one plant joint.
+    name = "sim"
+
+    def __init__(self, resolution):
+        self.resolution = resolution
+        self.counts = 0
+        self.valid = True
+
+    def read(self):
+        return self.counts
+
+
+class _SimMotor:
+    # motor_out.MotorOutput.set() without the PWM pins.
+    power = 0.0
+
+    def set(self, power):
+        self.power = max(-FULL_SCALE, min(FULL_SCALE, power))
+
+    def coast(self):
+        self.power = 0.0
+
+
+class FirmwareCascade:
+    """
+    Runs the firmware's own pid_control.CascadeLoop for every (copy, joint). pid_control
+    keeps one joint in module globals, so they are swapped in before each joint's tick.
+    Needs miniarm_host.fakes; expect roughly 20-50 us per joint tick.
+    """
+
+    _SWAP = ("encoder", "motor", "safety", "ENC_RES", "ENC_HALF", "motor_flip", "deadband_fwd",
+             "deadband_rev", "watchdog")
+
+    def __init__(self, shape, resolution, deadband_comp=0.0, flip=False, interval_us=1000):
+        from . import fakes, add_firmware_path
+        self.clock = fakes.install()
+        add_firmware_path()
+        import pid_control
+        import supervisor
+        self.pc = pid_control
+        self.shape = shape
+        res = _bn(resolution, shape, np.int64)
+        db = _bn(deadband_comp, shape)
+        fl = _bn(flip, shape, bool)
+        self.joints = []
+        saved = {k: getattr(pid_control, k) for k in self._SWAP}
+        try:
+            for b in range(shape[0]):
+                for j in range(shape[1]):
+                    g = {
+                        "encoder": _SimEncoder(int(res[b, j])),
+                        "motor": _SimMotor(),
+                        "safety": supervisor.Supervisor(),
+                        "ENC_RES": int(res[b, j]),
+                        "ENC_HALF": int(res[b, j]) // 2,
+                        "motor_flip": bool(fl[b, j]),
+                        "deadband_fwd": float(db[b, j]),
+                        "deadband_rev": float(db[b, j]),
+                        "watchdog": None,
+                    }
+                    self._load(g)
+                    self.joints.append((g, pid_control.CascadeLoop(interval_us)))
+        finally:
+            self._load(saved)
+        self.output = np.zeros(shape)
+        self.err = np.zeros(shape)
+
+    def _load(self, g):
+        for k, v in g.items():
+            setattr(self.pc, k, v)
+
+    def reset(self, counts=None):
+        pass
+
+    def update(self, counts, target, res, dt, vel_ff=0.0):
+        self.clock.advance_us(int(dt * 1e6))
+        duty = np.zeros(self.shape)
+        vel_ff = _bn(vel_ff, self.shape)
+        saved = {k: getattr(self.pc, k) for k in self._SWAP}
+        try:
+            n = self.shape[1]
+            for i, (g, loop) in enumerate(self.joints):
+                b, j = divmod(i, n)
+                g["encoder"].counts = int(counts[b, j])
+                self._load(g)
+                loop.tick(int(target[b, j]), float(vel_ff[b, j]))
+                duty[b, j] = g["motor"].power
+                self.output[b, j] = loop.output
+                self.err[b, j] = loop.err
+        finally:
+            self._load(saved)
+        return duty
+
+
+# ========== Kinematics ==========
+
+# (a, alpha, d) per joint, meters/radians: base yaw, shoulder pitch, elbow pitch.
+MINIARM_DH = [(0.0, np.pi / 2, 0.06), (0.10, 0.0, 0.0), (0.10, 0.0, 0.0)]
+
+
+def forward_kinematics(angles, dh=MINIARM_DH, offsets=None):
+    """
+    angles: (..., N) joint angles in radians -> (..., 3) end-effector position.
+    Standard DH; every leading dimension (batch, time) is evaluated at once.
+    """
+    angles = np.asarray(angles, dtype=float)
+    if offsets is not None:
+        angles = angles + np.asarray(offsets)
+    lead = angles.shape[:-1]
+    T = np.broadcast_to(np.eye(4), lead + (4, 4)).copy()
+    for j, (a, alpha, d) in enumerate(dh):
+        th = angles[..., j]
+        ct, st = np.cos(th), np.sin(th)
+        ca, sa = np.cos(alpha), np.sin(alpha)
+        A = np.zeros(lead + (4, 4))
+        A[..., 0, 0] = ct
+        A[..., 0, 1] = -st * ca
+        A[..., 0, 2] = st * sa
+        A[..., 0, 3] = a * ct
+        A[..., 1, 0] = st
+        A[..., 1, 1] = ct * ca
+        A[..., 1, 2] = -ct * sa
+        A[..., 1, 3] = a * st
+        A[..., 2, 1] = sa
+        A[..., 2, 2] = ca
+        A[..., 2, 3] = d
+        A[..., 3, 3] = 1.0
+        T = T @ A
+    return T[..., :3, 3]
+
+
+# ========== Simulation ==========
+
+
+class Trace:
+    """Recorded run; arrays are (T, B, N) except t (T,) and ee (T, B, 3)."""
+
+    def __init__(self, t, target, counts, turns, duty, output, res, dh):
+        self.t = t
+        self.target = target
+        self.counts = counts
+        self.turns = turns
+        self.duty = duty
+        self.output = output
+        self.res = res
+        self.dh = dh
+        self._ee = None
+
+    @property
+    def err(self):
+        return wrap(self.target - self.counts, self.res)
+
+    @property
+    def angles(self):
+        return self.turns * 2 * np.pi
+
+    @property
+    def ee(self):
+        if self._ee is None:
+            self._ee = forward_kinematics(self.angles, self.dh)
+        return self._ee
+
+
+class ArmSim:
+    """
+    plant + controller on a fixed tick (interval_us, like CascadeLoop). The target is
+    either a (B, N)/(N,) array of counts or target(t) -> counts, optionally returning
+    (counts, vel_ff).
+    """
+
+    def __init__(self, n_joints=3, batch=1, params=None, controller=None, interval_us=1000, dh=MINIARM_DH,
+                 seed=0, **gains):
+        self.params = params or JointParams()
+        self.plant = ArmPlant(self.params, n_joints, batch, seed)
+        self.dt = interval_us / 1e6
+        self.dh = dh
+        if controller is None:
+            # Compensation as motor_char would have measured it.
+            controller = VectorCascade(self.plant.shape,
+                                       deadband_comp=self.params.deadband,
+                                       flip=self.params.flip,
+                                       **gains)
+        self.ctl = controller
+
+    def run(self, target, seconds, record_every=1, start_turns=0.0):
+        plant, ctl, dt = self.plant, self.ctl, self.dt
+        plant.reset(start_turns)
+        counts = plant.counts()
+        ctl.reset(counts)
+        res = plant.res
+        steps = int(round(seconds / dt))
+        n_rec = steps // record_every + 1
+        shape = plant.shape
+        rec = {k: np.zeros((n_rec, ) + shape) for k in ("target", "counts", "turns", "duty", "output")}
+        t_rec = np.zeros(n_rec)
+        fixed = None if callable(target) else _bn(target, shape)
+        vel_ff = 0.0
+        r = 0
+        for i in range(steps + 1):
+            t = i * dt
+            if fixed is None:
+                tgt = target(t)
+                if isinstance(tgt, tuple):
+                    tgt, vel_ff = tgt
+                tgt = _bn(tgt, shape) % res
+            else:
+                tgt = fixed
+            duty = ctl.update(counts, tgt, res, dt, vel_ff)
+            if i % record_every == 0:
+                t_rec[r] = t
+                rec["target"][r] = tgt
+                rec["counts"][r] = counts
+                rec["turns"][r] = plant.turns
+                rec["duty"][r] = duty
+                rec["output"][r] = ctl.output
+                r += 1
+            plant.step(duty, dt)
+            counts = plant.counts()
+        return Trace(t_rec[:r], rec["target"][:r], rec["counts"][:r], rec["turns"][:r], rec["duty"][:r],
+                     rec["output"][:r], res, self.dh)
+
+
+def sweep(gain, values, target, seconds=1.0, n_joints=3, params=None, **kw):
+    """Run one batch with `gain` (a CascadeParam field) set to each of `values`. Returns Trace."""
+    values = np.asarray(values, dtype=float)
+    gains = {gain: np.repeat(values[:, None], n_joints, axis=1)}
+    sim = ArmSim(n_joints, len(values), params, **gains, **kw)
+    return sim.run(target, seconds)
+
+
+def iae(trace):
+    """Integrated absolute error per copy and joint (counts*s), (B, N)."""
+    dt = trace.t[1] - trace.t[0] if len(trace.t) > 1 else 0.0
+    return np.abs(trace.err).sum(axis=0) * dt
+
+
+# ========== CLI ==========
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the miniarm joints with the cascade controller.")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--joints", type=int, default=3)
+    parser.add_argument("--step", type=int, default=2000, help="step size in counts")
+    parser.add_argument("--as5600", action="store_true", help="12-bit encoder instead of the 14-bit MT6701")
+    parser.add_argument("--firmware", action="store_true", help="use the real pid_control.CascadeLoop")
+    parser.add_argument("--sweep-vel-kp", type=float, nargs=3, metavar=("LO", "HI", "N"),
+                        help="sweep the inner loop kp over N values")
+    args = parser.parse_args()
+
+    res = RES_AS5600 if args.as5600 else RES_MT6701
+    params = JointParams(resolution=res)
+    n = args.joints
+    step = np.full(n, args.step)
+
+    def target(t):
+        # A step every second, alternating direction.
+        return step * (int(t) % 2)
+
+    t0 = time.perf_counter()
+    if args.sweep_vel_kp:
+        lo, hi, count = args.sweep_vel_kp
+        values = np.linspace(lo, hi, int(count))
+        trace = sweep("vel_kp", values, target, args.seconds, n, params)
+        cost = iae(trace).mean(axis=1)
+        for v, c in zip(values, cost):
+            print("vel_kp %.4f  IAE %.1f" % (v, c))
+    else:
+        ctl = None
+        if args.firmware:
+            ctl = FirmwareCascade((1, n), res, deadband_comp=params.deadband)
+        sim = ArmSim(n, 1, params, ctl)
+        trace = sim.run(target, args.seconds, record_every=10)
+        print("final counts", trace.counts[-1, 0], "ee (m)", np.round(trace.ee[-1, 0], 4))
+        print("IAE per joint", np.round(iae(trace)[0], 1))
+    wall = time.perf_counter() - t0
+    print("simulated %.1f s in %.2f s wall (%.0fx real time)" % (args.seconds, wall, args.seconds / wall))
+
+
+if __name__ == "__main__":
+    main()
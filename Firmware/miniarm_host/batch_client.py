@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# Poll several joints through /api/batch: one request per joint per round, all joints in
+# parallel, binary responses by default.
+#   python -m miniarm_host.batch_client 192.168.1.50 192.168.1.51 -q position,state,safety
+#   python -m miniarm_host.batch_client 192.168.1.50 --json -q system,metrics -n 1
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from . import add_firmware_path
+
+add_firmware_path()
+import api_batch  # noqa: E402
+
+
+async def batch(host, queries, commands=None, binary=True, port=80, timeout=2.0):
+    """One POST /api/batch round trip; returns the decoded {name: value} dict."""
+    body = json.dumps({"q": list(queries), "do": commands or []}).encode()
+    accept = api_batch.CONTENT_TYPE if binary else "application/json"
+    head = ("POST /api/batch HTTP/1.1\r\nHost: %s\r\nAccept: %s\r\nContent-Type: application/json\r\n"
+            "Content-Length: %d\r\n\r\n" % (host, accept, len(body)))
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        writer.write(head.encode() + body)
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    status, _, payload = response.partition(b"\r\n\r\n")
+    if b" 200 " not in status.split(b"\r\n", 1)[0]:
+        raise IOError("%s: %s" % (host, status.split(b"\r\n", 1)[0].decode()))
+    return api_batch.decode(payload) if binary else json.loads(payload)
+
+
+async def poll(hosts, queries, binary=True, timeout=2.0):
+    """{host: result or exception} for one round over every joint."""
+    results = await asyncio.gather(*[batch(h, queries, binary=binary, timeout=timeout) for h in hosts],
+                                   return_exceptions=True)
+    return dict(zip(hosts, results))
+
+
+async def _run(args):
+    queries = api_batch.parse_queries(args.queries)
+    n = 0
+    while not args.count or n < args.count:
+        t0 = time.perf_counter()
+        round_ = await poll(args.hosts, queries, not args.json, args.timeout)
+        dt = (time.perf_counter() - t0) * 1e3
+        for host, res in round_.items():
+            print("%s %s" % (host, res if isinstance(res, Exception) else json.dumps(res)))
+        print("round %d: %.1f ms" % (n, dt), file=sys.stderr)
+        n += 1
+        if not args.count or n < args.count:
+            await asyncio.sleep(args.interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Poll esp-miniarm joints through /api/batch.")
+    parser.add_argument("hosts", nargs="+", help="joint hostnames/IPs")
+    parser.add_argument("-q", "--queries", default="position,state,safety",
+                        help="comma separated, from: %s" % ",".join(api_batch.QUERIES))
+    parser.add_argument("-i", "--interval", type=float, default=0.5, help="seconds between rounds")
+    parser.add_argument("-n", "--count", type=int, default=0, help="stop after N rounds (0 = forever)")
+    parser.add_argument("--json", action="store_true", help="ask for JSON instead of the binary format")
+    parser.add_argument("--timeout", type=float, default=2.0)
+    args = parser.parse_args()
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# Host check of the UART chain receive path: chain_uart.ChainReceiver on fakes.FakeUART.
+# A frame that arrives in pieces (with line noise in front, and chunks longer than the
+# receiver's scratch buffer) must reach the handlers once and whole; a setpoint frame must
+# survive three hops at MAX_FRAME with every node's state appended; and a frame that
+# outgrows the buffer must be counted and dropped instead of forwarded truncated.
+#   python -m miniarm_host.chain_uart_check       # exit 1 on a mismatch
+
+import contextlib
+import io
+import sys
+
+from . import fakes, add_firmware_path
+from .simchain import SimNode
+
+fakes.install()
+add_firmware_path()
+import chain_proto  # noqa: E402
+import chain_uart  # noqa: E402
+
+START = chain_uart.START
+END = chain_uart.END
+
+
+def check_reassembly():
+    bad = []
+    uart = fakes.FakeUART()
+    rx = chain_uart.ChainReceiver(uart, node_id=2)
+    got = []
+    rx.add_handler(lambda f: got.append(bytes(f.view())))
+    if not rx.start():
+        return ["receiver did not hook the RX interrupt"]
+    body = b'x' * 50 + b'ESTOP?' + b'y' * 30  # longer than the 32-byte scratch buffer
+    wire = b'\x00noise' + START + body + END
+    for i in range(0, len(wire), 7):
+        uart.inject(wire[i:i + 7])
+    if got != [START + b'- via [2]' + body]:
+        bad.append("reassembled %r" % got)
+    uart.inject(START + b'second' + END + START + b'third' + END)
+    if [g[len(START) + 9:] for g in got[1:]] != [b'second', b'third']:
+        bad.append("back-to-back frames %r" % got[1:])
+    if rx.frames != 3 or rx.overflows or rx.ring.dropped:
+        bad.append("counters: frames %d overflows %d dropped %d" % (rx.frames, rx.overflows, rx.ring.dropped))
+    return bad
+
+
+def build_chain(n, max_frame=chain_uart.MAX_FRAME):
+    """[(receiver, uart, sim joint)] for nodes 1..n, each forwarding on its own FakeUART."""
+    out = []
+    for node_id in range(1, n + 1):
+        uart = fakes.FakeUART()
+        rx = chain_uart.ChainReceiver(uart, node_id=node_id, max_frame=max_frame)
+        sim = SimNode(node_id - 1, node_id=node_id, tau=1e-9)
+        rx.add_handler(chain_proto.setpoint_handler(sim.joint, sim.command, sim.read_state))
+        rx.add_handler(rx.forward)
+        rx.start()
+        out.append((rx, uart, sim))
+    return out
+
+
+def pass_frame(chain, payload):
+    """Bytes the last node puts on the wire."""
+    data = START + payload + END
+    for _, uart, _ in chain:
+        uart.inject(data)
+        data = bytes(uart.tx)
+        uart.tx[:] = b''
+    return data
+
+
+def check_setpoints():
+    bad = []
+    n = chain_uart.CHAIN_NODES
+    chain = build_chain(n)
+    # Worst case the sizing is meant for: multi-turn positions and large velocities.
+    setpoints = [(-1000000 - j, -10000) for j in range(n)]
+    out = pass_frame(chain, chain_proto.format_setpoints(65535, setpoints))
+    if not out.endswith(END) or len(out) > chain_uart.MAX_FRAME:
+        bad.append("%d-node frame: %d bytes, MAX_FRAME %d" % (n, len(out), chain_uart.MAX_FRAME))
+    states = chain_proto.parse_states(out[len(START):-len(END)])
+    for rx, _, sim in chain:
+        want = setpoints[sim.joint][0]
+        if sim.target != want or states.get(sim.joint, (None, ))[0] != want:
+            bad.append("node %d: target %r, reported %r" % (sim.node_id, sim.target, states.get(sim.joint)))
+        if rx.overflows:
+            bad.append("node %d: %d overflows" % (sim.node_id, rx.overflows))
+    return bad
+
+
+def check_overflow():
+    bad = []
+    chain = build_chain(3, max_frame=60)
+    out = pass_frame(chain, chain_proto.format_setpoints(1, [(100, 0), (200, 0), (300, 0)]))
+    # Node 2's state token pushes the frame past 60 bytes: it is dropped there, not cut.
+    if out or [rx.overflows for rx, _, _ in chain] != [0, 1, 0]:
+        bad.append("overflow: forwarded %r, overflows %r" % (out, [rx.overflows for rx, _, _ in chain]))
+    return bad
+
+
+def check():
+    """List of failure messages; empty when every case passed."""
+    return check_reassembly() + check_setpoints() + check_overflow()
+
+
+def main():
+    with contextlib.redirect_stdout(io.StringIO()):  # overflow reports
+        bad = check()
+    for msg in bad:
+        print("FAIL", msg)
+    print("uart chain: %s" % ("FAIL" if bad else "ok"))
+    sys.exit(1 if bad else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+# Closed-loop regression suite: runs standard moves through the real pid_control code
+# (pid_run, cascade_run, CascadeLoop.tick) against a simulated joint and compares
+# step-response metrics with the stored baseline.
+#   python -m miniarm_host.control_regress            # check, exit 1 on regression
+#   python -m miniarm_host.control_regress --update   # accept current results as baseline
+# The joint is an armsim.ArmPlant advanced lazily to the fake clock every time the
+# firmware reads the encoder or sets the motor, so blocking loops run unmodified.
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from . import fakes, add_firmware_path
+from .armsim import ArmPlant, JointParams, FULL_SCALE
+
+BASELINE_FILE = Path(__file__).resolve().parent / "control_baseline.json"
+
+# metric -> (relative, absolute) allowance; every metric is lower-is-better and regresses
+# when new > baseline * (1 + relative) + absolute. CPU time is host time, hence loose.
+TOLERANCES = {
+    "rise_ms": (0.15, 5.0),
+    "settle_ms": (0.15, 10.0),
+    "overshoot_pct": (0.20, 1.0),
+    "sse_counts": (0.25, 0.5),
+    "sat_ms": (0.20, 10.0),
+    "rms_err": (0.15, 2.0),
+    "max_err": (0.15, 5.0),
+    "fault": (0.0, 0.0),
+    "cpu_us_per_tick": (0.50, 5.0),
+}
+
+SETTLE_FRAC = 0.02
+SETTLE_MIN_COUNTS = 5
+SAT_FRAC = 0.99
+
+# ========== Simulated joint ==========
+
+
+class SimJoint:
+    """One ArmPlant joint behind the encoder/motor objects pid_control expects."""
+
+    def __init__(self, clock, params=None, sub_us=250, read_us=40):
+        self.clock = clock
+        self.read_us = read_us
+        self.params = params or JointParams()
+        self.plant = ArmPlant(self.params, 1, 1)
+        self.res = int(self.plant.res[0, 0])
+        self.sub_us = sub_us
+        self.t_us = clock.now_us()
+        self.duty = np.zeros((1, 1))
+        self.plant_s = 0.0
+        self.log = []  # (t_us, unwrapped counts, duty) per motor command
+        self.resolution = self.res
+        self.name = "sim"
+        self.valid = True
+        self.counts = 0
+
+    def _advance(self):
+        t0 = time.perf_counter()
+        now = self.clock.now_us()
+        dt = self.sub_us / 1e6
+        while self.t_us + self.sub_us <= now:
+            self.plant.step(self.duty, dt)
+            self.t_us += self.sub_us
+        self.plant_s += time.perf_counter() - t0
+
+    def position(self):
+        """Unwrapped joint position in counts (for metrics, not seen by the firmware)."""
+        return float(self.plant.turns[0, 0] * self.res)
+
+    # encoders.Encoder
+    def read(self):
+        # A real read takes bus time; also keeps the firmware's dt from being zero.
+        self.clock.advance_us(self.read_us)
+        self._advance()
+        self.counts = int(self.plant.counts()[0, 0])
+        return self.counts
+
+    # motor_out.MotorOutput
+    def set(self, power):
+        self._advance()
+        power = max(-FULL_SCALE, min(FULL_SCALE, power))
+        self.duty[0, 0] = power
+        self.log.append((self.clock.now_us(), self.position(), power))
+
+    def coast(self):
+        self.set(0)
+
+
+# ========== Cases ==========
+
+
+def _step_legs(pc, joint, runner, legs, duration_ms, **kw):
+    # Each leg moves `delta` counts from wherever the previous one ended.
+    out = []
+    for delta in legs:
+        start = joint.position()
+        t0 = joint.clock.now_us()
+        target = pc.round_angle(pc.read_encoder() + delta)
+        runner(target, duration_ms, **kw)
+        out.append((t0, start, start + delta, duration_ms))
+    return out
+
+
+# pid_run gains for the simulated joint (JointParams defaults: 14-bit encoder, 30:1). The
+# PIDParam defaults saturate on it and limit-cycle for the whole run, so the step never settles;
+# pid_default_step runs them anyway so a change to the shipped gains still shows up here.
+SIM_PID_GAINS = (1.0, 4.0, 0.02)
+
+
+def case_pid_step(pc, joint, delta, gains=SIM_PID_GAINS):
+    p = pc.pid_param
+    saved = (p.kp, p.ki, p.kd)
+    p.kp, p.ki, p.kd = gains
+    try:
+        return _step_legs(pc, joint, pc.pid_run, [delta], 2000, interval_us=10000)
+    finally:
+        p.kp, p.ki, p.kd = saved
+
+
+def case_cascade_step(pc, joint, delta):
+    return _step_legs(pc, joint, pc.cascade_run, [delta], 1500, interval_us=1000)
+
+
+def case_cascade_multi_turn(pc, joint):
+    # Three legs of ~0.37 turn each cross the encoder wrap at least once.
+    return _step_legs(pc, joint, pc.cascade_run, [6000, 6000, 6000], 1500, interval_us=1000)
+
+
+def case_cascade_sine(pc, joint, amplitude=1500, freq=1.0, seconds=3.0, interval_us=1000):
+    # Tracking through CascadeLoop.tick, the path the threaded runtime uses.
+    loop = pc.CascadeLoop(interval_us)
+    center = joint.position()
+    base = pc.read_encoder()
+    w = 2 * math.pi * freq
+    t0 = joint.clock.now_us()
+    ref = []
+    for i in range(int(seconds * 1e6 / interval_us)):
+        t = i * interval_us / 1e6
+        offset = amplitude * math.sin(w * t)
+        loop.tick(pc.round_angle(base + int(round(offset))), amplitude * w * math.cos(w * t))
+        ref.append((joint.clock.now_us(), center + offset))
+        joint.clock.advance_us(interval_us)
+    pc.set_motor(0)
+    return {"t0": t0, "ref": ref}
+
+
+def case_teach_multi_turn(pc, joint, turns=1.5, seconds=3.0, interval_ms=20, lead_in_ms=200):
+    # Teach round trip: a constant-speed recording of 1.5 turns compresses to a couple of
+    # keyframes far more than half a turn apart; replay must still go forward through the wrap.
+    import teach
+    res = joint.res
+    base = pc.read_encoder()
+    n = int(seconds * 1000 / interval_ms)
+    center = joint.position()
+    with tempfile.TemporaryDirectory() as d:
+        cwd = os.getcwd()
+        os.chdir(d)
+        try:
+            with open(teach.TEACH_FILE % 0, "wb") as f:
+                w = teach.KeyframeWriter(f, interval_ms)
+                for i in range(n + 1):
+                    w.add(base + round(turns * res * i / n))
+                w.close()
+            t0 = joint.clock.now_us()
+            pc.teach_replay(0, lead_in_ms=lead_in_ms)
+        finally:
+            os.chdir(cwd)
+    ramp_t0 = t0 + lead_in_ms * 1000
+    ref = [(t0, center)]
+    for i in range(n + 1):
+        ref.append((ramp_t0 + i * interval_ms * 1000, center + turns * res * i / n))
+    return {"t0": t0, "ref": ref}
+
+
+CASES = {
+    "pid_small_step": lambda pc, j: case_pid_step(pc, j, 200),
+    "pid_large_step": lambda pc, j: case_pid_step(pc, j, 4000),
+    # The class attributes, not pid_param: those are the gains a fresh boot runs.
+    "pid_default_step":
+    lambda pc, j: case_pid_step(pc, j, 4000, (pc.PIDParam.kp, pc.PIDParam.ki, pc.PIDParam.kd)),
+    "cascade_small_step": lambda pc, j: case_cascade_step(pc, j, 200),
+    "cascade_large_step": lambda pc, j: case_cascade_step(pc, j, 4000),
+    "cascade_multi_turn": case_cascade_multi_turn,
+    "cascade_sine": case_cascade_sine,
+    "teach_multi_turn": case_teach_multi_turn,
+}
+
+# ========== Metrics ==========
+
+
+def _log_arrays(joint, t_from, t_to):
+    log = [r for r in joint.log if t_from <= r[0] < t_to]
+    if not log:
+        return np.zeros(0), np.zeros(0), np.zeros(0)
+    a = np.asarray(log, dtype=float)
+    return a[:, 0], a[:, 1], a[:, 2]
+
+
+def _sat_ms(t, duty):
+    if len(t) < 2:
+        return 0.0
+    dt = np.diff(t, append=t[-1])
+    return float(dt[np.abs(duty) >= SAT_FRAC * FULL_SCALE].sum() / 1000.0)
+
+
+def step_metrics(joint, t0, start, target, duration_ms):
+    t, pos, duty = _log_arrays(joint, t0, t0 + duration_ms * 1000)
+    span = target - start
+    if len(t) == 0 or span == 0:
+        return {}
+    t_ms = (t - t0) / 1000.0
+    frac = (pos - start) / span
+    i10 = np.argmax(frac >= 0.1) if (frac >= 0.1).any() else None
+    i90 = np.argmax(frac >= 0.9) if (frac >= 0.9).any() else None
+    rise = t_ms[i90] - t_ms[i10] if i10 is not None and i90 is not None else float(duration_ms)
+    band = max(SETTLE_FRAC * abs(span), SETTLE_MIN_COUNTS)
+    outside = np.nonzero(np.abs(pos - target) > band)[0]
+    if len(outside) == 0:
+        settle = 0.0
+    elif outside[-1] == len(pos) - 1:
+        settle = float(duration_ms)  # never settled
+    else:
+        settle = t_ms[outside[-1] + 1]
+    overshoot = max(0.0, float(np.max((pos - target) * np.sign(span)))) / abs(span) * 100.0
+    tail = pos[len(pos) - max(1, len(pos) // 10):]
+    return {
+        "rise_ms": float(rise),
+        "settle_ms": float(settle),
+        "overshoot_pct": overshoot,
+        "sse_counts": float(np.mean(np.abs(tail - target))),
+        "sat_ms": _sat_ms(t, duty),
+    }
+
+
+def tracking_metrics(joint, run):
+    ref = np.asarray(run["ref"], dtype=float)
+    t, pos, duty = _log_arrays(joint, run["t0"], ref[-1, 0] + 1)
+    want = np.interp(t, ref[:, 0], ref[:, 1])
+    err = pos - want
+    # First period is the pull-in, keep it out of the tracking numbers.
+    keep = t >= t[0] + 1e6
+    return {
+        "rms_err": float(np.sqrt(np.mean(err[keep]**2))),
+        "max_err": float(np.max(np.abs(err[keep]))),
+        "sat_ms": _sat_ms(t, duty),
+    }
+
+
+def run_case(name, params=None):
+    clock = fakes.install()
+    add_firmware_path()
+    import pid_control as pc
+    from supervisor import safety
+
+    joint = SimJoint(clock, params)
+    pc.set_encoder(joint)
+    pc.motor = joint
+    pc.deadband_fwd = pc.deadband_rev = joint.params.deadband
+    pc.motor_flip = False
+    pc.watchdog = None
+    safety.reset()
+
+    wall0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        run = CASES[name](pc, joint)
+    wall = time.perf_counter() - wall0 - joint.plant_s
+    ticks = max(1, len(joint.log))
+
+    if isinstance(run, dict):
+        metrics = tracking_metrics(joint, run)
+    else:
+        legs = [step_metrics(joint, *leg) for leg in run]
+        # Worst leg per metric (sat_ms adds up over the legs).
+        metrics = {k: max(m[k] for m in legs) for k in legs[0]}
+        metrics["sat_ms"] = sum(m["sat_ms"] for m in legs)
+    metrics["fault"] = float(safety.fault)
+    metrics["cpu_us_per_tick"] = wall / ticks * 1e6
+    safety.reset()
+    return {k: round(v, 3) for k, v in metrics.items()}
+
+
+# ========== Baseline comparison ==========
+
+
+def compare(results, baseline):
+    """[(case, metric, new, old, limit)] for every metric beyond its tolerance."""
+    bad = []
+    for case, metrics in results.items():
+        base = baseline.get(case)
+        if base is None:
+            continue
+        for metric, new in metrics.items():
+            if metric not in base:
+                continue
+            rel, ab = TOLERANCES.get(metric, (0.1, 0.0))
+            old = base[metric]
+            limit = old * (1 + rel) + ab
+            if new > limit:
+                bad.append((case, metric, new, old, limit))
+    return bad
+
+
+def load_baseline(path=BASELINE_FILE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Closed-loop control regression suite (simulated joint).")
+    parser.add_argument("--case", action="append", choices=sorted(CASES), help="run only these cases")
+    parser.add_argument("--update", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument("--no-cpu", action="store_true", help="ignore cpu_us_per_tick (noisy CI hosts)")
+    args = parser.parse_args()
+
+    names = args.case or list(CASES)
+    baseline = load_baseline(args.baseline)
+    results = {}
+    for name in names:
+        results[name] = run_case(name)
+        old = baseline.get(name, {})
+        print(name)
+        for metric, value in results[name].items():
+            ref = " (baseline %.2f)" % old[metric] if metric in old else ""
+            print("  %-16s %10.2f%s" % (metric, value, ref))
+
+    if args.update:
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print("baseline written to %s" % args.baseline)
+        return
+
+    if args.no_cpu:
+        for m in results.values():
+            m.pop("cpu_us_per_tick", None)
+    bad = compare(results, baseline)
+    for case, metric, new, old, limit in bad:
+        print("REGRESSION %s.%s: %.2f > %.2f (baseline %.2f)" % (case, metric, new, limit, old))
+    missing = [n for n in names if n not in baseline]
+    if missing:
+        print("no baseline for: %s (run with --update)" % ", ".join(missing))
+    sys.exit(1 if bad else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# Host check of the encoder linearization: encoder_cal.calibrate() on a fakes.FakeEncoder
+# with a known nonlinearity, driven by a motor that needs time to reach speed. The fitted
+# table must reproduce the nonlinearity, and LinearizedEncoder must remove it.
+#   python -m miniarm_host.encoder_cal_check       # exit 1 on a mismatch
+
+import math
+import sys
+
+from . import fakes, add_firmware_path
+
+clock = fakes.install()
+add_firmware_path()
+import encoder_cal  # noqa: E402
+
+RES = 1 << 14
+TURNS_PER_S_PER_DUTY = 1.0 / 300  # duty 300 -> 1 turn/s
+TAU_S = 0.05  # spin-up time constant; calibrate() waits 300 ms
+TOL_COUNTS = 3
+
+
+def error(turns):
+    th = 2 * math.pi * turns
+    return 40 * math.sin(th) + 15 * math.cos(2 * th + 0.5)
+
+
+class SpinUpEncoder(fakes.FakeEncoder):
+    """FakeEncoder whose speed follows the commanded duty with a first-order lag."""
+
+    def __init__(self):
+        super().__init__(RES, error)
+        self.target = 0.0
+        self.t_on = clock.now_us()
+        self.base = 0.0
+
+    def set_motor(self, duty):
+        self.base = self.angle
+        self.target = duty * TURNS_PER_S_PER_DUTY
+        self.t_on = clock.now_us()
+
+    @property
+    def angle(self):
+        t = (clock.now_us() - self.t_on) / 1e6
+        return self.base + self.target * (t - TAU_S * (1 - math.exp(-t / TAU_S)))
+
+
+def check():
+    """List of failure messages; empty when the fit matches the simulated error."""
+    bad = []
+    enc = SpinUpEncoder()
+    table = encoder_cal.calibrate(enc, enc.set_motor, duty=300, turns=2)
+    if enc.target != 0:
+        bad.append("motor left running at %r turns/s" % enc.target)
+    worst = max(abs(table[j] - error(j / encoder_cal.TABLE_SIZE)) for j in range(encoder_cal.TABLE_SIZE))
+    if worst > TOL_COUNTS:
+        bad.append("table off by %.1f counts from the simulated error" % worst)
+
+    lin = encoder_cal.LinearizedEncoder(enc, table)
+    worst = 0
+    for i in range(97):
+        turns = i / 97
+        raw = int(turns * RES + error(turns)) % RES
+        off = (lin.correct(raw) - int(turns * RES) + RES // 2) % RES - RES // 2
+        worst = max(worst, abs(off))
+    if worst > TOL_COUNTS:
+        bad.append("linearized reading off by %d counts" % worst)
+    return bad
+
+
+def main():
+    bad = check()
+    for msg in bad:
+        print("FAIL", msg)
+    print("encoder calibration: %s" % ("FAIL" if bad else "ok"))
+    sys.exit(1 if bad else 0)
+
+
+if __name__ == "__main__":
+    main()
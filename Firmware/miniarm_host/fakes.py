@@ -0,0 +1,442 @@
+# Stand-ins for MicroPython-only modules so firmware code can run on the host.
+# install() registers them in sys.modules; call it before importing firmware modules.
+
+import binascii
+import gc
+import json
+import os
+import sys
+import time
+import types
+
+# ========== utime ==========
+
+_TICKS_PERIOD = 1 << 30
+_TICKS_HALF = _TICKS_PERIOD // 2
+
+
+class FakeClock:
+    """Manual clock. Firmware sees ticks_ms()/ticks_us() from here once installed."""
+
+    def __init__(self, start_us=0, realtime=False):
+        self.realtime = realtime
+        self._us = start_us
+        self._t0 = time.perf_counter()
+
+    def now_us(self):
+        if self.realtime:
+            return int((time.perf_counter() - self._t0) * 1e6) + self._us
+        return self._us
+
+    def advance_ms(self, ms):
+        self._us += int(ms * 1000)
+
+    def advance_us(self, us):
+        self._us += int(us)
+
+
+def make_utime(clock):
+    m = types.ModuleType("utime")
+    m.ticks_us = lambda: clock.now_us() % _TICKS_PERIOD
+    m.ticks_ms = lambda: (clock.now_us() // 1000) % _TICKS_PERIOD
+    m.ticks_cpu = m.ticks_us
+    m.ticks_add = lambda t, d: (t + d) % _TICKS_PERIOD
+    m.ticks_diff = lambda a, b: ((a - b + _TICKS_HALF) % _TICKS_PERIOD) - _TICKS_HALF
+    m.time = lambda: clock.now_us() // 1000000
+
+    def sleep_us(us):
+        if clock.realtime:
+            time.sleep(us / 1e6)
+        else:
+            clock.advance_us(us)
+
+    m.sleep_us = sleep_us
+    m.sleep_ms = lambda ms: sleep_us(ms * 1000)
+    m.sleep = lambda s: sleep_us(s * 1e6)
+    return m
+
+
+# ========== network ==========
+
+
+class FakeWLAN:
+    """
+    network.WLAN stand-in. connect() succeeds after `connect_polls` isconnected() calls,
+    unless the SSID is in `bad_ssids`. All calls are recorded in `log`.
+    """
+    STA_IF = 0
+    AP_IF = 1
+    bad_ssids = set()
+    connect_polls = 3
+    instances = []
+
+    def __init__(self, interface=0):
+        self.interface = interface
+        self._active = False
+        self._connected = False
+        self._polls_left = None
+        self.cfg = {}
+        self.log = []
+        FakeWLAN.instances.append(self)
+
+    def active(self, state=None):
+        if state is None:
+            return self._active
+        self.log.append(("active", state))
+        self._active = bool(state)
+
+    def config(self, *args, **kwargs):
+        if args:
+            return self.cfg.get(args[0])
+        self.log.append(("config", kwargs))
+        self.cfg.update(kwargs)
+
+    def connect(self, ssid=None, password=None):
+        self.log.append(("connect", ssid))
+        self._connected = False
+        self._polls_left = None if ssid in self.bad_ssids else self.connect_polls
+
+    def disconnect(self):
+        self.log.append(("disconnect", ))
+        self._connected = False
+        self._polls_left = None
+
+    def isconnected(self):
+        if self._polls_left is not None and not self._connected:
+            self._polls_left -= 1
+            if self._polls_left <= 0:
+                self._connected = True
+        return self._connected
+
+    def drop(self):
+        # Simulate the AP going away.
+        self._connected = False
+        self._polls_left = None
+
+    def ifconfig(self):
+        if self.interface == self.AP_IF:
+            return ("192.168.4.1", "255.255.255.0", "192.168.4.1", "0.0.0.0")
+        if self._connected:
+            return ("192.168.1.50", "255.255.255.0", "192.168.1.1", "192.168.1.1")
+        return ("0.0.0.0", "0.0.0.0", "0.0.0.0", "0.0.0.0")
+
+
+def make_network():
+    m = types.ModuleType("network")
+    m.STA_IF = FakeWLAN.STA_IF
+    m.AP_IF = FakeWLAN.AP_IF
+    m.AUTH_WPA_WPA2_PSK = 4
+    m.WLAN = FakeWLAN
+    return m
+
+
+# ========== encoders ==========
+
+
+class FakeEncoder:
+    """
+    encoders.Encoder stand-in. The true shaft angle (turns) advances with `velocity`
+    (turns/s) on the shared clock; `error(turns)` adds a nonlinearity in counts.
+    """
+
+    def __init__(self, resolution=1 << 14, error=None, name="fake", clk=None):
+        self.resolution = resolution
+        self.name = name
+        self.error = error
+        self.clock = clk or clock
+        self.velocity = 0.0
+        self.valid = True
+        self.counts = 0
+        self._angle = 0.0
+        self._t = self.clock.now_us()
+
+    @property
+    def angle(self):
+        now = self.clock.now_us()
+        self._angle += self.velocity * (now - self._t) / 1e6
+        self._t = now
+        return self._angle
+
+    @angle.setter
+    def angle(self, turns):
+        self._t = self.clock.now_us()
+        self._angle = turns
+
+    def read(self):
+        turns = self.angle
+        c = turns * self.resolution
+        if self.error:
+            c += self.error(turns)
+        self.counts = int(c) % self.resolution
+        return self.counts
+
+
+# ========== machine ==========
+
+
+class FakePin:
+    OUT = 1
+    IN = 0
+    PULL_UP = 2
+
+    def __init__(self, id, mode=-1, pull=None, value=None):
+        self.id = id
+        self._value = value or 0
+
+    def value(self, v=None):
+        if v is None:
+            return self._value
+        self._value = v
+
+    def on(self):
+        self._value = 1
+
+    def off(self):
+        self._value = 0
+
+
+class FakePWM:
+
+    def __init__(self, pin, freq=0, duty=0, duty_u16=None):
+        self.pin = pin
+        self._freq = freq
+        self._duty_u16 = duty_u16 if duty_u16 is not None else (duty * 65535) // 1023
+
+    def freq(self, f=None):
+        if f is None:
+            return self._freq
+        self._freq = f
+
+    def duty(self, d=None):
+        if d is None:
+            return (self._duty_u16 * 1023) // 65535
+        self._duty_u16 = (int(d) * 65535) // 1023
+
+    def duty_u16(self, d=None):
+        if d is None:
+            return self._duty_u16
+        self._duty_u16 = int(d)
+
+    def deinit(self):
+        self._duty_u16 = 0
+
+
+class FakeI2C:
+    """machine.I2C that forwards to whichever fake device owns the address."""
+    devices = {}
+
+    def __init__(self, id=0, scl=None, sda=None, freq=400000):
+        self.id = id
+
+    def _dev(self, addr):
+        dev = self.devices.get(addr)
+        if dev is None:
+            raise OSError(19)
+        return dev
+
+    def scan(self):
+        return sorted(self.devices)
+
+    def readfrom_mem(self, addr, reg, n):
+        return self._dev(addr).readfrom_mem(addr, reg, n)
+
+    def readfrom_mem_into(self, addr, reg, buf):
+        self._dev(addr).readfrom_mem_into(addr, reg, buf)
+
+    def writeto_mem(self, addr, reg, data):
+        self._dev(addr).writeto_mem(addr, reg, data)
+
+
+class FakeSPI:
+    """machine.SPI whose readinto() pulls bytes from `source(nbytes)` (zeros by default)."""
+    source = None
+
+    def __init__(self, id=1, baudrate=1000000, polarity=0, phase=0, sck=None, mosi=None, miso=None):
+        self.id = id
+
+    def readinto(self, buf, write=0):
+        source = FakeSPI.source
+        data = source(len(buf)) if source else bytes(len(buf))
+        buf[:] = data
+
+
+class FakeTimer:
+    PERIODIC = 1
+    ONE_SHOT = 0
+
+    def __init__(self, id=0):
+        self.id = id
+        self.callback = None
+        self.period = 0
+
+    def init(self, period=0, mode=1, callback=None, freq=None):
+        self.period = period if not freq else 1000 // freq
+        self.callback = callback
+
+    def fire(self):
+        # Host tests call this instead of a hardware interrupt.
+        if self.callback:
+            self.callback(self)
+
+    def deinit(self):
+        self.callback = None
+
+
+class FakeUART:
+    """machine.UART with a host-fed RX buffer; inject() plays the part of the line going idle."""
+    IRQ_RXIDLE = 0x1000
+
+    def __init__(self, id=1, tx=None, rx=None, baudrate=9600):
+        self.id = id
+        self.baudrate = baudrate
+        self.rx = bytearray()
+        self.tx = bytearray()
+        self.handler = None
+
+    def irq(self, handler=None, trigger=0, hard=False):
+        self.handler = handler
+
+    def any(self):
+        return len(self.rx)
+
+    def read(self, n=-1):
+        if not self.rx:
+            return None
+        n = len(self.rx) if n < 0 else min(n, len(self.rx))
+        data = bytes(self.rx[:n])
+        del self.rx[:n]
+        return data
+
+    def readinto(self, buf, n=-1):
+        data = self.read(len(buf) if n < 0 else n)
+        if not data:
+            return None
+        buf[:len(data)] = data
+        return len(data)
+
+    def write(self, data):
+        self.tx.extend(data)
+        return len(data)
+
+    def inject(self, data):
+        self.rx.extend(data)
+        if self.handler:
+            self.handler(self)
+
+
+class FakeWDT:
+
+    def __init__(self, id=0, timeout=5000):
+        self.timeout = timeout
+        self.feeds = 0
+
+    def feed(self):
+        self.feeds += 1
+
+
+def make_machine():
+    m = types.ModuleType("machine")
+    m.Pin = FakePin
+    m.PWM = FakePWM
+    m.I2C = FakeI2C
+    m.SPI = FakeSPI
+    m.WDT = FakeWDT
+    m.Timer = FakeTimer
+    m.UART = FakeUART
+    m.unique_id = lambda: b"\xde\xad\xbe\xef\x00\x01"
+    m.reset = lambda: None
+    return m
+
+
+# ========== install ==========
+
+clock = FakeClock()
+
+
+def install(realtime=False):
+    """Register fake MicroPython modules. Returns the shared FakeClock."""
+    clock.realtime = realtime
+    sys.modules["utime"] = make_utime(clock)
+    sys.modules["network"] = make_network()
+    sys.modules["machine"] = make_machine()
+    # u-prefixed aliases that map 1:1 onto CPython modules
+    sys.modules.setdefault("ujson", json)
+    sys.modules.setdefault("uos", os)
+    sys.modules.setdefault("ubinascii", binascii)
+    # MicroPython-only gc API on top of CPython's gc
+    gc.__dict__.setdefault("mem_free", lambda: 100000)
+    gc.__dict__.setdefault("mem_alloc", lambda: 50000)
+    # MicroPython's time carries the ticks API as well (pid_control uses time.ticks_us)
+    utime = sys.modules["utime"]
+    for name in ("ticks_us", "ticks_ms", "ticks_add", "ticks_diff", "sleep_us", "sleep_ms"):
+        setattr(time, name, getattr(utime, name))
+    return clock
+
+
+# ========== I2C devices ==========
+
+
+class FakeMT6701:
+    """
+    MT6701 register file behind a machine.I2C-like interface.
+    Registers auto-increment on burst reads/writes like the real part. Every bus
+    transaction is counted in `transactions`. Writing 0xB3 to 0x09 then 0x05 to 0x0A
+    runs the EEPROM program sequence (copies registers to `eeprom`).
+    set_angle() takes the mechanical angle; the angle registers report it minus the
+    12-bit ZERO in 0x32/0x33, as the chip does.
+    """
+
+    def __init__(self, addr=0x06, angle14=0):
+        self.addr = addr
+        self.regs = bytearray(256)
+        self.eeprom = bytearray(256)
+        self.programs = 0
+        self.transactions = 0
+        self.writes = []
+        self.set_angle(angle14)
+
+    def set_angle(self, angle14):
+        self.mech = angle14 & 0x3FFF
+        self._update_angle()
+
+    def zero(self):
+        return ((self.regs[0x32] & 0x0F) << 8) | self.regs[0x33]
+
+    def _update_angle(self):
+        angle14 = (self.mech - (self.zero() << 2)) & 0x3FFF
+        self.regs[0x03] = angle14 >> 6
+        self.regs[0x04] = (angle14 & 0x3F) << 2
+
+    def power_cycle(self):
+        # Config registers reload from EEPROM.
+        self.regs[0x25:] = self.eeprom[0x25:]
+        self._update_angle()
+
+    def scan(self):
+        return [self.addr]
+
+    def _check(self, addr):
+        if addr != self.addr:
+            raise OSError(19)  # ENODEV, like a NACK on hardware
+
+    def readfrom_mem(self, addr, reg, n):
+        self._check(addr)
+        self.transactions += 1
+        return bytes(self.regs[reg:reg + n])
+
+    def readfrom_mem_into(self, addr, reg, buf):
+        self._check(addr)
+        self.transactions += 1
+        buf[:] = self.regs[reg:reg + len(buf)]
+
+    def writeto_mem(self, addr, reg, data):
+        self._check(addr)
+        self.transactions += 1
+        self.writes.append((reg, bytes(data)))
+        self.regs[reg:reg + len(data)] = data
+        self._update_angle()
+        if reg <= 0x0A < reg + len(data) and self.regs[0x09] == 0xB3 and self.regs[0x0A] == 0x05:
+            self.eeprom[:] = self.regs
+            self.programs += 1
+            self.regs[0x09] = 0
+            self.regs[0x0A] = 0
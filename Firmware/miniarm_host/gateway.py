@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+# PC side of the joint chain: streams multi-joint setpoints and collects joint state.
+# One chain_proto setpoint frame per cycle carries every joint's newest setpoint; the
+# frame comes back with each node's state appended, which also gives the round trip time.
+#   python -m miniarm_host.gateway --sim 3 --rate 200 --seconds 5
+#   python -m miniarm_host.gateway --serial /dev/ttyUSB0 -n 3
+#   python -m miniarm_host.gateway --http 192.168.1.50 -n 3
+
+import argparse
+import asyncio
+import math
+import sys
+import time
+
+from . import add_firmware_path
+from .simchain import SimChain
+
+add_firmware_path()
+import chain_proto  # noqa: E402
+
+START = b'\xaa'
+END = b'\xa5'
+
+
+class FrameParser:
+    """Incremental START ... END splitter; bytes outside a frame are dropped."""
+
+    def __init__(self, max_frame=4096):
+        self.max_frame = max_frame
+        self._buf = None
+
+    def feed(self, data):
+        frames = []
+        for b in data:
+            if b == START[0]:
+                self._buf = bytearray()
+            elif self._buf is None:
+                continue
+            elif b == END[0]:
+                frames.append(bytes(self._buf))
+                self._buf = None
+            elif len(self._buf) < self.max_frame:
+                self._buf.append(b)
+            else:
+                self._buf = None
+        return frames
+
+
+def _seq_of(payload):
+    sp = chain_proto.find_setpoint(payload, 0)
+    return sp[0] if sp else None
+
+
+# ========== Transports ==========
+# exchange(payload) sends one frame payload and returns the payload that came back.
+
+
+class SimTransport:
+    """Loopback to a SimChain, for CI and benchmarks."""
+
+    def __init__(self, chain):
+        self.chain = chain
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def exchange(self, payload):
+        return await self.chain.exchange(payload)
+
+
+class SerialTransport:
+    """
+    USB-UART adapter wired into the ring in place of node 1: frames go out on TX,
+    travel every joint and come back on RX. Needs pyserial.
+    """
+
+    def __init__(self, port, baudrate=9600, read_timeout=0.002):
+        self.port = port
+        self.baudrate = baudrate
+        self.read_timeout = read_timeout
+        self.parser = FrameParser()
+        self._ser = None
+
+    async def open(self):
+        try:
+            import serial
+        except ImportError:
+            raise RuntimeError("SerialTransport needs pyserial (pip install pyserial)")
+        self._ser = serial.Serial(self.port, self.baudrate, timeout=self.read_timeout)
+
+    async def close(self):
+        if self._ser:
+            self._ser.close()
+            self._ser = None
+
+    async def exchange(self, payload):
+        loop = asyncio.get_running_loop()
+        seq = _seq_of(payload)
+        await loop.run_in_executor(None, self._ser.write, START + payload + END)
+        while True:
+            data = await loop.run_in_executor(None, self._ser.read, 256)
+            for frame in self.parser.feed(data):
+                # Frames that are not our reply (stale seq, other traffic) are skipped.
+                if seq is None or _seq_of(frame) == seq:
+                    return frame
+
+
+class HttpTransport:
+    """POST /api/chain on the head node's web server; only the head joint answers."""
+
+    def __init__(self, host, port=80):
+        self.host = host
+        self.port = port
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def exchange(self, payload):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            head = ("POST /api/chain HTTP/1.1\r\nHost: %s\r\nContent-Type: text/plain\r\n"
+                    "Content-Length: %d\r\n\r\n" % (self.host, len(payload)))
+            writer.write(head.encode() + payload)
+            await writer.drain()
+            response = await reader.read()
+        finally:
+            writer.close()
+        status, _, body = response.partition(b'\r\n\r\n')
+        if b' 200 ' not in status.split(b'\r\n', 1)[0]:
+            raise IOError("chain request failed: %s" % status.split(b'\r\n', 1)[0].decode())
+        return body
+
+
+# ========== Gateway ==========
+
+
+class JointState:
+    __slots__ = ("pos", "err", "fault", "time")
+
+    def __init__(self, pos=0, err=0, fault=0, t=0.0):
+        self.pos = pos
+        self.err = err
+        self.fault = fault
+        self.time = t
+
+    def __repr__(self):
+        return "JointState(pos=%d, err=%d, fault=%d)" % (self.pos, self.err, self.fault)
+
+
+class LatencyStats:
+
+    def __init__(self, keep=10000):
+        self.keep = keep
+        self.samples = []
+        self.count = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def add(self, seconds):
+        self.count += 1
+        self.samples.append(seconds)
+        if len(self.samples) > self.keep:
+            del self.samples[:len(self.samples) - self.keep]
+
+    def percentile(self, p):
+        if not self.samples:
+            return 0.0
+        s = sorted(self.samples)
+        return s[min(len(s) - 1, int(p / 100.0 * len(s)))]
+
+    def summary(self):
+        """Milliseconds, like the firmware's latency_percentiles."""
+        return {
+            "count": self.count,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "p50_ms": self.percentile(50) * 1e3,
+            "p90_ms": self.percentile(90) * 1e3,
+            "p99_ms": self.percentile(99) * 1e3,
+            "max_ms": max(self.samples) * 1e3 if self.samples else 0.0,
+        }
+
+
+class Gateway:
+    """
+    set_target()/set_targets() only record the newest setpoint per joint; cycle() sends
+    them all in one frame. run() calls cycle() at rate_hz until stop().
+    """
+
+    def __init__(self, transport, n_joints, rate_hz=100.0, timeout_s=0.5):
+        self.transport = transport
+        self.n_joints = n_joints
+        self.period = 1.0 / rate_hz
+        self.timeout_s = timeout_s
+        self.targets = [(0, 0)] * n_joints
+        self.state = {}
+        self.latency = LatencyStats()
+        self.seq = 0
+        self.overruns = 0
+        self._running = False
+
+    def set_target(self, joint, pos, vel=0):
+        self.targets[joint] = (pos, vel)
+
+    def set_targets(self, positions, velocities=None):
+        velocities = velocities or [0] * len(positions)
+        self.targets = list(zip(positions, velocities))
+
+    async def cycle(self):
+        """Send one batched setpoint frame; returns {joint: (pos, err, fault)} or None on timeout."""
+        self.seq = (self.seq + 1) & 0xFFFF
+        payload = chain_proto.format_setpoints(self.seq, self.targets)
+        t0 = time.perf_counter()
+        try:
+            reply = await asyncio.wait_for(self.transport.exchange(payload), self.timeout_s)
+        except asyncio.TimeoutError:
+            self.latency.timeouts += 1
+            return None
+        except (IOError, OSError) as e:
+            self.latency.errors += 1
+            print("gateway: %s" % e, file=sys.stderr)
+            return None
+        now = time.perf_counter()
+        self.latency.add(now - t0)
+        states = chain_proto.parse_states(reply)
+        for joint, (pos, err, fault) in states.items():
+            self.state[joint] = JointState(pos, err, fault, now)
+        return states
+
+    async def command(self, text):
+        # ESTOP / RESET / SAFE? travel the chain like any other frame.
+        return await asyncio.wait_for(self.transport.exchange(text.encode()), self.timeout_s)
+
+    async def run(self, duration_s=None, on_cycle=None):
+        """Fixed-rate cycles; a cycle that overruns its slot is counted and the schedule resyncs."""
+        loop = asyncio.get_running_loop()
+        self._running = True
+        start = next_t = loop.time()
+        while self._running and (duration_s is None or loop.time() - start < duration_s):
+            states = await self.cycle()
+            if on_cycle:
+                on_cycle(self, states)
+            next_t += self.period
+            wait = next_t - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            else:
+                self.overruns += 1
+                next_t = loop.time()
+
+    def stop(self):
+        self._running = False
+
+    async def stream(self):
+        """Async iterator of per-cycle states at rate_hz."""
+        loop = asyncio.get_running_loop()
+        self._running = True
+        next_t = loop.time()
+        while self._running:
+            yield await self.cycle()
+            next_t += self.period
+            await asyncio.sleep(max(0.0, next_t - loop.time()))
+
+
+# ========== CLI ==========
+
+
+def make_transport(args):
+    if args.sim:
+        baudrate = args.baud if args.sim_uart else None
+        return SimTransport(SimChain(args.sim, hop_delay_s=args.hop_delay, baudrate=baudrate))
+    if args.serial:
+        return SerialTransport(args.serial, args.baud)
+    if args.http:
+        return HttpTransport(args.http)
+    raise SystemExit("one of --sim, --serial, --http is required")
+
+
+async def _bench(args):
+    transport = make_transport(args)
+    n = args.sim or args.joints
+    gw = Gateway(transport, n, rate_hz=args.rate, timeout_s=args.timeout)
+    t0 = time.monotonic()
+
+    def sweep(gw, states):
+        # Slow sine on every joint, phase-shifted, as a stand-in for a motion stream.
+        t = time.monotonic() - t0
+        gw.set_targets([int(args.amplitude * math.sin(2 * math.pi * 0.5 * t + j)) for j in range(n)])
+
+    await transport.open()
+    try:
+        await gw.run(args.seconds, sweep)
+    finally:
+        await transport.close()
+    return gw
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream setpoints to the esp-miniarm joint chain.")
+    src = parser.add_mutually_exclusive_group()
+    src.add_argument("--sim", type=int, default=0, metavar="N", help="use N simulated joints")
+    src.add_argument("--serial", help="USB-UART port wired into the chain ring")
+    src.add_argument("--http", help="head node host (POST /api/chain)")
+    parser.add_argument("-n", "--joints", type=int, default=3, help="joints in the chain")
+    parser.add_argument("--rate", type=float, default=100.0, help="cycles per second")
+    parser.add_argument("--seconds", type=float, default=5.0, help="run time")
+    parser.add_argument("--timeout", type=float, default=0.5, help="per-cycle reply timeout (s)")
+    parser.add_argument("--baud", type=int, default=9600, help="chain UART baud rate")
+    parser.add_argument("--hop-delay", type=float, default=0.0, help="simulated per-node delay (s)")
+    parser.add_argument("--sim-uart", action="store_true", help="simulate UART time at --baud per hop")
+    parser.add_argument("--amplitude", type=float, default=1000.0, help="sine amplitude (counts)")
+    parser.add_argument("--max-p99-ms", type=float, default=0.0, help="exit 1 if p99 latency is above this")
+    args = parser.parse_args()
+
+    gw = asyncio.run(_bench(args))
+    summary = gw.latency.summary()
+    print("cycles:%d timeouts:%d errors:%d overruns:%d" %
+          (summary["count"], summary["timeouts"], summary["errors"], gw.overruns))
+    print("latency ms  p50:%.3f p90:%.3f p99:%.3f max:%.3f" %
+          (summary["p50_ms"], summary["p90_ms"], summary["p99_ms"], summary["max_ms"]))
+    for joint in sorted(gw.state):
+        print("  joint %d: %r" % (joint, gw.state[joint]))
+    if args.max_p99_ms and summary["p99_ms"] > args.max_p99_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
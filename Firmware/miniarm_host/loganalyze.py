@@ -0,0 +1,555 @@
+#!/usr/bin/env python3
+# Offline analysis of captured control runs.
+# Reads pid_run / cascade_run(verbose=True) console captures ("t:... , pos:... , err:...")
+# and telemetry.TelemetryWriter dumps (cascade_run(log=...)) in fixed-size chunks, so memory
+# stays flat however long the capture is. Each chunk becomes NumPy columns and is folded into
+# running statistics:
+#   timing   dt histogram, jitter against the nominal period, missed deadlines
+#   control  |err| mean/rms/max, IAE, final error, saturation episodes
+#   events   firmware warnings in text logs (output / I-term saturation, CRC failures, ...)
+# plus a decimated copy of the signals for plots. Plots and the HTML report need matplotlib;
+# without it the report is text/JSON only.
+#   python -m miniarm_host.loganalyze capture.log --period-us 10000
+#   python -m miniarm_host.loganalyze run.tl --html run.html
+#   python -m miniarm_host.loganalyze a.log b.tl --json
+
+import argparse
+import base64
+import heapq
+import io
+import json
+import re
+import struct
+import sys
+
+import numpy as np
+
+from .armsim import FULL_SCALE
+
+TICKS_PERIOD = 1 << 30  # MicroPython ticks_us wraps here
+CHUNK_ROWS = 1 << 16
+COLUMNS = ("t", "dt", "target", "pos", "err", "vel", "vel_cmd", "pterm", "dterm", "iterm", "output", "fault")
+# Text log key -> column
+TEXT_KEYS = {"vcmd": "vel_cmd"}
+EVENTS = {
+    "output_saturated": "Warning: Output saturated",
+    "iterm_saturated": "Warning: I term saturated",
+    "dt_too_small": "dt too small",
+    "crc_fail": "CRC FAIL",
+}
+SAT_FRAC = 0.99
+MISS_FACTOR = 1.5
+HIST_BINS = 2000
+HIST_SPAN = 4.0  # histogram covers 0 .. HIST_SPAN * period
+
+TL_MAGIC = b"TL"
+TL_HEADER = "<BBHH"
+
+_PAIR = re.compile(r"(\w+):\s*(-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|-?nan|-?inf)")
+
+# ========== Readers ==========
+# Each reader yields (columns, events): columns maps COLUMNS names to equal-length float64
+# arrays (NaN where the source has no such field); events counts EVENTS hits in the chunk.
+
+
+def _empty_chunk(n):
+    return {c: np.full(n, np.nan) for c in COLUMNS}
+
+
+def _flush_text(rows, events):
+    cols = _empty_chunk(len(rows))
+    for i, row in enumerate(rows):
+        for k, v in row.items():
+            cols[k][i] = v
+    return cols, events
+
+
+def iter_text(f, chunk_rows=CHUNK_ROWS):
+    """Console capture (text file object) -> chunks. Lines without a t: field are only scanned for events."""
+    rows = []
+    events = dict.fromkeys(EVENTS, 0)
+    for line in f:
+        if "t:" not in line:
+            for name, pat in EVENTS.items():
+                if pat in line:
+                    events[name] += 1
+            continue
+        row = {}
+        for key, value in _PAIR.findall(line):
+            key = TEXT_KEYS.get(key, key)
+            if key in COLUMNS:
+                row[key] = float(value)
+        if "t" not in row:
+            continue
+        rows.append(row)
+        if len(rows) >= chunk_rows:
+            yield _flush_text(rows, events)
+            rows = []
+            events = dict.fromkeys(EVENTS, 0)
+    if rows or any(events.values()):
+        yield _flush_text(rows, events)
+
+
+def read_tl_header(f):
+    """(fields, interval_us, record dtype) from a telemetry dump opened in binary mode."""
+    head = f.read(2 + struct.calcsize(TL_HEADER))
+    if head[:2] != TL_MAGIC:
+        raise ValueError("Not a telemetry dump")
+    version, n, interval_us, names_len = struct.unpack_from(TL_HEADER, head, 2)
+    if version != 1:
+        raise ValueError("Unsupported telemetry version %d" % version)
+    fields = f.read(names_len).decode().split(",")
+    if len(fields) != n:
+        raise ValueError("Telemetry header names %d fields, expected %d" % (len(fields), n))
+    dtype = np.dtype([("t", "<u4")] + [(name, "<f4") for name in fields])
+    return fields, interval_us, dtype
+
+
+def iter_telemetry(f, chunk_rows=CHUNK_ROWS):
+    """Telemetry dump (binary file object) -> chunks. A torn last record is dropped."""
+    fields, _, dtype = read_tl_header(f)
+    while True:
+        data = f.read(dtype.itemsize * chunk_rows)
+        n = len(data) // dtype.itemsize
+        if n == 0:
+            return
+        rec = np.frombuffer(data[:n * dtype.itemsize], dtype=dtype)
+        cols = _empty_chunk(n)
+        cols["t"] = rec["t"].astype(np.float64)
+        for name in fields:
+            if name in cols:
+                cols[name] = rec[name].astype(np.float64)
+        yield cols, {}
+
+
+def open_log(path, chunk_rows=CHUNK_ROWS):
+    """(chunk iterator, interval_us or None) for a text capture or a telemetry dump."""
+    with open(path, "rb") as f:
+        magic = f.read(2)
+    if magic == TL_MAGIC:
+        f = open(path, "rb")
+        _, interval_us, _ = read_tl_header(f)
+        f.seek(0)
+        return _closing(f, iter_telemetry(f, chunk_rows)), interval_us or None
+    f = open(path, "r", errors="replace")
+    return _closing(f, iter_text(f, chunk_rows)), None
+
+
+def _closing(f, it):
+    with f:
+        yield from it
+
+
+# ========== Streaming statistics ==========
+
+
+class Decimator:
+    """Keeps at most max_points evenly strided samples of a stream (stride doubles as needed)."""
+
+    def __init__(self, names, max_points=20000):
+        self.names = names
+        self.max_points = max_points
+        self.stride = 1
+        self.seen = 0
+        self.data = {n: [] for n in names}
+
+    def feed(self, cols):
+        n = len(cols[self.names[0]])
+        idx = np.arange(self.seen, self.seen + n)
+        keep = (idx % self.stride) == 0
+        for name in self.names:
+            self.data[name].append(cols[name][keep])
+        self.seen += n
+        if sum(len(a) for a in self.data[self.names[0]]) > self.max_points:
+            self.stride *= 2
+            for name in self.names:
+                merged = np.concatenate(self.data[name])
+                # Samples kept so far sit on multiples of the old stride; keep every other one.
+                self.data[name] = [merged[::2]]
+
+    def arrays(self):
+        return {n: (np.concatenate(v) if v else np.zeros(0)) for n, v in self.data.items()}
+
+
+class RunAnalyzer:
+    """
+    feed() chunks from a reader, then report(). period_us is the nominal tick; when None
+    it is taken from the median dt of the first chunk.
+    """
+
+    def __init__(self, period_us=None, sat_level=SAT_FRAC * FULL_SCALE, miss_factor=MISS_FACTOR,
+                 max_points=20000, top_episodes=10):
+        self.period_us = period_us
+        self.sat_level = sat_level
+        self.miss_factor = miss_factor
+        self.top_episodes = top_episodes
+        self.rows = 0
+        self.events = dict.fromkeys(EVENTS, 0)
+        # time base
+        self._last_raw = None
+        self._t_abs = 0.0
+        # timing
+        self.hist = None
+        self.hist_edges = None
+        self.hist_over = 0
+        self.dt_n = 0
+        self.dt_sum = 0.0
+        self.dt_sq = 0.0
+        self.dt_min = np.inf
+        self.dt_max = 0.0
+        self.jitter_max = 0.0
+        self.misses = 0
+        self.worst_gap = (0.0, 0.0)  # (dt_us, at_s)
+        # control
+        self.err_n = 0
+        self.err_abs = 0.0
+        self.err_sq = 0.0
+        self.err_max = 0.0
+        self.iae = 0.0
+        self.final_err = None
+        # saturation episodes
+        self.sat_count = 0
+        self.sat_total_s = 0.0
+        self._sat_start = None
+        self._sat_peak = 0.0
+        self._sat_last = 0.0
+        self._episodes = []  # min-heap of (duration_s, start_s, peak)
+        self.series = Decimator(("t_s", "target", "pos", "err", "output", "dt_us"), max_points)
+
+    def _time(self, raw):
+        # Unwrap ticks_us into seconds since the first sample; dt is exact across wraps.
+        if self._last_raw is None:
+            self._last_raw = raw[0]
+        prev = np.concatenate(([self._last_raw], raw[:-1]))
+        dt = np.mod(raw - prev, TICKS_PERIOD)
+        t = self._t_abs + np.cumsum(dt)
+        self._last_raw = raw[-1]
+        self._t_abs = t[-1]
+        return t / 1e6, dt
+
+    def _timing(self, dt, t_s):
+        if self.rows == 0:
+            dt = dt[1:]  # the first sample has no predecessor
+            t_s = t_s[1:]
+        if len(dt) == 0:
+            return
+        if self.period_us is None:
+            self.period_us = float(np.median(dt))
+        if self.hist is None:
+            self.hist_edges = np.linspace(0.0, HIST_SPAN * self.period_us, HIST_BINS + 1)
+            self.hist = np.zeros(HIST_BINS, dtype=np.int64)
+        h, _ = np.histogram(dt, self.hist_edges)
+        self.hist += h
+        self.hist_over += int(np.count_nonzero(dt >= self.hist_edges[-1]))
+        self.dt_n += len(dt)
+        self.dt_sum += float(dt.sum())
+        self.dt_sq += float((dt * dt).sum())
+        self.dt_min = min(self.dt_min, float(dt.min()))
+        i = int(np.argmax(dt))
+        if dt[i] > self.dt_max:
+            self.dt_max = float(dt[i])
+            self.worst_gap = (float(dt[i]), float(t_s[i]))
+        self.jitter_max = max(self.jitter_max, float(np.max(np.abs(dt - self.period_us))))
+        self.misses += int(np.count_nonzero(dt > self.miss_factor * self.period_us))
+
+    def _control(self, err, dt_s):
+        ok = ~np.isnan(err)
+        if not ok.any():
+            return
+        e = np.abs(err[ok])
+        self.err_n += len(e)
+        self.err_abs += float(e.sum())
+        self.err_sq += float((e * e).sum())
+        self.err_max = max(self.err_max, float(e.max()))
+        self.iae += float((e * dt_s[ok]).sum())
+        self.final_err = float(err[ok][-1])
+
+    def _saturation(self, out, t_s):
+        ok = ~np.isnan(out)
+        if not ok.any():
+            return
+        out = out[ok]
+        t_s = t_s[ok]
+        sat = np.abs(out) >= self.sat_level
+        carry = self._sat_start is not None
+        # Run edges in this chunk; an episode left open by the previous chunk continues at 0.
+        d = np.diff(sat.astype(np.int8), prepend=np.int8(carry))
+        ends = np.nonzero(d == -1)[0]
+        starts = list(np.nonzero(d == 1)[0])
+        if carry:
+            starts.insert(0, 0)
+        for k, s in enumerate(starts):
+            e = ends[k] if k < len(ends) else len(out)
+            peak = float(np.max(np.abs(out[s:e]))) if e > s else 0.0
+            if k == 0 and carry:
+                self._sat_peak = max(self._sat_peak, peak)
+            else:
+                self._sat_start = float(t_s[s])
+                self._sat_peak = peak
+            if k < len(ends):
+                self._close_episode(t_s[e])
+            else:
+                self._sat_last = float(t_s[-1])
+
+    def _close_episode(self, t_end):
+        dur = float(t_end - self._sat_start)
+        self.sat_count += 1
+        self.sat_total_s += dur
+        item = (dur, float(self._sat_start), self._sat_peak)
+        if len(self._episodes) < self.top_episodes:
+            heapq.heappush(self._episodes, item)
+        else:
+            heapq.heappushpop(self._episodes, item)
+        self._sat_start = None
+
+    def feed(self, cols, events=None):
+        n = len(cols["t"])
+        for k, v in (events or {}).items():
+            self.events[k] = self.events.get(k, 0) + v
+        if n == 0:
+            return
+        t_s, dt = self._time(cols["t"])
+        self._timing(dt, t_s)
+        self._control(cols["err"], dt / 1e6)
+        self._saturation(cols["output"], t_s)
+        self.series.feed({
+            "t_s": t_s,
+            "target": cols["target"],
+            "pos": cols["pos"],
+            "err": cols["err"],
+            "output": cols["output"],
+            "dt_us": dt,
+        })
+        self.rows += n
+
+    def feed_all(self, chunks):
+        for cols, events in chunks:
+            self.feed(cols, events)
+        return self
+
+    def _percentile(self, q):
+        # Linear within the histogram bin; dt beyond the histogram reports dt_max.
+        if self.hist is None or self.dt_n == 0:
+            return 0.0
+        c = np.cumsum(self.hist)
+        k = q / 100.0 * self.dt_n
+        i = int(np.searchsorted(c, k))
+        if i >= HIST_BINS:
+            return float(self.dt_max)
+        below = c[i - 1] if i else 0
+        frac = (k - below) / self.hist[i] if self.hist[i] else 0.0
+        lo = self.hist_edges[i]
+        v = float(lo + frac * (self.hist_edges[i + 1] - lo))
+        return min(max(v, self.dt_min), self.dt_max)
+
+    def report(self):
+        if self._sat_start is not None:
+            self._close_episode(self._sat_last)
+        mean = self.dt_sum / self.dt_n if self.dt_n else 0.0
+        var = max(0.0, self.dt_sq / self.dt_n - mean * mean) if self.dt_n else 0.0
+        duration = self._t_abs / 1e6
+        return {
+            "samples": self.rows,
+            "duration_s": duration,
+            "timing": {
+                "period_us": self.period_us,
+                "rate_hz": 1e6 / mean if mean else 0.0,
+                "dt_mean_us": mean,
+                "dt_std_us": var**0.5,
+                "dt_min_us": self.dt_min if self.dt_n else 0.0,
+                "dt_max_us": self.dt_max,
+                "dt_p50_us": self._percentile(50),
+                "dt_p99_us": self._percentile(99),
+                "jitter_max_us": self.jitter_max,
+                "missed_deadlines": self.misses,
+                "miss_threshold_us": (self.period_us or 0.0) * self.miss_factor,
+                "worst_gap_us": self.worst_gap[0],
+                "worst_gap_at_s": self.worst_gap[1],
+                "dt_beyond_histogram": self.hist_over,
+            },
+            "control": {
+                "err_mean_abs": self.err_abs / self.err_n if self.err_n else 0.0,
+                "err_rms": (self.err_sq / self.err_n)**0.5 if self.err_n else 0.0,
+                "err_max_abs": self.err_max,
+                "iae": self.iae,
+                "final_err": self.final_err,
+            },
+            "saturation": {
+                "level": self.sat_level,
+                "episodes": self.sat_count,
+                "total_s": self.sat_total_s,
+                "fraction": self.sat_total_s / duration if duration else 0.0,
+                "longest": [{
+                    "start_s": s,
+                    "duration_s": d,
+                    "peak": p
+                } for d, s, p in sorted(self._episodes, reverse=True)],
+            },
+            "events": {k: v for k, v in self.events.items() if v},
+        }
+
+
+def analyze(path, period_us=None, **kw):
+    chunks, interval_us = open_log(path)
+    return RunAnalyzer(period_us or interval_us, **kw).feed_all(chunks)
+
+
+# ========== Rendering ==========
+
+
+def format_text(name, rep):
+    t = rep["timing"]
+    c = rep["control"]
+    s = rep["saturation"]
+    lines = [
+        "%s: %d samples, %.2f s" % (name, rep["samples"], rep["duration_s"]),
+        "  timing   period %.0f us, rate %.1f Hz, "
+        "dt mean %.1f std %.1f min %.0f p50 %.0f p99 %.0f max %.0f us" %
+        (t["period_us"] or 0, t["rate_hz"], t["dt_mean_us"], t["dt_std_us"], t["dt_min_us"], t["dt_p50_us"],
+         t["dt_p99_us"], t["dt_max_us"]),
+        "           jitter max %.0f us, %d missed deadlines (> %.0f us), worst gap %.0f us at %.3f s" %
+        (t["jitter_max_us"], t["missed_deadlines"], t["miss_threshold_us"], t["worst_gap_us"],
+         t["worst_gap_at_s"]),
+        "  control  |err| mean %.2f rms %.2f max %.0f, IAE %.3f, final err %s" %
+        (c["err_mean_abs"], c["err_rms"], c["err_max_abs"], c["iae"], c["final_err"]),
+        "  saturation  %d episodes, %.3f s total (%.1f%%)" %
+        (s["episodes"], s["total_s"], s["fraction"] * 100),
+    ]
+    for ep in s["longest"][:3]:
+        lines.append("           %.3f s at %.3f s, peak %.0f" % (ep["duration_s"], ep["start_s"], ep["peak"]))
+    if rep["events"]:
+        lines.append("  events   " + ", ".join("%s=%d" % kv for kv in sorted(rep["events"].items())))
+    return "\n".join(lines)
+
+
+def _pyplot():
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        return None
+    return plt
+
+
+def render_plots(analyzer):
+    """{title: PNG bytes}; empty when matplotlib is not installed."""
+    plt = _pyplot()
+    if plt is None:
+        return {}
+    s = analyzer.series.arrays()
+    out = {}
+
+    def png(fig):
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png", dpi=100, bbox_inches="tight")
+        plt.close(fig)
+        return buf.getvalue()
+
+    fig, ax = plt.subplots(3, 1, figsize=(11, 8), sharex=True)
+    ax[0].plot(s["t_s"], s["pos"], label="pos", lw=0.8)
+    if not np.all(np.isnan(s["target"])):
+        ax[0].plot(s["t_s"], s["target"], label="target", lw=0.8)
+    ax[0].set_ylabel("counts")
+    ax[0].legend(loc="upper right")
+    ax[1].plot(s["t_s"], s["err"], lw=0.8)
+    ax[1].set_ylabel("err")
+    ax[2].plot(s["t_s"], s["output"], lw=0.8)
+    for lvl in (analyzer.sat_level, -analyzer.sat_level):
+        ax[2].axhline(lvl, color="r", lw=0.5, ls="--")
+    ax[2].set_ylabel("output")
+    ax[2].set_xlabel("s")
+    out["signals"] = png(fig)
+
+    if analyzer.hist is not None:
+        fig, ax = plt.subplots(1, 2, figsize=(11, 3.5))
+        edges = analyzer.hist_edges
+        ax[0].bar(edges[:-1], analyzer.hist, width=np.diff(edges), align="edge")
+        ax[0].axvline(analyzer.period_us * analyzer.miss_factor, color="r", lw=0.8, ls="--")
+        ax[0].set_yscale("log")
+        ax[0].set_xlabel("dt (us)")
+        ax[0].set_title("tick interval")
+        ax[1].plot(s["t_s"], s["dt_us"], lw=0.5)
+        ax[1].set_xlabel("s")
+        ax[1].set_ylabel("dt (us)")
+        ax[1].set_title("dt over time (decimated)")
+        out["timing"] = png(fig)
+    return out
+
+
+def render_html(name, rep, plots):
+    def table(d):
+        rows = "".join("<tr><td>%s</td><td>%s</td></tr>" % (k, "%.4g" % v if isinstance(v, float) else v)
+                       for k, v in d.items() if not isinstance(v, (list, dict)))
+        return "<table>%s</table>" % rows
+
+    parts = [
+        "<!DOCTYPE html><html><head><meta charset='utf-8'><title>%s</title>" % name,
+        "<style>body{font-family:sans-serif;margin:2em}td{padding:2px 12px}"
+        "tr:nth-child(odd){background:#f3f3f3}</style></head><body>",
+        "<h1>%s</h1><p>%d samples, %.2f s</p>" % (name, rep["samples"], rep["duration_s"]),
+    ]
+    for section in ("timing", "control", "saturation"):
+        parts.append("<h2>%s</h2>%s" % (section, table(rep[section])))
+    longest = rep["saturation"]["longest"]
+    if longest:
+        rows = ["<p>%.3f s at %.3f s, peak %.0f</p>" % (e["duration_s"], e["start_s"], e["peak"])
+                for e in longest]
+        parts.append("<h3>longest saturation episodes</h3>" + "".join(rows))
+    if rep["events"]:
+        parts.append("<h2>events</h2>%s" % table(rep["events"]))
+    if plots:
+        for title, data in plots.items():
+            png = base64.b64encode(data).decode()
+            parts.append("<h2>%s</h2><img src='data:image/png;base64,%s'>" % (title, png))
+    else:
+        parts.append("<p>(plots need matplotlib)</p>")
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+# ========== CLI ==========
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze captured esp-miniarm control runs.")
+    parser.add_argument("logs", nargs="+", help="console captures or telemetry dumps (.tl)")
+    parser.add_argument("--period-us", type=float, help="nominal tick (default: dump header or median dt)")
+    parser.add_argument("--sat",
+                        type=float,
+                        default=SAT_FRAC * FULL_SCALE,
+                        help="|output| counted as saturated")
+    parser.add_argument("--miss-factor", type=float, default=MISS_FACTOR, help="dt > factor*period is a miss")
+    parser.add_argument("--json", action="store_true", help="print the reports as JSON")
+    parser.add_argument("--html", help="write an HTML report (one file per log: NAME.html if several)")
+    parser.add_argument("--plots-dir", help="write PNG plots here")
+    args = parser.parse_args()
+
+    reports = {}
+    for path in args.logs:
+        an = analyze(path, args.period_us, sat_level=args.sat, miss_factor=args.miss_factor)
+        rep = an.report()
+        reports[path] = rep
+        if not args.json:
+            print(format_text(path, rep))
+        if args.html or args.plots_dir:
+            plots = render_plots(an)
+            if not plots:
+                print("matplotlib not installed, no plots", file=sys.stderr)
+            if args.plots_dir:
+                from pathlib import Path
+                d = Path(args.plots_dir)
+                d.mkdir(parents=True, exist_ok=True)
+                for title, data in plots.items():
+                    (d / ("%s_%s.png" % (Path(path).stem, title))).write_bytes(data)
+            if args.html:
+                out = args.html if len(args.logs) == 1 else "%s.html" % path
+                with open(out, "w") as f:
+                    f.write(render_html(path, rep, plots))
+    if args.json:
+        json.dump(reports, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# Poll /api/metrics on one or more joints and append the samples to a CSV file.
+#   python -m miniarm_host.metrics_collector 192.168.1.50 192.168.1.51 -i 5 -o metrics.csv
+
+import argparse
+import csv
+import sys
+import time
+import urllib.request
+
+
+def parse_metrics(text):
+    out = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        name, _, value = line.partition(" ")
+        if name.startswith("miniarm_"):
+            name = name[len("miniarm_"):]
+        try:
+            out[name] = float(value)
+        except ValueError:
+            pass
+    return out
+
+
+def scrape(host, timeout=2.0):
+    url = host if host.startswith("http") else "http://%s/api/metrics" % host
+    with urllib.request.urlopen(url, timeout=timeout) as r:
+        return parse_metrics(r.read().decode())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape esp-miniarm /api/metrics into a CSV file.")
+    parser.add_argument("hosts", nargs="+", help="joint hostnames/IPs or full metrics URLs")
+    parser.add_argument("-i", "--interval", type=float, default=5.0, help="seconds between scrapes")
+    parser.add_argument("-o", "--output", default="-", help="CSV file (default stdout)")
+    parser.add_argument("-n", "--count", type=int, default=0, help="stop after N rounds (0 = forever)")
+    args = parser.parse_args()
+
+    f = sys.stdout if args.output == "-" else open(args.output, "a", newline="")
+    writer = csv.writer(f)
+    writer.writerow(["time", "host", "metric", "value"])
+    rounds = 0
+    try:
+        while True:
+            now = time.time()
+            for host in args.hosts:
+                try:
+                    for k, v in scrape(host).items():
+                        writer.writerow([f"{now:.3f}", host, k, v])
+                except OSError as e:
+                    print(f"E: {host}: {e}", file=sys.stderr)
+            f.flush()
+            rounds += 1
+            if args.count and rounds >= args.count:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if f is not sys.stdout:
+            f.close()
+
+
+if __name__ == "__main__":
+    main()
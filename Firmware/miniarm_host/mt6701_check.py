@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# Host check of the MT6701 I2C path against fakes.FakeMT6701: bus transactions per angle
+# read and per config decode (mt6701_i2c), the encoder driver on a missing chip, and
+# programming (mt6701_program): zero_here() from a zero and a non-zero ZERO, write + burn +
+# EEPROM reload, and the no-op rerun that must neither write nor burn.
+#   python -m miniarm_host.mt6701_check       # exit 1 on a mismatch
+
+import sys
+
+from . import fakes, add_firmware_path
+
+fakes.install()
+add_firmware_path()
+import encoders  # noqa: E402
+import mt6701_i2c  # noqa: E402
+import mt6701_program  # noqa: E402
+
+
+def make_dev(mech, zero=0):
+    """(fake chip, MT6701I2C) with the joint at mechanical angle `mech` (14-bit)."""
+    chip = fakes.FakeMT6701()
+    img = mt6701_program.build_image(bytes(mt6701_i2c.CFG_LEN), zero=zero)
+    chip.regs[mt6701_i2c.CFG_FIRST:mt6701_i2c.CFG_LAST + 1] = img
+    chip.eeprom[:] = chip.regs
+    chip.set_angle(mech)
+    fakes.FakeI2C.devices = {chip.addr: chip}
+    return chip, mt6701_i2c.MT6701I2C(fakes.FakeI2C(), chip.addr)
+
+
+def check_transactions():
+    bad = []
+    chip, dev = make_dev(4321)
+    if dev.read_angle_counts() != 4321 or chip.transactions != 1:
+        bad.append("angle read: %d transactions" % chip.transactions)
+    for _ in range(2):
+        mt6701_i2c.decode_config(dev)
+    if chip.transactions != 2:
+        bad.append("two decodes: %d transactions, expected one burst" % (chip.transactions - 1))
+    dev.write_block(mt6701_i2c.REG_ZERO_L, b'\x10')
+    mt6701_i2c.decode_config(dev)
+    if chip.transactions != 4 or dev.reg(mt6701_i2c.REG_ZERO_L) != 0x10:
+        bad.append("config write did not invalidate the cached block")
+
+    enc = encoders.MT6701I2CEncoder(fakes.FakeI2C(), chip.addr)
+    if enc.read() != 4321 - 0x10 * 4 or not enc.valid:
+        bad.append("encoder read %d valid %s" % (enc.counts, enc.valid))
+    fakes.FakeI2C.devices = {}
+    enc.read()
+    if enc.valid:
+        bad.append("encoder still valid with no chip on the bus")
+    return bad
+
+
+def check_zero_here(mech, zero):
+    bad = []
+    chip, dev = make_dev(mech, zero)
+    before = dev.read_angle_counts()
+    new_zero = mt6701_program.zero_here(dev)
+    report = mt6701_program.program(dev, burn=True, reload=chip.power_cycle, zero=new_zero)
+    if not (report["shadow_ok"] and report["eeprom_ok"]):
+        bad.append("zero %d: program report %r" % (zero, report))
+    after = dev.read_angle_counts()
+    # ZERO has a quarter of the angle's resolution; only the low two bits may remain.
+    if after != before & 0x3:
+        bad.append("mech %d zero %d: reads %d after zero_here (ZERO %d), expected %d" %
+                   (mech, zero, after, new_zero, before & 0x3))
+    return bad
+
+
+def check_program():
+    bad = []
+    chip, dev = make_dev(1000)
+    fields = {"direction": 1, "abz_res": 1000, "hyst": 5}
+    report = mt6701_program.program(dev, reload=chip.power_cycle, **fields)
+    if not (report["burned"] and report["eeprom_ok"] and chip.programs == 1):
+        bad.append("first program: %r, %d burns" % (report, chip.programs))
+    cfg = mt6701_i2c.decode_config(dev)
+    if (cfg["DIR_bit1"], cfg["ABZ_RES_ppr"], cfg["HYST_code"]) != (1, 1000, 5):
+        bad.append("read back %r" % cfg)
+    writes = len(chip.writes)
+    report = mt6701_program.program(dev, **fields)
+    if report["changed"] or report["burned"] or len(chip.writes) != writes or chip.programs != 1:
+        bad.append("rerun with nothing to change: %r, %d writes" % (report, len(chip.writes) - writes))
+    return bad
+
+
+def check():
+    """List of failure messages; empty when every case passed."""
+    bad = check_transactions()
+    for mech, zero in ((1001, 0), (5003, 0x321), (200, 0xF00)):
+        bad += check_zero_here(mech, zero)
+    bad += check_program()
+    return bad
+
+
+def main():
+    bad = check()
+    for msg in bad:
+        print("FAIL", msg)
+    print("mt6701 i2c: %s" % ("FAIL" if bad else "ok"))
+    sys.exit(1 if bad else 0)
+
+
+if __name__ == "__main__":
+    main()
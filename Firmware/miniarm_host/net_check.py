@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# Host check of net_manager.NetManager against fakes.FakeWLAN on the fake clock: a good
+# network connects and registers mDNS, a bad one backs off (500, 1000 ms) and falls back to
+# the AP after max_attempts, a dropped link reconnects with a fresh budget, and no SSID at
+# all goes straight to the AP.
+#   python -m miniarm_host.net_check       # exit 1 on a mismatch
+
+import contextlib
+import io
+import sys
+
+from . import fakes, add_firmware_path
+
+clock = fakes.install()
+add_firmware_path()
+import net_manager as nm  # noqa: E402
+
+STEP_MS = 10
+
+
+def make(ssid, bad=False):
+    """(manager, [(t_ms, old, new)], [mdns hostnames]); started at t = 0."""
+    fakes.FakeWLAN.bad_ssids = {ssid} if bad else set()
+    fakes.FakeWLAN.instances = []
+    t0 = clock.now_us() // 1000
+    log = []
+    mdns = []
+
+    def on_state(old, new, _mgr):
+        log.append((clock.now_us() // 1000 - t0, old, new))
+
+    def mdns_fn(hostname, _wlan):
+        mdns.append(hostname)
+        return True
+
+    mgr = nm.NetManager(ssid, "pw", on_state=on_state, mdns_fn=mdns_fn, attempt_timeout_ms=1000)
+    mgr.start()
+    return mgr, log, mdns
+
+
+def run(mgr, ms):
+    for _ in range(ms // STEP_MS):
+        clock.advance_ms(STEP_MS)
+        mgr.step()
+
+
+def check_connect():
+    bad = []
+    mgr, log, mdns = make("home")
+    run(mgr, 100)
+    if mgr.state != nm.ST_STA_CONNECTED or mgr.ip() != "192.168.1.50":
+        bad.append("good ssid: state %s ip %s" % (mgr.state, mgr.ip()))
+    if mdns != [nm.HOSTNAME] or not mgr.mdns_ok:
+        bad.append("good ssid: mdns calls %r" % mdns)
+    sta = fakes.FakeWLAN.instances[0]
+    if sta.cfg.get("hostname") != nm.HOSTNAME:
+        bad.append("hostname not set before connect: %r" % sta.cfg)
+
+    # Link drop: a fresh attempt budget, then connected again without a second AP.
+    sta.drop()
+    run(mgr, 100)
+    if mgr.state != nm.ST_STA_CONNECTED or mgr.attempts != 1 or len(mdns) != 2:
+        bad.append("after drop: state %s attempts %d mdns %r" % (mgr.state, mgr.attempts, mdns))
+    if len(fakes.FakeWLAN.instances) != 1:
+        bad.append("after drop: %d interfaces created" % len(fakes.FakeWLAN.instances))
+    return bad
+
+
+def check_backoff_to_ap():
+    bad = []
+    mgr, log, mdns = make("elsewhere", bad=True)
+    run(mgr, 5000)
+    # Attempt 1 times out at 1000, backs off 500; attempt 2 at 1500 times out at 2500, backs
+    # off 1000; attempt 3 at 3500 times out at 4500 and the AP comes up.
+    want = [
+        (0, nm.ST_IDLE, nm.ST_STA_CONNECTING),
+        (1000, nm.ST_STA_CONNECTING, nm.ST_STA_BACKOFF),
+        (1500, nm.ST_STA_BACKOFF, nm.ST_STA_CONNECTING),
+        (2500, nm.ST_STA_CONNECTING, nm.ST_STA_BACKOFF),
+        (3500, nm.ST_STA_BACKOFF, nm.ST_STA_CONNECTING),
+        (4500, nm.ST_STA_CONNECTING, nm.ST_AP),
+    ]
+    if log != want:
+        bad.append("bad ssid transitions %r" % log)
+    sta, ap = (fakes.FakeWLAN.instances + [None])[:2]
+    if ap is None or ap.interface != fakes.FakeWLAN.AP_IF or ap.cfg.get("essid") != nm.AP_ESSID:
+        bad.append("no AP configured")
+    elif mgr.ip() != "192.168.4.1" or sta.active() or not mgr.is_ap():
+        bad.append("AP: ip %s, sta active %s" % (mgr.ip(), sta.active()))
+    if [e for e in sta.log if e[0] == "connect"] != [("connect", "elsewhere")] * 3:
+        bad.append("connect calls %r" % sta.log)
+    if mdns:
+        bad.append("mdns registered in AP mode: %r" % mdns)
+    return bad
+
+
+def check_no_ssid():
+    mgr, log, _ = make("")
+    if mgr.state != nm.ST_AP or [e[2] for e in log] != [nm.ST_AP]:
+        return ["no ssid: state %s transitions %r" % (mgr.state, log)]
+    return []
+
+
+def check():
+    """List of failure messages; empty when every case passed."""
+    return check_connect() + check_backoff_to_ap() + check_no_ssid()
+
+
+def main():
+    with contextlib.redirect_stdout(io.StringIO()):  # NetManager's connect progress lines
+        bad = check()
+    for msg in bad:
+        print("FAIL", msg)
+    print("network bring-up: %s" % ("FAIL" if bad else "ok"))
+    sys.exit(1 if bad else 0)
+
+
+if __name__ == "__main__":
+    main()
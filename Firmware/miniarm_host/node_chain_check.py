@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# Host check of the node side of the chain: three nodes built the way main.py builds them
+# (node_hooks.NodeHooks with node ids 1..3 from node.json) pass setpoint frames along, and
+# every node must apply its own joint's entry and report under that joint. A simulated
+# joint (simchain.SimNode) stands in for runtime.Runtime.
+#   python -m miniarm_host.node_chain_check       # exit 1 on a mismatch
+
+import sys
+
+from . import add_firmware_path
+from .simchain import SimNode
+
+add_firmware_path()
+import chain_proto  # noqa: E402
+import node_hooks  # noqa: E402
+
+N_NODES = 3
+
+
+class _Arm:
+    """The parts of webserver.RoboticArm the hooks touch."""
+
+    def __init__(self, n_joints):
+        self.position = [0] * n_joints
+        self.on_target = None
+        self.read_position = None
+        self.on_chain = None
+        self.read_state = None
+
+
+def build_chain(n_nodes=N_NODES):
+    """[(hooks, sim joint, node id)] in chain order."""
+    out = []
+    for node_id in range(1, n_nodes + 1):
+        sim = SimNode(node_id - 1, node_id=node_id, tau=1e-9)  # follows the setpoint at once
+        hooks = node_hooks.NodeHooks(node_id, sim, _Arm(n_nodes))
+        hooks.install()
+        out.append((hooks, sim, node_id))
+    return out
+
+
+def pass_frame(chain, payload):
+    # What chain_uart does at each hop: tag the frame, then let the handler append.
+    for hooks, _, node_id in chain:
+        payload = b'- via [%d]' % node_id + payload
+        payload += hooks.arm.on_chain(payload)
+    return payload
+
+
+def check(n_nodes=N_NODES):
+    """List of failure messages; empty when every node handled its own joint."""
+    chain = build_chain(n_nodes)
+    bad = []
+    for seq, setpoints in enumerate(([(100, 0), (200, 0), (300, 0)], [(1500, 10), (-700, -20), (4000, 30)])):
+        setpoints = setpoints[:n_nodes]
+        out = pass_frame(chain, chain_proto.format_setpoints(seq, setpoints))
+        states = chain_proto.parse_states(out)
+        if sorted(states) != list(range(n_nodes)):
+            bad.append("frame %d: states for joints %s, expected 0..%d" % (seq, sorted(states), n_nodes - 1))
+        for hooks, sim, node_id in chain:
+            joint = node_id - 1
+            want = setpoints[joint][0]
+            if hooks.joint != joint:
+                bad.append("node %d: joint %d, expected %d" % (node_id, hooks.joint, joint))
+            if sim.target != want:
+                bad.append("frame %d node %d: target %r, expected %d" % (seq, node_id, sim.target, want))
+            if joint in states and states[joint][0] != want:
+                bad.append("frame %d node %d: reported pos %d, expected %d" %
+                           (seq, node_id, states[joint][0], want))
+            pos = hooks.arm.read_position()
+            if pos[joint] != want:
+                bad.append("frame %d node %d: read_position %r" % (seq, node_id, pos))
+    # Web setpoints take the same conversion.
+    for hooks, sim, node_id in chain:
+        hooks.arm.on_target([11, 22, 33][:n_nodes], [0.0] * n_nodes)
+        if sim.target != [11, 22, 33][node_id - 1]:
+            bad.append("node %d: on_target set %r" % (node_id, sim.target))
+    return bad
+
+
+def main():
+    bad = check()
+    for msg in bad:
+        print("FAIL", msg)
+    print("%d-node chain: %s" % (N_NODES, "FAIL" if bad else "ok"))
+    sys.exit(1 if bad else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# Host check of runtime.Runtime in both of its modes: the Timer ISR path (fakes.FakeTimer
+# fired by hand, micropython.schedule queued here) and the _thread path on a real thread
+# against the real-time fake clock. Covers setpoint hand-over, the skipped tick when the
+# schedule queue is full, set_tick(), read_state() after the state ring filled up, and stop();
+# plus the gc_policy hand-over: background() marks a collection due, idle() runs it.
+#   python -m miniarm_host.runtime_check       # exit 1 on a mismatch
+
+import sys
+import time
+import types
+
+from . import fakes, add_firmware_path
+
+clock = fakes.install(realtime=True)
+add_firmware_path()
+import gc  # noqa: E402
+import gc_policy  # noqa: E402
+import runtime  # noqa: E402
+from metrics import stats  # noqa: E402
+
+
+class Scheduler:
+    """micropython.schedule with a one-deep queue, run by hand."""
+
+    def __init__(self):
+        self.pending = []
+
+    def schedule(self, fn, arg):
+        if self.pending:
+            raise RuntimeError("schedule queue full")
+        self.pending.append((fn, arg))
+
+    def run(self):
+        while self.pending:
+            fn, arg = self.pending.pop(0)
+            fn(arg)
+
+
+class Joint:
+    """tick/state_into pair that records what the runtime handed it."""
+
+    def __init__(self):
+        self.targets = []
+        self.ticks = 0
+
+    def tick(self, target, vel_ff):
+        self.targets.append((target, vel_ff))
+        self.ticks += 1
+        return True
+
+    def state_into(self, out):
+        out[0] = self.targets[-1][0]
+        out[1] = self.ticks
+
+
+def check_timer():
+    bad = []
+    sched = Scheduler()
+    runtime.micropython = types.SimpleNamespace(schedule=sched.schedule)
+    joint = Joint()
+    rt = runtime.Runtime(joint.tick, joint.state_into, initial_target=7)
+    rt.start_timer()
+    timer = rt._timer
+    if not isinstance(timer, fakes.FakeTimer) or timer.period != 1:
+        bad.append("timer: %r period %r" % (timer, getattr(timer, "period", None)))
+        return bad
+    timer.fire()
+    sched.run()
+    rt.command(100, 5.0)
+    timer.fire()
+    timer.fire()  # previous tick still pending: skipped, not queued twice
+    sched.run()
+    if joint.targets != [(7, 0.0), (100, 5.0)] or rt.ticks != 2:
+        bad.append("timer ticks %r (%d)" % (joint.targets, rt.ticks))
+    if list(rt.read_state()[:2]) != [100.0, 2.0]:
+        bad.append("timer read_state %r" % list(rt.read_state()))
+    rt.stop()
+    if timer.callback is not None or not rt.stopped:
+        bad.append("timer still armed after stop()")
+    return bad
+
+
+def wait_for(cond, timeout_s=2.0):
+    t_end = time.perf_counter() + timeout_s
+    while not cond():
+        if time.perf_counter() > t_end:
+            return False
+        time.sleep(0.001)
+    return True
+
+
+def check_thread():
+    bad = []
+    joint = Joint()
+    rt = runtime.Runtime(joint.tick, joint.state_into, interval_us=1000, initial_target=0)
+    rt.start_thread()
+    try:
+        rt.command(250)
+        if not wait_for(lambda: rt.read_state()[0] == 250):
+            bad.append("thread: setpoint never applied, state %r" % list(rt.read_state()))
+        # Nobody reads for a while, so the state ring fills and the control side drops the
+        # newest records; read_state() must still return a fresh one.
+        time.sleep(0.05)
+        ticks = joint.ticks
+        seen = rt.read_state()[1]
+        if seen < ticks:
+            bad.append("thread: read_state after a full ring gave tick %d, %d already ran" % (seen, ticks))
+
+        other = Joint()
+        old = rt.set_tick(other.tick, other.state_into)
+        if not wait_for(lambda: other.ticks > 2):
+            bad.append("thread: set_tick controller never ran")
+        rt.set_tick(*old)
+    finally:
+        rt.stop()
+    if not wait_for(lambda: rt.stopped):
+        bad.append("thread: still running after stop()")
+    return bad
+
+
+def check_gc_handoff():
+    bad = []
+    samples = []
+    mem_free = gc.mem_free
+    gc.mem_free = lambda: samples.append(1) or 100000
+    try:
+        policy = gc_policy.IdlePolicy(max_ms=0)  # every heap check finds a collection due
+        n = policy.check_every
+        gcs = stats.gc_count
+        if any(policy.background() for _ in range(n - 1)) or samples:
+            bad.append("background() sampled the heap before check_every passes")
+        if not policy.background() or stats.gc_count != gcs or len(samples) != 1:
+            bad.append("background(): due %s, %d collections, %d samples" %
+                       (policy.due, stats.gc_count - gcs, len(samples)))
+        if not policy.idle(0) or stats.gc_count != gcs + 1 or policy.due:
+            bad.append("idle() did not run the due collection")
+        # Nobody serves the next one (no control thread): background() collects itself.
+        for _ in range(2 * n):
+            policy.background()
+        if stats.gc_count != gcs + 2 or policy.due:
+            bad.append("unserved due collection: %d collections" % (stats.gc_count - gcs))
+    finally:
+        gc.mem_free = mem_free
+    return bad
+
+
+def check():
+    """List of failure messages; empty when every case passed."""
+    return check_timer() + check_thread() + check_gc_handoff()
+
+
+def main():
+    bad = check()
+    for msg in bad:
+        print("FAIL", msg)
+    print("control runtime: %s" % ("FAIL" if bad else "ok"))
+    sys.exit(1 if bad else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Simulated joint chain for the host gateway: stands in for the hardware so the gateway
+# can be exercised and benchmarked without boards. Each SimNode does what a real node's
+# chain_uart handlers do with a frame (tag it, apply its setpoint, append its state), using
+# the same chain_proto code as the firmware.
+
+import asyncio
+import time
+
+from . import add_firmware_path
+
+add_firmware_path()
+import chain_proto  # noqa: E402
+
+FAULT_ESTOP = 4  # supervisor.FAULT_ESTOP
+
+
+class SimNode:
+    """One joint: position follows the setpoint as a first-order lag with time constant tau."""
+
+    def __init__(self, joint, node_id=None, tau=0.05, pos=0.0):
+        self.joint = joint
+        self.node_id = joint + 1 if node_id is None else node_id
+        self.tau = tau
+        self.pos = pos
+        self.target = pos
+        self.fault = 0
+        self._t = time.monotonic()
+
+    def _advance(self):
+        now = time.monotonic()
+        dt = now - self._t
+        self._t = now
+        if not self.fault and self.tau > 0:
+            self.pos += (self.target - self.pos) * min(1.0, dt / self.tau)
+
+    def command(self, pos, vel):
+        self._advance()
+        if not self.fault:
+            self.target = pos
+
+    def read_state(self):
+        self._advance()
+        return (round(self.pos), round(self.target - self.pos), 0, self.fault)
+
+    def handle(self, payload):
+        """Payload in, forwarded payload out (what this node would put back on the wire)."""
+        payload = b'- via [%d]' % self.node_id + payload
+        if b'ESTOP' in payload:
+            self.fault = FAULT_ESTOP
+        elif b'RESET' in payload:
+            self.fault = 0
+        return payload + chain_proto.apply_setpoints(payload, self.joint, self.command, self.read_state)
+
+
+class SimChain:
+    """
+    n nodes in a ring. hop_delay_s is added per node; with baudrate set, the UART time of
+    the frame at each hop is added as well (10 bits per byte).
+    """
+
+    def __init__(self, n_joints, hop_delay_s=0.0, baudrate=None, tau=0.05):
+        self.nodes = [SimNode(j, tau=tau) for j in range(n_joints)]
+        self.hop_delay_s = hop_delay_s
+        self.baudrate = baudrate
+        self.frames = 0
+
+    async def exchange(self, payload):
+        for node in self.nodes:
+            delay = self.hop_delay_s
+            if self.baudrate:
+                delay += (len(payload) + 2) * 10 / self.baudrate
+            if delay > 0:
+                await asyncio.sleep(delay)
+            payload = node.handle(payload)
+        self.frames += 1
+        return payload
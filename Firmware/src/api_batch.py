@@ -0,0 +1,128 @@
+# Batched web API: several queries and commands in one request (POST /api/batch, or
+# GET /api/batch?q=system,position). Request body:
+#   {"q": ["position", "state", ...], "do": [{"op": "target", "pos": [..], "vel": [..]}, ...]}
+# Commands run first, then the queries, so a dashboard can set and read back in one trip.
+#
+# The response is JSON ({name: value, "do": [results]}) unless the client sends
+# "Accept: application/octet-stream", in which case it is a compact binary record:
+#   "MB" | u8 version | u8 n_items | n x ( u8 query id | u8 kind | u16 len | payload )
+# kind 'p' is a struct-packed payload (layout per query below), kind 'j' is JSON for
+# queries without a fixed layout. The command results use id DO_ID.
+# Shared with the host tools (miniarm_host.batch_client), so no MicroPython-only imports.
+
+import json
+import struct
+
+MAGIC = b"MB"
+VERSION = 1
+CONTENT_TYPE = "application/octet-stream"
+KIND_PACKED = 0x70  # 'p'
+KIND_JSON = 0x6A  # 'j'
+DO_ID = 0xFF
+
+# Query id = position in this tuple; append only.
+QUERIES = ("system", "uptime", "position", "target", "state", "safety", "program_status", "metrics")
+QUERY_IDS = {name: i for i, name in enumerate(QUERIES)}
+
+_ITEM = "<BBH"
+_SYSTEM = "<IIII"  # free_memory, uptime, storage_free_kb, storage_total_kb; + str device_id
+_STATE = "<iffB"  # pos, err, output, fault (runtime.ST_*)
+_SAFETY = "<BHH"  # tripped, trips, encoder_errors; + str fault
+
+
+def parse_queries(text):
+    """'a,b,c' from the query string -> known query names."""
+    return [q for q in text.split(",") if q in QUERY_IDS]
+
+
+def _pack_str(s):
+    b = s.encode()[:255]
+    return struct.pack("<B", len(b)) + b
+
+
+def _unpack_str(data, i):
+    n = data[i]
+    return bytes(data[i + 1:i + 1 + n]).decode(), i + 1 + n
+
+
+def _pack_ints(values):
+    return struct.pack("<B%di" % len(values), len(values), *[int(v) for v in values])
+
+
+def pack_value(name, value):
+    """(kind, payload bytes) for one query result."""
+    if name == "uptime":
+        return KIND_PACKED, struct.pack("<I", value)
+    if name in ("position", "target"):
+        return KIND_PACKED, _pack_ints(value)
+    if name == "state":
+        return KIND_PACKED, struct.pack(_STATE, int(value[0]), value[1], value[2], int(value[3]))
+    if name == "system":
+        head = struct.pack(_SYSTEM, value["free_memory"], value["uptime"], value["storage_free_kb"],
+                           value["storage_total_kb"])
+        return KIND_PACKED, head + _pack_str(value["device_id"])
+    if name == "safety":
+        head = struct.pack(_SAFETY, int(value["tripped"]), value["trips"], value["encoder_errors"])
+        return KIND_PACKED, head + _pack_str(str(value["fault"]))
+    return KIND_JSON, json.dumps(value).encode()
+
+
+def unpack_value(name, kind, data):
+    if kind == KIND_JSON:
+        return json.loads(bytes(data))
+    if name == "uptime":
+        return struct.unpack("<I", data)[0]
+    if name in ("position", "target"):
+        return list(struct.unpack_from("<%di" % data[0], data, 1))
+    if name == "state":
+        return list(struct.unpack(_STATE, data))
+    if name == "system":
+        free, up, fs_free, fs_total = struct.unpack_from(_SYSTEM, data)
+        dev, _ = _unpack_str(data, struct.calcsize(_SYSTEM))
+        return {
+            "device_id": dev,
+            "free_memory": free,
+            "uptime": up,
+            "storage": "%dKB free / %dKB total" % (fs_free, fs_total),
+            "storage_free_kb": fs_free,
+            "storage_total_kb": fs_total,
+        }
+    if name == "safety":
+        tripped, trips, enc = struct.unpack_from(_SAFETY, data)
+        fault, _ = _unpack_str(data, struct.calcsize(_SAFETY))
+        return {"tripped": bool(tripped), "fault": fault, "trips": trips, "encoder_errors": enc}
+    raise ValueError("No binary layout for %s" % name)
+
+
+def encode(results, done=None):
+    """results: [(name, value)] in request order; done: command results or None."""
+    items = []
+    for name, value in results:
+        kind, payload = pack_value(name, value)
+        items.append(struct.pack(_ITEM, QUERY_IDS[name], kind, len(payload)) + payload)
+    if done is not None:
+        payload = json.dumps(done).encode()
+        items.append(struct.pack(_ITEM, DO_ID, KIND_JSON, len(payload)) + payload)
+    return MAGIC + struct.pack("<BB", VERSION, len(items)) + b"".join(items)
+
+
+def decode(data):
+    """Binary response -> the same dict the JSON response carries."""
+    if data[:2] != MAGIC:
+        raise ValueError("Not a batch response")
+    version, n = struct.unpack_from("<BB", data, 2)
+    if version != VERSION:
+        raise ValueError("Unsupported batch version %d" % version)
+    out = {}
+    i = 4
+    for _ in range(n):
+        qid, kind, length = struct.unpack_from(_ITEM, data, i)
+        i += struct.calcsize(_ITEM)
+        payload = data[i:i + length]
+        i += length
+        if qid == DO_ID:
+            out["do"] = json.loads(bytes(payload))
+        else:
+            name = QUERIES[qid]
+            out[name] = unpack_value(name, kind, payload)
+    return out
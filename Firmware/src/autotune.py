@@ -0,0 +1,203 @@
+# PID autotune for one joint.
+# relay_test(): bang-bang around the current position, measure the limit cycle and use the
+# ultimate gain/period (Astrom-Hagglund) with a tuning rule.
+# step_test(): open-loop duty step, identify K/(s(tau*s+1)) from the velocity response and
+# place the closed-loop poles; the same model also gives cascade gains (gains_for_cascade).
+# Gains are in pid_control units: error in counts, time in seconds, output in duty.
+# Every result goes through check_gains(), so a failed experiment raises ValueError
+# instead of storing zero, negative or non-finite gains.
+
+import math
+import utime
+from array import array
+
+# rule -> (kp/Ku, Ti/Tu, Td/Tu)
+RULES = {
+    "zn": (0.6, 0.5, 0.125),  # Ziegler-Nichols, fast, ~25% overshoot
+    "tl": (0.45, 2.2, 1 / 6.3),  # Tyreus-Luyben, more damping
+    "no_overshoot": (0.2, 0.5, 1 / 3),
+}
+DEFAULT_RULE = "tl"
+
+
+# ========== Sample buffer ==========
+
+
+class Samples:
+    """Preallocated (t_us, pos, out) log; no allocation while the experiment runs."""
+
+    def __init__(self, n):
+        self.t = array('l', [0] * n)
+        self.pos = array('l', [0] * n)
+        self.out = array('h', [0] * n)
+        self.n = 0
+
+    def add(self, t, pos, out):
+        i = self.n
+        if i >= len(self.t):
+            return False
+        self.t[i] = t
+        self.pos[i] = pos
+        self.out[i] = out
+        self.n = i + 1
+        return True
+
+
+# ========== Experiments ==========
+
+
+def relay_test(read,
+               set_motor,
+               diff,
+               amplitude=400,
+               hysteresis=8,
+               cycles=6,
+               interval_us=2000,
+               max_samples=2000):
+    """
+    read() -> counts, set_motor(duty), diff(a, b) -> wrapped a-b.
+    Returns Samples; the motor is stopped on exit.
+    """
+    log = Samples(max_samples)
+    center = read()
+    out = amplitude
+    switches = 0
+    t0 = utime.ticks_us()
+    try:
+        set_motor(out)
+        while switches < 2 * cycles + 2:
+            e = diff(read(), center)
+            if out > 0 and e > hysteresis:
+                out = -amplitude
+                switches += 1
+                set_motor(out)
+            elif out < 0 and e < -hysteresis:
+                out = amplitude
+                switches += 1
+                set_motor(out)
+            if not log.add(utime.ticks_diff(utime.ticks_us(), t0), e, out):
+                break
+            utime.sleep_us(interval_us)
+    finally:
+        set_motor(0)
+    return log
+
+
+def step_test(read, set_motor, diff, duty=400, duration_ms=600, interval_us=2000, max_samples=1000):
+    log = Samples(max_samples)
+    prev = read()
+    pos = 0  # unwrapped from per-sample diffs: a fast joint turns more than half a turn
+    t0 = utime.ticks_us()
+    try:
+        set_motor(duty)
+        while True:
+            t = utime.ticks_diff(utime.ticks_us(), t0)
+            cur = read()
+            pos += diff(cur, prev)
+            prev = cur
+            if t > duration_ms * 1000 or not log.add(t, pos, duty):
+                break
+            utime.sleep_us(interval_us)
+    finally:
+        set_motor(0)
+    return log
+
+
+# ========== Analysis ==========
+
+
+def analyze_relay(log, amplitude, skip_cycles=1):
+    """Ultimate gain Ku and period Tu (s) from the relay limit cycle."""
+    # Rising edges of the relay output mark full periods.
+    edges = []
+    for i in range(1, log.n):
+        if log.out[i] > 0 and log.out[i - 1] < 0:
+            edges.append(i)
+    edges = edges[skip_cycles:]
+    if len(edges) < 2:
+        raise ValueError("Relay test did not oscillate")
+    periods = [(log.t[edges[k + 1]] - log.t[edges[k]]) / 1e6 for k in range(len(edges) - 1)]
+    tu = sum(periods) / len(periods)
+
+    lo = hi = log.pos[edges[0]]
+    for i in range(edges[0], edges[-1]):
+        p = log.pos[i]
+        if p < lo:
+            lo = p
+        if p > hi:
+            hi = p
+    a = (hi - lo) / 2
+    if a <= 0:
+        raise ValueError("Relay test amplitude is zero")
+    ku = 4 * amplitude / (math.pi * a)
+    return ku, tu
+
+
+def check_gains(**gains):
+    """Raise ValueError unless every gain is finite and > 0; returns the gains in order."""
+    for name, v in gains.items():
+        if not (v > 0 and v < math.inf):  # also false for NaN
+            raise ValueError("Autotune gave %s=%r; not saving" % (name, v))
+    return tuple(gains.values())
+
+
+def gains_from_relay(ku, tu, rule=DEFAULT_RULE):
+    if not (ku > 0 and tu > 0):
+        raise ValueError("Relay result unusable: Ku=%r Tu=%r" % (ku, tu))
+    kp_f, ti_f, td_f = RULES[rule]
+    kp = kp_f * ku
+    ki = kp / (ti_f * tu)
+    kd = kp * td_f * tu
+    return check_gains(kp=kp, ki=ki, kd=kd)
+
+
+def analyze_step(log, duty):
+    """Returns (K, tau): steady velocity per duty (counts/s/duty) and time constant (s)."""
+    n = log.n
+    if n < 10:
+        raise ValueError("Step test too short")
+    vel = [0.0] * n
+    for i in range(1, n):
+        dt = (log.t[i] - log.t[i - 1]) / 1e6
+        vel[i] = (log.pos[i] - log.pos[i - 1]) / dt if dt > 0 else vel[i - 1]
+    tail = vel[n - n // 4:]
+    v_ss = sum(tail) / len(tail)
+    if v_ss == 0:
+        raise ValueError("Joint did not move during step test")
+    if (v_ss > 0) != (duty > 0):
+        # K <= 0: the joint ran against the duty, so feedback would be positive.
+        raise ValueError("Joint moved against the step duty (check motor flip)")
+    target = 0.632 * v_ss
+    tau = log.t[n - 1] / 1e6
+    for i in range(1, n):
+        if (vel[i] >= target) if v_ss > 0 else (vel[i] <= target):
+            tau = log.t[i] / 1e6
+            break
+    return v_ss / duty, tau
+
+
+def gains_from_model(k, tau, wn=None, zeta=1.0, ki_ratio=0.1):
+    """
+    Pole placement for K/(s(tau*s+1)) under PD: tau*s^2 + (1 + K*kd)*s + K*kp.
+    wn defaults to 2/tau, kept above the open-loop pole so kd stays positive.
+    """
+    if not (k > 0 and tau > 0):
+        raise ValueError("Step model unusable: K=%r tau=%r" % (k, tau))
+    if wn is None:
+        wn = 2.0 / tau
+    kp = tau * wn * wn / k
+    kd = (2 * zeta * wn * tau - 1) / k
+    ki = kp * wn * ki_ratio
+    return check_gains(kp=kp, ki=ki, kd=kd)
+
+
+def gains_for_cascade(k, tau, vel_bw=4.0, pos_ratio=0.25):
+    """
+    Cascade gains for the same model. Inner PI cancels the motor pole (vel_ki/vel_kp = 1/tau),
+    leaving a velocity loop with bandwidth vel_bw/tau; the outer P is pos_ratio of that,
+    so the two loops stay apart. Returns (pos_kp, vel_kp, vel_ki).
+    """
+    if not (k > 0 and tau > 0):
+        raise ValueError("Step model unusable: K=%r tau=%r" % (k, tau))
+    wv = vel_bw / tau
+    return check_gains(pos_kp=wv * pos_ratio, vel_kp=wv * tau / k, vel_ki=wv / k)
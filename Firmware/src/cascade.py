@@ -0,0 +1,84 @@
+# Cascaded joint controller: inner velocity PI every tick, outer position PI every
+# `divider` ticks. Both stages use back-calculation anti-windup: the integrator is pulled
+# back by kt * (saturated - unsaturated) so it stops growing as soon as the output clips,
+# instead of a fixed clamp on the I term.
+# Pure arithmetic, no hardware access; pid_control.cascade_run() wires it to the joint.
+
+import fastpath
+
+
+class PIStage:
+
+    def __init__(self, kp, ki, limit, kt=None, kff=0.0):
+        self.kp = kp
+        self.ki = ki
+        self.limit = limit
+        # Tracking gain; ki/kp (i.e. 1/Ti) is the usual choice.
+        self.kt = kt if kt is not None else (ki / kp if kp else 0.0)
+        self.kff = kff
+        self.integral = 0.0
+        self.out = 0.0
+        self.saturated = False
+
+    def reset(self, integral=0.0):
+        self.integral = integral
+        self.out = 0.0
+        self.saturated = False
+
+    # update(err, dt, ff=0.0) -> saturated output; native-compiled when available.
+    update = fastpath.pi_update
+
+
+class CascadeParam:
+    # Outer: counts error -> velocity command (counts/s)
+    pos_kp = 20.0
+    pos_ki = 0.0
+    vel_limit = 8000.0
+    # Inner: velocity error (counts/s) -> duty
+    vel_kp = 0.08
+    vel_ki = 1.5
+    out_limit = 1023.0
+    vel_kff = 0.0  # duty per counts/s of commanded velocity
+    divider = 5  # outer loop runs every N inner ticks
+    vel_alpha = 0.5  # IIR weight of the newest velocity sample
+
+    def __str__(self):
+        return (f"pos kp:{self.pos_kp} ki:{self.pos_ki} vlim:{self.vel_limit} , "
+                f"vel kp:{self.vel_kp} ki:{self.vel_ki} kff:{self.vel_kff} , div:{self.divider}")
+
+
+class Cascade:
+
+    def __init__(self, param):
+        self.param = param
+        self.pos = PIStage(param.pos_kp, param.pos_ki, param.vel_limit)
+        self.vel = PIStage(param.vel_kp, param.vel_ki, param.out_limit, kff=param.vel_kff)
+        self.divider = param.divider
+        self.alpha = param.vel_alpha
+        self.reset()
+
+    def reset(self):
+        self.pos.reset()
+        self.vel.reset()
+        self.tick = 0
+        self.vel_cmd = 0.0
+        self.vel_est = 0.0
+        self._outer_dt = 0.0
+
+    def update(self, pos_err, vel_meas, dt, vel_ff=0.0):
+        """
+        pos_err: wrapped target - position (counts), vel_meas: counts/s, dt: s.
+        vel_ff: planner velocity added to the outer loop output. Returns duty.
+        """
+        a = self.alpha
+        self.vel_est += a * (vel_meas - self.vel_est)
+
+        self._outer_dt += dt
+        if self.tick == 0:
+            self.vel_cmd = self.pos.update(pos_err, self._outer_dt) + vel_ff
+            self._outer_dt = 0.0
+        self.tick += 1
+        if self.tick >= self.divider:
+            self.tick = 0
+
+        return self.vel.update(self.vel_cmd - self.vel_est, dt, self.vel_cmd)
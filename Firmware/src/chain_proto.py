@@ -0,0 +1,76 @@
+# Control traffic carried in chain frames (see chain_uart for the framing).
+# Setpoint frame payload, one entry per joint in chain order:
+#   SP <seq> <pos0>:<vel0> <pos1>:<vel1> ...
+# Every node applies its own entry and appends its state before forwarding:
+#   ... [<joint>]=<pos>,<err>,<fault>
+# Text on purpose: it stays readable in the [RX] logs and needs no struct packing.
+# Shared with the host gateway (miniarm_host.gateway), so no MicroPython-only imports.
+
+SETPOINT = b'SP '
+
+
+def format_setpoints(seq, setpoints):
+    """setpoints: [(pos counts, vel counts/s)] in joint order -> frame payload bytes."""
+    parts = [b'SP %d' % seq]
+    for pos, vel in setpoints:
+        parts.append(b'%d:%d' % (int(pos), int(vel)))
+    return b' '.join(parts)
+
+
+def find_setpoint(payload, joint):
+    """(seq, pos, vel) for `joint` from a frame payload, or None if it has no entry for it."""
+    payload = bytes(payload)
+    i = payload.find(SETPOINT)
+    if i < 0:
+        return None
+    fields = payload[i + len(SETPOINT):].split(b' ')
+    try:
+        seq = int(fields[0])
+        entry = fields[1 + joint]
+        pos, _, vel = entry.partition(b':')
+        return seq, int(pos), int(vel)
+    except (IndexError, ValueError):
+        return None
+
+
+def format_state(joint, pos, err, fault):
+    return b' [%d]=%d,%d,%d' % (joint, int(pos), int(err), int(fault))
+
+
+def parse_states(payload):
+    """{joint: (pos, err, fault)} for every state token in a returned frame."""
+    out = {}
+    for token in bytes(payload).split(b' '):
+        # The "- via [n]" tags never have "]=", so they are skipped here.
+        if not token.startswith(b'[') or b']=' not in token:
+            continue
+        joint, _, vals = token[1:].partition(b']=')
+        vals = vals.split(b',')
+        try:
+            out[int(joint)] = (int(vals[0]), int(vals[1]), int(vals[2]))
+        except (IndexError, ValueError):
+            pass
+    return out
+
+
+def apply_setpoints(payload, joint, command, read_state):
+    """
+    Apply this joint's entry: command(pos, vel) gets the setpoint, read_state() ->
+    (pos, err, output, fault) is reported. Returns the state token to append (b'' if none).
+    """
+    sp = find_setpoint(payload, joint)
+    if sp is None:
+        return b''
+    command(sp[1], sp[2])
+    st = read_state()
+    return format_state(joint, st[0], st[1], st[3])
+
+
+def setpoint_handler(joint, command, read_state):
+    # chain_uart handler form of apply_setpoints().
+
+    def handle(frame):
+        if SETPOINT in frame:
+            frame.extend(apply_setpoints(frame.view(), joint, command, read_state))
+
+    return handle
@@ -1,6 +1,13 @@
+# Daisy-chain UART link. Frames are START ... END; each node tags the frame with
+# "- via [id]", runs the registered handlers on it and forwards it to the next node.
+# Receive is event driven: the UART RX-idle interrupt drains the hardware FIFO into a
+# preallocated ring and complete frames are dispatched straight from the callback, so a
+# frame is handled as soon as the line goes quiet instead of on the next poll.
+
 import machine
 import time
-import select
+
+from supervisor import safety, FAULT_ESTOP
 
 # === CONFIGURABLE UART PINS ===
 TX_PIN = 0  # Replace with your wiring
@@ -13,6 +20,17 @@ uart = machine.UART(1, tx=machine.Pin(TX_PIN), rx=machine.Pin(RX_PIN), baudrate=
 # === Simple framing ===
 START = b'\xAA'
 END = b'\xA5'
+START_BYTE = START[0]
+END_BYTE = END[0]
+# Each node adds a "- via [n]" tag and a state token to the frame, and the frame carries a
+# setpoint per node (chain_proto): about 45 bytes per node with multi-turn positions.
+CHAIN_NODES = 3  # joints in the chain, as the gateway's --joints
+NODE_BYTES = 48
+MAX_FRAME = 16 + CHAIN_NODES * NODE_BYTES
+RING_SIZE = 256
+# RX idle fires once the line has been quiet for a character time (IRQ_RX where that is
+# all the port has). 0 means the port has neither and pump() must be polled.
+RX_TRIGGER = getattr(machine.UART, "IRQ_RXIDLE", 0) or getattr(machine.UART, "IRQ_RX", 0)
 
 # === IDENTITY ===
 NODE_ID = 2  # Give each board a different ID (1, 2, 3)
@@ -26,56 +44,225 @@ def inject_message():
     print("[TX] Injected:", framed)
 
 
-# === Process incoming data ===
-def process_uart():
-    buf = bytearray()
-    poller = select.poll()
-    poller.register(uart, select.POLLIN)
-    byte_timeout_ms = int((10 / BAUDRATE) * 1000 * 2)  # 2x margin
-
-    if not uart.any():
-        # nothing to recv.
-        return False
-
-    while True:
-        events = poller.poll(byte_timeout_ms)
-        if uart.any():
-            b = uart.read(1)
-            if not b:
-                continue
-            if b == START:
-                buf = bytearray()
-                buf.append(b[0])
-                buf.extend(b'- via [%d]' % NODE_ID)
-            elif b == END:
-                buf.append(b[0])
-                print("[RX]", bytes(buf))
-                time.sleep(0.01)
-                if NODE_ID == 1:
-                    # Kill the loop
-                    return True
-                else:
-                    uart.write(buf)  # Forward it
-                    print("[TX] Forwarded content:", buf)
-                    return False
-            else:
-                buf.append(b[0])
+# === Safety commands carried on the chain ===
+# Any frame containing ESTOP latches the local supervisor, RESET clears it, SAFE? appends
+# this node's fault state to the frame before it is forwarded.
+def handle_safety(buf):
+    if b'ESTOP' in buf:
+        safety.trip(FAULT_ESTOP)
+    elif b'RESET' in buf:
+        safety.reset()
+    elif b'SAFE?' in buf:
+        buf.extend(b' [%d]:%s' % (NODE_ID, safety.status()["fault"].encode()))
+
+
+# === Receive path ===
+
+
+class ByteRing:
+    """Preallocated byte FIFO: the RX interrupt writes, the frame parser reads."""
+
+    def __init__(self, size):
+        self.buf = bytearray(size)
+        self.size = size
+        self.head = 0
+        self.tail = 0
+        self.dropped = 0
+
+    def put(self, src, n):
+        buf = self.buf
+        for i in range(n):
+            h = self.head + 1
+            if h == self.size:
+                h = 0
+            if h == self.tail:
+                self.dropped += n - i
+                return
+            buf[self.head] = src[i]
+            self.head = h
+
+    def get(self):
+        # -1 when empty, so the parser needs no exception or tuple.
+        t = self.tail
+        if t == self.head:
+            return -1
+        b = self.buf[t]
+        t += 1
+        self.tail = 0 if t == self.size else t
+        return b
+
+    def __len__(self):
+        return (self.head - self.tail) % self.size
+
+
+class Frame:
+    """
+    Fixed-size frame buffer handed to handlers. Supports `in` and extend() like the
+    bytearray it replaces; bytes past `size` are dropped and flag the frame as overflowed.
+    """
+
+    def __init__(self, size):
+        self.buf = bytearray(size)
+        self.mv = memoryview(self.buf)
+        self.n = 0
+        self.overflow = False
+
+    def clear(self):
+        self.n = 0
+        self.overflow = False
+
+    def append(self, b):
+        if self.n < len(self.buf):
+            self.buf[self.n] = b
+            self.n += 1
         else:
-            print(f"poll timeout, event state {events}")
-            break
-    print("buf content: ", bytes(buf))
-    return False
+            self.overflow = True
+
+    def extend(self, data):
+        for b in data:
+            self.append(b)
+
+    def view(self):
+        return self.mv[:self.n]
+
+    def __contains__(self, sub):
+        # Once per frame, so the bytes() copy is acceptable.
+        return sub in bytes(self.view())
+
+    def __len__(self):
+        return self.n
+
+
+class ChainReceiver:
+    """
+    handlers are called as fn(frame) with the frame (tag included, END not yet appended)
+    in registration order; they may extend() it before it is forwarded.
+    """
+
+    def __init__(self, uart, node_id=NODE_ID, ring_size=RING_SIZE, max_frame=MAX_FRAME):
+        self.uart = uart
+        self.ring = ByteRing(ring_size)
+        self.frame = Frame(max_frame)
+        self.handlers = []
+        self.irq = False
+        self.frames = 0
+        self.overflows = 0
+        self._via = b'- via [%d]' % node_id
+        self._scratch = bytearray(32)
+        self._in_frame = False
+
+    def add_handler(self, fn):
+        self.handlers.append(fn)
+
+    def remove_handler(self, fn):
+        if fn in self.handlers:
+            self.handlers.remove(fn)
+
+    def start(self):
+        """Hook the RX interrupt; returns False if this port needs pump() polled instead."""
+        if RX_TRIGGER:
+            try:
+                self.uart.irq(handler=self._irq, trigger=RX_TRIGGER)
+                self.irq = True
+            except (AttributeError, TypeError, ValueError):
+                self.irq = False
+        return self.irq
+
+    def stop(self):
+        if self.irq:
+            self.uart.irq(handler=None)
+            self.irq = False
+
+    def _irq(self, _uart):
+        self.pump()
+
+    def pump(self):
+        """Move everything the UART holds into the ring and dispatch complete frames."""
+        uart = self.uart
+        scratch = self._scratch
+        while uart.any():
+            n = uart.readinto(scratch)
+            if not n:
+                break
+            self.ring.put(scratch, n)
+            self._parse()
+
+    def _parse(self):
+        ring = self.ring
+        frame = self.frame
+        while True:
+            b = ring.get()
+            if b < 0:
+                return
+            if b == START_BYTE:
+                frame.clear()
+                frame.append(b)
+                frame.extend(self._via)
+                self._in_frame = True
+            elif not self._in_frame:
+                continue  # line noise between frames
+            elif b == END_BYTE:
+                self._in_frame = False
+                if frame.overflow:
+                    self._overflow(frame)
+                    continue
+                self.frames += 1
+                for fn in self.handlers:
+                    fn(frame)
+            else:
+                frame.append(b)
+
+    def _overflow(self, frame):
+        # A cut-off token would parse as a wrong value further down, so the frame stops here.
+        self.overflows += 1
+        print("[RX] frame over %d bytes dropped (%d so far)" % (len(frame.buf), self.overflows))
+
+    def forward(self, frame):
+        """Handler that sends the frame on to the next node, unless a handler overflowed it."""
+        frame.append(END_BYTE)
+        if frame.overflow:
+            self._overflow(frame)
+            return
+        self.uart.write(frame.view())
+
+
+def log_frame(frame):
+    print("[RX]", bytes(frame.view()))
+
+
+receiver = ChainReceiver(uart)
+done = False
+
+
+def _finish(frame):
+    # Node 1 injected the message; its return ends the round trip.
+    global done
+    done = True
+
+
+def process_uart():
+    # Polling fallback for ports without a UART RX interrupt. Returns True once done.
+    receiver.pump()
+    return done
 
 
 # === Main loop ===
 def main_loop():
     print("Node %d started" % NODE_ID)
+    receiver.add_handler(handle_safety)
+    receiver.add_handler(log_frame)
+    receiver.add_handler(_finish if NODE_ID == 1 else receiver.forward)
+    if not receiver.start():
+        print("UART RX interrupt not available, polling")
     time.sleep(0.5)
 
     if NODE_ID == 1:
         inject_message()
 
-    while True:
-        if (process_uart()):
-            break
-        time.sleep(0.01)
+    while not done:
+        if not receiver.irq:
+            receiver.pump()
+            time.sleep_ms(1)
+        else:
+            time.sleep_ms(100)
+    receiver.stop()
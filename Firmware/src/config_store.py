@@ -0,0 +1,297 @@
+# Persistent node settings behind one cache.
+# Every section (Wi-Fi, node, PID and cascade gains, motor calibration) has a typed schema and its own
+# file. A section is read from flash once, on first use; after that get() is served from
+# RAM, and update() validates, changes the cached copy and writes the file straight
+# through. Files are replaced atomically (write "<name>.tmp", then rename over the old
+# one), so a power cut leaves either the old or the new settings, never half of either.
+#
+# Each file carries the section's schema version. Loading fills fields missing from an
+# older file with defaults and keeps keys the schema does not know (node.json has
+# free-form entries such as encoder_pins).
+#
+# Sections are JSON by default. FORMAT_BIN stores the same fields in a compact tagged
+# binary record, for sections that are rewritten often:
+#   "CF" | u8 version | u8 n_fields | n x ( u8 key_len | key | u8 tag | value )
+#   tag b: u8, i: i32, f: f32, s: u8 len + utf-8, j: u16 len + JSON (anything else)
+# A section is found in either format, so switching formats migrates on the next write.
+
+import struct
+import ujson
+import uos
+
+FORMAT_JSON = "json"
+FORMAT_BIN = "bin"
+MAGIC = b"CF"
+VERSION_KEY = "_v"
+TMP_SUFFIX = ".tmp"
+
+
+class Section:
+    """
+    name: file stem, fields: {key: (type, default)}, version: bump on incompatible changes.
+    A default of None makes the field optional: type-checked when present, absent otherwise.
+    """
+
+    def __init__(self, name, fields, version=1, fmt=FORMAT_JSON):
+        self.name = name
+        self.fields = fields
+        self.version = version
+        self.fmt = fmt
+
+    def defaults(self):
+        return {k: d for k, (_, d) in self.fields.items() if d is not None}
+
+    def coerce(self, key, value):
+        spec = self.fields.get(key)
+        if spec is None:
+            return value
+        typ = spec[0]
+        if typ is float and isinstance(value, int):
+            return float(value)
+        if (typ is int and isinstance(value, bool)) or not isinstance(value, typ):
+            raise ValueError("config %s.%s: expected %s, got %r" % (self.name, key, typ.__name__, value))
+        return value
+
+
+SECTIONS = {}
+
+
+def register(section):
+    SECTIONS[section.name] = section
+    return section
+
+
+WIFI = register(Section("config", {
+    "ssid": (str, ""),
+    "password": (str, ""),
+}))
+
+# build.py writes node_index (the 1-based node id, see node_hooks) into node.json; the rest
+# are optional hardware overrides whose defaults live with the drivers (encoders, motor_out).
+NODE = register(Section("node", {
+    "node_index": (int, 0),
+    "encoder": (str, None),
+    "encoder_pins": (dict, None),
+    "encoder_addr": (int, None),
+    "spi_baud": (int, None),
+    "enc_samples": (int, None),
+    "enc_filter": (str, None),
+    "enc_outlier": (int, None),
+    "enc_min_good": (int, None),
+    "pwm_freq": (int, None),
+    "decay": (str, None),
+    "char_on_boot": (bool, None),  # run motor_char in setup() while motor.json has no result
+    "boot_tone": (bool, False),  # jingle before control starts; the joint is unheld meanwhile
+    "watchdog": (bool, True),  # arm the hardware WDT once the control thread runs (main.py)
+}))
+
+PID = register(Section("pid", {
+    "kp": (float, 2.0),
+    "ki": (float, 5.0),
+    "kd": (float, 0.2),
+}))
+
+# Cascade gains (pid_control.CascadeLoop); absent fields keep the cascade.CascadeParam defaults.
+CASCADE = register(Section("cascade", {
+    "pos_kp": (float, None),
+    "vel_kp": (float, None),
+    "vel_ki": (float, None),
+}))
+
+MOTOR = register(Section("motor", {
+    "flip": (bool, False),
+    "deadband_fwd": (int, 0),
+    "deadband_rev": (int, 0),
+    "vel_per_duty": (float, 0.0),
+}))
+
+# ========== Atomic file write ==========
+
+
+def atomic_write(path, data):
+    """Replace path with data (bytes or str) via a temp file and rename."""
+    tmp = path + TMP_SUFFIX
+    with open(tmp, "wb" if isinstance(data, (bytes, bytearray)) else "w") as f:
+        f.write(data)
+    try:
+        uos.rename(tmp, path)
+    except OSError:
+        # FAT will not rename over an existing file; LittleFS (the ESP32 default) does.
+        uos.remove(path)
+        uos.rename(tmp, path)
+    if hasattr(uos, "sync"):
+        uos.sync()
+
+
+def _read(path, mode="r"):
+    try:
+        with open(path, mode) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+# ========== Binary records ==========
+
+
+def encode_bin(values, version):
+    out = bytearray(MAGIC)
+    out += struct.pack("<BB", version, len(values))
+    for key, v in values.items():
+        k = key.encode()
+        out += struct.pack("<B", len(k)) + k
+        if isinstance(v, bool):
+            out += b"b" + struct.pack("<B", v)
+        elif isinstance(v, int) and -0x80000000 <= v <= 0x7FFFFFFF:
+            out += b"i" + struct.pack("<i", v)
+        elif isinstance(v, float):
+            out += b"f" + struct.pack("<f", v)
+        elif isinstance(v, str) and len(v.encode()) < 256:
+            s = v.encode()
+            out += b"s" + struct.pack("<B", len(s)) + s
+        else:
+            s = ujson.dumps(v).encode()
+            out += b"j" + struct.pack("<H", len(s)) + s
+    return bytes(out)
+
+
+def decode_bin(data):
+    """Returns (version, values); raises ValueError on a bad record."""
+    if data[:2] != MAGIC:
+        raise ValueError("Not a config record")
+    version, n = struct.unpack_from("<BB", data, 2)
+    i = 4
+    values = {}
+    for _ in range(n):
+        kl = data[i]
+        key = bytes(data[i + 1:i + 1 + kl]).decode()
+        i += 1 + kl
+        tag = data[i]
+        i += 1
+        if tag == 0x62:  # b
+            v = bool(data[i])
+            i += 1
+        elif tag == 0x69:  # i
+            v = struct.unpack_from("<i", data, i)[0]
+            i += 4
+        elif tag == 0x66:  # f
+            v = struct.unpack_from("<f", data, i)[0]
+            i += 4
+        elif tag == 0x73:  # s
+            sl = data[i]
+            v = bytes(data[i + 1:i + 1 + sl]).decode()
+            i += 1 + sl
+        elif tag == 0x6A:  # j
+            sl = struct.unpack_from("<H", data, i)[0]
+            v = ujson.loads(bytes(data[i + 2:i + 2 + sl]))
+            i += 2 + sl
+        else:
+            raise ValueError("Bad config tag %d" % tag)
+        values[key] = v
+    return version, values
+
+
+# ========== Store ==========
+
+
+class ConfigStore:
+
+    def __init__(self, root=""):
+        self.root = root
+        self._cache = {}
+        self.loads = 0  # flash reads, for checking that handlers stay on the cache
+        self.writes = 0
+
+    def path(self, name, fmt):
+        return "%s%s.%s" % (self.root, name, fmt)
+
+    def _load_file(self, section, fmt):
+        p = self.path(section.name, fmt)
+        mode = "rb" if fmt == FORMAT_BIN else "r"
+        data = _read(p, mode)
+        if data is None:
+            # Interrupted between writing the temp file and the rename.
+            data = _read(p + TMP_SUFFIX, mode)
+        if data is None:
+            return None
+        self.loads += 1
+        try:
+            if fmt == FORMAT_BIN:
+                return decode_bin(data)
+            values = ujson.loads(data)
+            return values.pop(VERSION_KEY, 0), values
+        except Exception as e:
+            print("config: ignoring corrupt %s (%s)" % (p, e))
+            return None
+
+    def _load(self, section):
+        other = FORMAT_BIN if section.fmt == FORMAT_JSON else FORMAT_JSON
+        found = self._load_file(section, section.fmt) or self._load_file(section, other)
+        values = section.defaults()
+        if found is not None:
+            version, stored = found
+            if version > section.version:
+                print("config: %s is version %d, expected <= %d" % (section.name, version, section.version))
+            for key, v in stored.items():
+                try:
+                    values[key] = section.coerce(key, v)
+                except ValueError as e:
+                    print(e)  # keep the default
+        return values
+
+    def get(self, name):
+        """Cached values of a section. Treat as read-only; change them with update()."""
+        values = self._cache.get(name)
+        if values is None:
+            values = self._load(SECTIONS[name])
+            self._cache[name] = values
+        return values
+
+    def update(self, name, **changes):
+        """Validate, apply to the cache and write through. Returns True if anything changed."""
+        section = SECTIONS[name]
+        values = self.get(name)
+        new = {k: section.coerce(k, v) for k, v in changes.items()}
+        if all(k in values and values[k] == v for k, v in new.items()):
+            return False
+        values.update(new)
+        self.save(name)
+        return True
+
+    def save(self, name):
+        section = SECTIONS[name]
+        values = self.get(name)
+        if section.fmt == FORMAT_BIN:
+            data = encode_bin(values, section.version)
+        else:
+            record = dict(values)
+            record[VERSION_KEY] = section.version
+            data = ujson.dumps(record)
+        atomic_write(self.path(name, section.fmt), data)
+        self.writes += 1
+
+    def set_format(self, name, fmt):
+        """Move a section to another on-disk format; the old file is removed."""
+        section = SECTIONS[name]
+        if fmt == section.fmt:
+            return
+        self.get(name)
+        old = self.path(name, section.fmt)
+        section.fmt = fmt
+        self.save(name)
+        try:
+            uos.remove(old)
+        except OSError:
+            pass
+
+    def invalidate(self, name=None):
+        """Drop cached sections so the next get() re-reads flash (after an external upload)."""
+        if name is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(name, None)
+
+
+store = ConfigStore()
+get = store.get
+update = store.update
@@ -0,0 +1,170 @@
+# Encoder nonlinearity calibration.
+# Spin the joint slowly at constant duty, treat the unwrapped reading as linear in time,
+# fit the residual with a few harmonics of the shaft angle, and store it as a 256-entry
+# int16 table (counts to subtract). Applying it is a shift, a mask and one interpolation.
+
+import math
+import utime
+from array import array
+
+import config_store
+
+TABLE_SIZE = 256
+TABLE_BITS = 8
+HARMONICS = 4
+CAL_FILE = "enc_cal.bin"
+
+
+# ========== Apply ==========
+
+
+class LinearizedEncoder:
+    """Wraps any encoders.Encoder and subtracts the interpolated correction on every read."""
+
+    def __init__(self, enc, table):
+        self.enc = enc
+        self.table = table
+        self.resolution = enc.resolution
+        self.name = enc.name
+        self.counts = 0
+        self._shift = _bits(enc.resolution) - TABLE_BITS
+        self._mask = (1 << self._shift) - 1
+
+    @property
+    def valid(self):
+        return self.enc.valid
+
+    def correct(self, c):
+        t = self.table
+        sh = self._shift
+        i = c >> sh
+        a = t[i]
+        b = t[(i + 1) & (TABLE_SIZE - 1)]
+        return (c - a - (((b - a) * (c & self._mask)) >> sh)) % self.resolution
+
+    def read(self):
+        self.counts = self.correct(self.enc.read())
+        return self.counts
+
+
+def _bits(resolution):
+    n = 0
+    while (1 << n) < resolution:
+        n += 1
+    if (1 << n) != resolution or n < TABLE_BITS:
+        raise ValueError("Encoder resolution must be a power of two >= %d" % TABLE_SIZE)
+    return n
+
+
+# ========== Fit ==========
+
+
+def _unwrap(counts, resolution):
+    half = resolution // 2
+    out = [counts[0]]
+    acc = counts[0]
+    for i in range(1, len(counts)):
+        d = (counts[i] - counts[i - 1] + half) % resolution - half
+        acc += d
+        out.append(acc)
+    return out
+
+
+def fit_table(times, counts, resolution, harmonics=HARMONICS):
+    """
+    times: sample times (any unit), counts: raw encoder counts taken at constant speed.
+    Returns array('h') of TABLE_SIZE corrections (measured - ideal) in counts.
+    """
+    n = len(counts)
+    if n < 4 * TABLE_SIZE // 8:
+        raise ValueError("Not enough samples for calibration: %d" % n)
+    pos = _unwrap(counts, resolution)
+
+    # Least-squares line pos = p0 + v * t is the ideal (constant speed) motion.
+    mt = sum(times) / n
+    mp = sum(pos) / n
+    stt = 0.0
+    stp = 0.0
+    for i in range(n):
+        dt = times[i] - mt
+        stt += dt * dt
+        stp += dt * (pos[i] - mp)
+    v = stp / stt
+    if abs(v * (times[-1] - times[0])) < resolution:
+        raise ValueError("Calibration run covered less than one turn")
+
+    # Residual as a function of the measured angle, fitted with low harmonics.
+    w = 2 * math.pi / resolution
+    a = [0.0] * (harmonics + 1)
+    b = [0.0] * (harmonics + 1)
+    for i in range(n):
+        e = pos[i] - (mp + v * (times[i] - mt))
+        th = w * counts[i]
+        for k in range(1, harmonics + 1):
+            a[k] += e * math.cos(k * th)
+            b[k] += e * math.sin(k * th)
+    for k in range(1, harmonics + 1):
+        a[k] *= 2.0 / n
+        b[k] *= 2.0 / n
+
+    # The constant term is a zero offset, not nonlinearity, so it is left out.
+    table = array('h', [0] * TABLE_SIZE)
+    step = 2 * math.pi / TABLE_SIZE
+    for j in range(TABLE_SIZE):
+        th = step * j
+        e = 0.0
+        for k in range(1, harmonics + 1):
+            e += a[k] * math.cos(k * th) + b[k] * math.sin(k * th)
+        table[j] = int(round(e))
+    return table
+
+
+# ========== Run on the joint ==========
+
+
+def calibrate(enc, set_motor, duty=300, turns=2, interval_us=2000, timeout_ms=20000, spin_up_ms=300):
+    """
+    Spin at `duty`, wait `spin_up_ms` for the speed to settle (the fit assumes a constant
+    speed), then log until `turns` full turns are covered and fit. Motor is stopped on exit.
+    """
+    res = enc.resolution
+    half = res // 2
+    times = []
+    counts = []
+    travelled = 0
+    set_motor(duty)
+    try:
+        utime.sleep_ms(spin_up_ms)
+        last = enc.read()
+        t0 = utime.ticks_us()
+        while abs(travelled) < turns * res:
+            if utime.ticks_diff(utime.ticks_us(), t0) > timeout_ms * 1000:
+                raise RuntimeError("Calibration timed out after %d counts" % travelled)
+            c = enc.read()
+            if enc.valid:
+                travelled += (c - last + half) % res - half
+                last = c
+                times.append(utime.ticks_diff(utime.ticks_us(), t0))
+                counts.append(c)
+            utime.sleep_us(interval_us)
+    finally:
+        set_motor(0)
+    return fit_table(times, counts, res)
+
+
+# ========== Storage ==========
+
+
+def save_table(table, path=CAL_FILE):
+    config_store.atomic_write(path, bytes(table))
+
+
+def load_table(path=CAL_FILE):
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) != TABLE_SIZE * 2:
+        return None
+    return array('h', data)
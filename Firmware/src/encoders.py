@@ -0,0 +1,336 @@
+# Encoder drivers behind one interface.
+# read() returns raw counts (0 .. resolution-1) and sets .valid; on a failed read the last
+# good counts are returned with valid=False so the caller decides what to do.
+# make_encoder() picks the driver from the node config ("encoder" key) and, with
+# "enc_samples" > 1, wraps it in OversampledEncoder.
+
+import utime
+from array import array
+from machine import SPI, I2C, Pin
+
+from mt6701_i2c import MT6701I2C, ADDRS as MT6701_ADDRS
+from fastpath import crc6, ssi_decode, wrap_diff
+
+ENC_AS5600 = "as5600"
+ENC_MT6701_SSI = "mt6701_ssi"
+ENC_MT6701_I2C = "mt6701_i2c"
+DEFAULT_ENCODER = ENC_MT6701_SSI
+
+# Default wiring; any of these can be overridden in node.json.
+DEFAULT_PINS = {
+    "scl": 4,
+    "sda": 5,
+    "sck": 4,  # to MT6701 CLK
+    "miso": 5,  # from MT6701 DO
+    "cs": 6,  # to MT6701 CSN (active low)
+}
+I2C_FREQ = 400_000
+SPI_ID = 1  # ESP32/ESP32-C3: pick a usable SPI bus id
+SPI_BAUD = 1_000_00
+AS5600_ADDR = 0x36
+
+FILTER_MEDIAN = "median"
+FILTER_MEAN = "mean"
+
+
+class Encoder:
+    resolution = 4096
+    name = ""
+    # Sensor status bits that make a CRC-good sample unusable (0: no status word).
+    status_mask = 0
+
+    def __init__(self):
+        self.counts = 0
+        self.valid = False
+        self.status = 0
+
+    def read(self):
+        raise NotImplementedError
+
+
+# ========== AS5600 (I2C, 12-bit) ==========
+
+AS5600_REG_STATUS = 0x0B  # [5] MD magnet detected, [4] ML too weak, [3] MH too strong
+AS5600_STATUS_MD = 0x20
+AS5600_STATUS_BAD = 0x18
+
+
+class AS5600(Encoder):
+    resolution = 4096
+    name = ENC_AS5600
+
+    def __init__(self, i2c, addr=AS5600_ADDR):
+        super().__init__()
+        self.i2c = i2c
+        self.addr = addr
+        self._buf = bytearray(3)
+
+    def read(self):
+        # STATUS + RAW ANGLE (0x0B..0x0D) in one burst.
+        buf = self._buf
+        try:
+            self.i2c.readfrom_mem_into(self.addr, AS5600_REG_STATUS, buf)
+        except OSError:
+            self.valid = False
+            return self.counts
+        status = buf[0]
+        self.valid = bool(status & AS5600_STATUS_MD) and not (status & AS5600_STATUS_BAD)
+        if self.valid:
+            self.counts = ((buf[1] << 8) | buf[2]) & 0x0FFF
+        return self.counts
+
+
+# ========== MT6701 (SSI over SPI, 14-bit) ==========
+# 24-bit frame: 14 angle + 4 status + 6 CRC
+# CRC polynomial: x^6 + x + 1 (MSB-first over 18 bits: angle[13:0], status[3:0])
+# CRC and frame decode live in fastpath (native-compiled on the board).
+# Status: [1:0] field (01 too strong, 10 too weak), [2] push button, [3] track loss.
+
+MT6701_STATUS_FIELD = 0x03
+MT6701_STATUS_TRACK_LOSS = 0x08
+MT6701_STATUS_BAD = MT6701_STATUS_FIELD | MT6701_STATUS_TRACK_LOSS
+
+crc6_mt6701_msb_first = crc6
+
+
+class MT6701SSI(Encoder):
+    resolution = 1 << 14
+    name = ENC_MT6701_SSI
+    status_mask = MT6701_STATUS_BAD
+
+    def __init__(self, spi, cs):
+        super().__init__()
+        self.spi = spi
+        self.cs = cs
+        self.raw = 0
+        self.status = 0
+        self.crc_ok = False
+        self._buf = bytearray(3)
+
+    def read_frame(self):
+        buf = self._buf
+        self.cs.value(0)
+        # small setup/hold margins; datasheet margins are sub-µs, so 1 µs is safe
+        utime.sleep_us(30)
+        self.spi.readinto(buf)  # clocks 24 SCK edges; hardware handles shifting
+        utime.sleep_us(1)
+        self.cs.value(1)
+        return (buf[0] << 16) | (buf[1] << 8) | buf[2]
+
+    def read(self):
+        raw24 = self.read_frame()
+        self.raw = raw24
+        # Bits: [23:10]=angle(14), [9:6]=status(4), [5:0]=crc(6)  (MSB-first)
+        self.status = (raw24 >> 6) & 0x000F
+        angle14 = ssi_decode(raw24)
+        self.crc_ok = angle14 >= 0
+        self.valid = self.crc_ok
+        if self.crc_ok:
+            self.counts = angle14
+        return self.counts
+
+
+# ========== MT6701 (I2C, 14-bit) ==========
+
+
+class MT6701I2CEncoder(Encoder):
+    resolution = 1 << 14
+    name = ENC_MT6701_I2C
+
+    def __init__(self, i2c, addr=MT6701_ADDRS[0]):
+        super().__init__()
+        self.dev = MT6701I2C(i2c, addr)
+
+    def read(self):
+        try:
+            self.counts = self.dev.read_angle_counts()
+            self.valid = True
+        except OSError:
+            self.valid = False
+        return self.counts
+
+
+# ========== Oversampling ==========
+
+
+class OversampledEncoder(Encoder):
+    """
+    Takes `samples` reads of enc per read() and returns one filtered position.
+    Samples failing CRC/I/O (enc.valid False) or with a bad status bit (enc.status_mask)
+    are dropped. The rest are unwrapped around the first good one, so a cluster straddling
+    0/resolution filters correctly. FILTER_MEDIAN returns their median; FILTER_MEAN drops
+    samples more than `outlier` counts from the median and averages the rest.
+    valid is True when at least min_good samples survived. Each read costs `samples`
+    sensor frames, so size it against the control period.
+
+    Per read: good, crc_fail, status_fail, outliers, spread (max-min of the used samples).
+    Since reset_stats(): reads, bad_reads and the *_total counters.
+    """
+
+    def __init__(self, enc, samples=4, mode=FILTER_MEDIAN, outlier=32, min_good=1):
+        super().__init__()
+        if mode not in (FILTER_MEDIAN, FILTER_MEAN):
+            raise ValueError("Unknown encoder filter: %s" % mode)
+        self.enc = enc
+        self.resolution = enc.resolution
+        self.name = enc.name
+        self.samples = samples
+        self.mode = mode
+        self.outlier = outlier
+        self.min_good = min_good
+        self._offs = array('l', [0] * samples)
+        self.good = 0
+        self.crc_fail = 0
+        self.status_fail = 0
+        self.outliers = 0
+        self.spread = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.reads = 0
+        self.bad_reads = 0
+        self.crc_fail_total = 0
+        self.status_fail_total = 0
+        self.outliers_total = 0
+
+    def read(self):
+        enc = self.enc
+        res = self.resolution
+        mask = enc.status_mask
+        offs = self._offs
+        n = 0
+        crc_fail = 0
+        status_fail = 0
+        ref = 0
+        for _ in range(self.samples):
+            c = enc.read()
+            if not enc.valid:
+                crc_fail += 1
+                continue
+            if enc.status & mask:
+                status_fail += 1
+                continue
+            if n == 0:
+                ref = c
+            # Insertion sort as we go; offs[:n] stays sorted.
+            d = wrap_diff(c, ref, res)
+            i = n
+            while i > 0 and offs[i - 1] > d:
+                offs[i] = offs[i - 1]
+                i -= 1
+            offs[i] = d
+            n += 1
+
+        self.reads += 1
+        self.good = n
+        self.crc_fail = crc_fail
+        self.status_fail = status_fail
+        self.crc_fail_total += crc_fail
+        self.status_fail_total += status_fail
+        self.outliers = 0
+        if n < self.min_good or n == 0:
+            self.spread = 0
+            self.valid = False
+            self.bad_reads += 1
+            return self.counts
+
+        mid = n >> 1
+        med = offs[mid] if n & 1 else (offs[mid - 1] + offs[mid]) // 2
+        if self.mode == FILTER_MEDIAN:
+            out = med
+            self.spread = offs[n - 1] - offs[0]
+        else:
+            lim = self.outlier
+            total = 0
+            used = 0
+            lo = hi = med
+            for i in range(n):
+                d = offs[i]
+                if d - med > lim or med - d > lim:
+                    continue
+                total += d
+                used += 1
+                if d < lo:
+                    lo = d
+                if d > hi:
+                    hi = d
+            self.outliers = n - used
+            out = (total + (used >> 1)) // used
+            self.spread = hi - lo
+        self.outliers_total += self.outliers
+        self.valid = True
+        self.counts = (ref + out) & (res - 1)
+        return self.counts
+
+    def stats(self):
+        return {
+            "samples": self.samples,
+            "good": self.good,
+            "crc_fail": self.crc_fail,
+            "status_fail": self.status_fail,
+            "outliers": self.outliers,
+            "spread": self.spread,
+            "reads": self.reads,
+            "bad_reads": self.bad_reads,
+            "crc_fail_total": self.crc_fail_total,
+            "status_fail_total": self.status_fail_total,
+            "outliers_total": self.outliers_total,
+        }
+
+
+def sensor(enc):
+    """The innermost driver under any wrappers (linearization, oversampling)."""
+    while hasattr(enc, "enc"):
+        enc = enc.enc
+    return enc
+
+
+def find_layer(enc, cls):
+    """The first wrapper (or the driver) of type cls from the outside in, or None."""
+    while enc is not None:
+        if isinstance(enc, cls):
+            return enc
+        enc = getattr(enc, "enc", None)
+    return None
+
+
+# ========== Selection ==========
+
+
+def make_encoder(node_cfg=None):
+    node_cfg = node_cfg or {}
+    enc = _make_sensor(node_cfg)
+    samples = node_cfg.get("enc_samples", 1)
+    if samples > 1:
+        enc = OversampledEncoder(enc,
+                                 samples,
+                                 node_cfg.get("enc_filter", FILTER_MEDIAN),
+                                 outlier=node_cfg.get("enc_outlier", 32),
+                                 min_good=node_cfg.get("enc_min_good", 1))
+    return enc
+
+
+def _make_sensor(node_cfg):
+    kind = node_cfg.get("encoder", DEFAULT_ENCODER)
+    pins = dict(DEFAULT_PINS)
+    pins.update(node_cfg.get("encoder_pins", {}))
+
+    if kind == ENC_MT6701_SSI:
+        cs = Pin(pins["cs"], Pin.OUT, value=1)
+        spi = SPI(SPI_ID,
+                  baudrate=node_cfg.get("spi_baud", SPI_BAUD),
+                  polarity=0,
+                  phase=1,
+                  sck=Pin(pins["sck"]),
+                  mosi=None,
+                  miso=Pin(pins["miso"]))
+        return MT6701SSI(spi, cs)
+
+    i2c = I2C(0, scl=Pin(pins["scl"]), sda=Pin(pins["sda"]), freq=I2C_FREQ)
+    if kind == ENC_AS5600:
+        return AS5600(i2c)
+    if kind == ENC_MT6701_I2C:
+        # CSN must stay high for the MT6701 to talk I2C.
+        Pin(pins["cs"], Pin.OUT, value=1)
+        return MT6701I2CEncoder(i2c, node_cfg.get("encoder_addr", MT6701_ADDRS[0]))
+    raise ValueError("Unknown encoder type: %s" % kind)
@@ -0,0 +1,70 @@
+# Hot-path helpers shared by the encoder drivers and the control loop.
+# The *_py functions below are the reference implementations and what runs on CPython.
+# On the board, fastpath_native provides @micropython.viper / @micropython.native versions
+# with the same results; they are picked up at import time when that module loads
+# (it needs mpy-cross -march, see build.py). fastpath_check compares the two and times them.
+
+# ========== Reference implementations ==========
+
+
+def crc6_py(value_18bits):
+    # MT6701 SSI CRC: x^6 + x + 1, MSB-first over 18 bits (angle[13:0], status[3:0]).
+    # Polynomial (including top bit) is 0b1_000011 = 0x43; use lower 6 bits (0x03) in feedback form.
+    rem = 0  # 6-bit remainder
+    poly_lo = 0x03  # polynomial without the x^6 term
+    for i in range(17, -1, -1):  # process 18 bits MSB->LSB
+        bit = (value_18bits >> i) & 1
+        fb = ((rem >> 5) & 1) ^ bit
+        rem = ((rem << 1) & 0x3F)
+        if fb:
+            rem ^= poly_lo
+    return rem  # 6-bit CRC
+
+
+def ssi_decode_py(raw24):
+    """MT6701 24-bit SSI frame -> 14-bit angle, or -1 if the CRC does not match."""
+    # Bits: [23:10]=angle(14), [9:6]=status(4), [5:0]=crc(6)  (MSB-first)
+    data = (raw24 >> 6) & 0x3FFFF
+    if crc6_py(data) != (raw24 & 0x3F):
+        return -1
+    return data >> 4
+
+
+def wrap_diff_py(a, b, res):
+    """a - b wrapped into [-res/2, res/2). The native version needs res to be a power of two."""
+    half = res >> 1
+    return (a - b + half) % res - half
+
+
+def pi_update_py(self, err, dt, ff=0.0):
+    # cascade.PIStage.update: PI with back-calculation anti-windup.
+    u = self.kp * err + self.integral + self.kff * ff
+    lim = self.limit
+    if u > lim:
+        us = lim
+    elif u < -lim:
+        us = -lim
+    else:
+        us = u
+    self.saturated = us != u
+    self.integral += (self.ki * err + self.kt * (us - u)) * dt
+    self.out = us
+    return us
+
+
+# ========== Selection ==========
+
+crc6 = crc6_py
+ssi_decode = ssi_decode_py
+wrap_diff = wrap_diff_py
+pi_update = pi_update_py
+NATIVE = False
+
+try:
+    # ImportError: CPython, or the .mpy was not built; ValueError: .mpy built for another arch;
+    # SyntaxError: a port without the native emitter compiling from source.
+    from fastpath_native import crc6, ssi_decode, wrap_diff, pi_update
+    NATIVE = True
+except (ImportError, ValueError, SyntaxError) as e:
+    # Not silent: on the board this means the control loop runs the slower Python versions.
+    print("fastpath: native helpers unavailable (%r), using Python" % (e, ))
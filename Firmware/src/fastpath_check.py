@@ -0,0 +1,114 @@
+# Equivalence check + benchmark for fastpath: native versions vs the *_py references.
+# On the board:
+#   import fastpath_check; fastpath_check.check(); fastpath_check.bench()
+# On the host only the reference versions exist; check() still verifies them against the
+# masked wrap the native version uses instead of the modulo, bench() times
+# the pure-Python path.
+
+import utime
+
+import fastpath
+
+
+class _Stage:
+    # Same attributes as cascade.PIStage, without pulling in the cascade module.
+    def __init__(self, kp, ki, kt, kff, limit):
+        self.kp = kp
+        self.ki = ki
+        self.kt = kt
+        self.kff = kff
+        self.limit = limit
+        self.integral = 0.0
+        self.out = 0.0
+        self.saturated = False
+
+
+class _Lcg:
+    # Deterministic inputs without the random module (not on every port).
+    def __init__(self, seed=12345):
+        self.s = seed
+
+    def next(self, n):
+        self.s = (self.s * 1103515245 + 12345) & 0x7FFFFFFF
+        return self.s % n
+
+
+def _fail(name, args, got, want):
+    print("MISMATCH %s%r: got %r want %r" % (name, args, got, want))
+    return 1
+
+
+def check(n=5000, verbose=True):
+    """Compare the selected fastpath functions with the references. Returns the mismatch count."""
+    bad = 0
+
+    # CRC: every 18-bit value would take too long on the board; cover the low 4096 plus random.
+    rng = _Lcg()
+    vals = list(range(4096)) + [rng.next(1 << 18) for _ in range(n)]
+    for v in vals:
+        if fastpath.crc6(v) != fastpath.crc6_py(v):
+            bad += _fail("crc6", (v,), fastpath.crc6(v), fastpath.crc6_py(v))
+
+    # SSI frames: one valid and one corrupted frame per angle sample.
+    for _ in range(n):
+        data = rng.next(1 << 18)
+        good = (data << 6) | fastpath.crc6_py(data)
+        for raw in (good, good ^ (1 << rng.next(24))):
+            got, want = fastpath.ssi_decode(raw), fastpath.ssi_decode_py(raw)
+            if got != want:
+                bad += _fail("ssi_decode", (raw,), got, want)
+
+    # Wrapped difference, including inputs far outside one turn and negative ones.
+    for res in (4096, 1 << 14):
+        for _ in range(n):
+            a = rng.next(8 * res) - 4 * res
+            b = rng.next(8 * res) - 4 * res
+            want = fastpath.wrap_diff_py(a, b, res)
+            got = fastpath.wrap_diff(a, b, res)
+            masked = ((a - b + (res >> 1)) & (res - 1)) - (res >> 1)
+            if got != want or masked != want:
+                bad += _fail("wrap_diff", (a, b, res), (got, masked), want)
+
+    # PI step: run both on the same error sequence and compare the whole trajectory.
+    s_fast = _Stage(0.08, 1.5, 18.75, 0.01, 1023.0)
+    s_ref = _Stage(0.08, 1.5, 18.75, 0.01, 1023.0)
+    for i in range(n):
+        err = rng.next(40000) - 20000
+        ff = rng.next(2000) - 1000
+        got = fastpath.pi_update(s_fast, err, 0.001, ff)
+        want = fastpath.pi_update_py(s_ref, err, 0.001, ff)
+        if got != want or s_fast.integral != s_ref.integral or s_fast.saturated != s_ref.saturated:
+            bad += _fail("pi_update", (i, err, ff), got, want)
+            break
+
+    if verbose:
+        print("fastpath native:", fastpath.NATIVE, " mismatches:", bad)
+    return bad
+
+
+def _time(fn, args, n):
+    t0 = utime.ticks_us()
+    for _ in range(n):
+        fn(*args)
+    return utime.ticks_diff(utime.ticks_us(), t0)
+
+
+def bench(n=2000):
+    """Per-call time (us) of the reference and the selected version of each helper."""
+    stage = _Stage(0.08, 1.5, 18.75, 0.01, 1023.0)
+    cases = (
+        ("crc6", fastpath.crc6_py, fastpath.crc6, (0x2ABCD, )),
+        ("ssi_decode", fastpath.ssi_decode_py, fastpath.ssi_decode, (0xABCDEF, )),
+        ("wrap_diff", fastpath.wrap_diff_py, fastpath.wrap_diff, (100, 16000, 1 << 14)),
+        ("pi_update", fastpath.pi_update_py, fastpath.pi_update, (stage, 120, 0.001, 10.0)),
+    )
+    # The empty loop is subtracted so the numbers are the call cost only.
+    base = _time(lambda: None, (), n)
+    results = {}
+    print("%-12s %10s %10s %8s" % ("helper", "py us", "fast us", "speedup"))
+    for name, ref, fast, args in cases:
+        t_ref = max(_time(ref, args, n) - base, 1) / n
+        t_fast = max(_time(fast, args, n) - base, 1) / n
+        results[name] = (t_ref, t_fast)
+        print("%-12s %10.2f %10.2f %7.1fx" % (name, t_ref, t_fast, t_ref / t_fast))
+    return results
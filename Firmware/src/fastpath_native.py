@@ -0,0 +1,59 @@
+# Native-code versions of the fastpath helpers. MicroPython only: never import this
+# directly, fastpath falls back to the *_py versions when it fails to load.
+# Must give bit-identical results to fastpath; run fastpath_check.check() after changes.
+
+import micropython
+
+
+@micropython.viper
+def crc6(value_18bits: int) -> int:
+    rem = 0
+    i = 17
+    while i >= 0:
+        fb = ((rem >> 5) ^ (value_18bits >> i)) & 1
+        rem = (rem << 1) & 0x3F
+        if fb:
+            rem ^= 0x03
+        i -= 1
+    return rem
+
+
+@micropython.viper
+def ssi_decode(raw24: int) -> int:
+    # CRC inlined: a viper -> viper call still goes through the generic call path.
+    data = (raw24 >> 6) & 0x3FFFF
+    rem = 0
+    i = 17
+    while i >= 0:
+        fb = ((rem >> 5) ^ (data >> i)) & 1
+        rem = (rem << 1) & 0x3F
+        if fb:
+            rem ^= 0x03
+        i -= 1
+    if rem != (raw24 & 0x3F):
+        return -1
+    return data >> 4
+
+
+@micropython.viper
+def wrap_diff(a: int, b: int, res: int) -> int:
+    # Power-of-two res only: the mask replaces the modulo (same result for negatives).
+    half = res >> 1
+    return ((a - b + half) & (res - 1)) - half
+
+
+@micropython.native
+def pi_update(self, err, dt, ff=0.0):
+    # Floats stay boxed under the native emitter; the gain is in skipping the bytecode loop.
+    u = self.kp * err + self.integral + self.kff * ff
+    lim = self.limit
+    if u > lim:
+        us = lim
+    elif u < -lim:
+        us = -lim
+    else:
+        us = u
+    self.saturated = us != u
+    self.integral += (self.ki * err + self.kt * (us - u)) * dt
+    self.out = us
+    return us
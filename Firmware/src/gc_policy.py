@@ -0,0 +1,144 @@
+# GC policy for the real-time loops.
+# Collections are meant to happen outside the control tick. The web/network loop calls
+# background() every pass; every check_every passes it samples the heap and, once a share of
+# the automatic threshold has been allocated or the heap runs low, marks a collection due.
+# The control loop hands its spare time at the end of each tick to idle(), which runs a due
+# collection right there: a collection holds the GIL, so run from the web thread it would
+# stall the control thread at an arbitrary point of its tick instead. idle() also collects
+# on its own if the slot is longer than a measured collection (never, at a 1 ms period on
+# ESP32) or the heap is critically low. The automatic collector (kept on, with a raised
+# threshold) is only a backstop. Every collection is timed into metrics.stats so the cost is
+# visible on /api/metrics.
+
+import gc
+import utime
+
+from metrics import stats
+
+# Allocation threshold for the automatic collector (bytes). background() collects at
+# BACKGROUND_SHARE of it, so the automatic collector rarely gets to run in the control thread.
+DEFAULT_THRESHOLD = 32 * 1024
+BACKGROUND_SHARE = 0.5
+
+
+def configure(threshold=DEFAULT_THRESHOLD):
+    # Automatic collection stays on as a backstop; gc.threshold() is MicroPython-only,
+    # CPython hosts just skip it.
+    gc.enable()
+    policy.threshold = threshold
+    if hasattr(gc, "threshold"):
+        gc.threshold(threshold)
+
+
+def collect():
+    t0 = utime.ticks_us()
+    gc.collect()
+    us = utime.ticks_diff(utime.ticks_us(), t0)
+    stats.record_gc(us)
+    return us
+
+
+class Critical:
+    """`with Critical():` keeps the automatic collector off for the block; nests safely."""
+
+    def __enter__(self):
+        self._was_enabled = gc.isenabled()
+        gc.disable()
+        return self
+
+    def __exit__(self, *exc):
+        if self._was_enabled:
+            gc.enable()
+        return False
+
+
+class IdlePolicy:
+    """
+    Decides when a collection should run, and in which thread.
+    min_slack_us: only collect in a control idle slot with at least this much time left;
+        None derives it from the longest collection measured so far (so until one has been
+        measured, idle slots never collect).
+    low_free: background() collects when free heap drops below this many bytes.
+    critical_free: below this, idle() collects even without slack (one late tick beats MemoryError).
+    max_ms: background() marks a collection due after this long without one.
+    check_every: gc.mem_free() walks the heap, so idle() only samples it every N ticks and
+        background() every N passes.
+    """
+
+    def __init__(self, min_slack_us=None, low_free=24 * 1024, critical_free=8 * 1024, max_ms=5000,
+                 check_every=50, threshold=DEFAULT_THRESHOLD):
+        self.min_slack_us = min_slack_us
+        self.low_free = low_free
+        self.critical_free = critical_free
+        self.max_ms = max_ms
+        self.check_every = check_every
+        self.threshold = threshold
+        self._since = 0
+        self._passes = 0
+        self._free = None
+        self._free_after = None  # free heap right after the last collection
+        self._last_ms = utime.ticks_ms()
+        self.gc_us = 0  # longest collection seen
+        self.due = False  # set by background(), served by idle()
+
+    def collect(self):
+        """Collect now and remember the cost and the free heap afterwards."""
+        us = collect()
+        if us > self.gc_us:
+            self.gc_us = us
+        self._since = 0
+        self._free = None
+        self.due = False
+        self._free_after = gc.mem_free()
+        self._last_ms = utime.ticks_ms()
+        return us
+
+    def slack_needed_us(self):
+        if self.min_slack_us is not None:
+            return self.min_slack_us
+        # 25% margin on the worst collection measured; unknown cost means no slot fits.
+        return self.gc_us + (self.gc_us >> 2) if self.gc_us else None
+
+    def idle(self, slack_us):
+        """Control side: called with the time left before the next tick."""
+        if self.due:
+            self.collect()
+            return True
+        self._since += 1
+        if self._free is None or self._since % self.check_every == 0:
+            self._free = stats.sample_heap()
+        if self._free < self.critical_free:
+            self.collect()
+            return True
+        need = self.slack_needed_us()
+        if need is None or slack_us < need:
+            return False
+        if self._free_after is not None and self._free_after - self._free < self.threshold * BACKGROUND_SHARE:
+            return False
+        self.collect()
+        return True
+
+    def background(self):
+        """
+        Non-real-time side (web/network loop), every pass: marks a collection due for the
+        control thread's next idle(). A due mark still set check_every passes later means no
+        control thread is running, so the collection happens here instead.
+        """
+        self._passes += 1
+        if self._passes < self.check_every:
+            return False
+        self._passes = 0
+        if self.due:
+            self.collect()
+            return True
+        free = stats.sample_heap()
+        due = free < self.low_free
+        if not due and self._free_after is not None:
+            due = self._free_after - free >= self.threshold * BACKGROUND_SHARE
+        if not due:
+            due = utime.ticks_diff(utime.ticks_ms(), self._last_ms) >= self.max_ms
+        self.due = due
+        return due
+
+
+policy = IdlePolicy()
@@ -1,30 +1,12 @@
 import pid_control as pc
 import time
 
-import network
-import time
-
-
-def connect_wifi(ssid, password):
-    wlan = network.WLAN(network.STA_IF)
-    if not wlan.active():
-        wlan.active(True)
-
-    if not wlan.isconnected():
-        print(f'Connecting to WiFi SSID="{ssid}"...')
-        wlan.connect(ssid, password)
-
-        timeout = 10  # seconds
-        for _ in range(timeout * 10):
-            if wlan.isconnected():
-                break
-            time.sleep(0.1)
-        else:
-            print('❌ WiFi connection failed.')
-            return None
-
-    print('✅ Connected:', wlan.ifconfig())
-    return wlan
+import runtime
+import chain_proto
+import node_hooks
+import gc_policy
+import tone
+import webserver
 
 
 # import os
@@ -54,15 +36,45 @@ def connect_wifi(ssid, password):
 
 # pc.test_pid(increment_angle=800)
 
-pwm_fwd = machine.PWM(machine.Pin(PWM_PIN_FWD), freq=330, duty=100)
-time.sleep(1)
-pwm_fwd = machine.PWM(machine.Pin(PWM_PIN_FWD), freq=660, duty=100)
-time.sleep(1)
-pwm_fwd = machine.PWM(machine.Pin(PWM_PIN_FWD), freq=1200, duty=100)
-time.sleep(1)
-pwm_fwd.duty(0)
+CONTROL_INTERVAL_US = 1000
+
+# Network comes up in the background; motor + encoder are ready right after setup().
+net = webserver.setup_network()  # only starts the state machine; WebServer.run() steps it
+pc.setup()
+pc.set_motor(0)
+
+# Control loop gets its own thread and holds the power-up position from the start. The boot
+# tone is opt-in ("boot_tone": true in node.json, for unloaded bench joints): it needs the
+# motor, so the thread starts only when the tone ends, or as soon as a setpoint arrives
+# (preempt), and the joint is not held while it plays.
+node_cfg = pc.load_node_config()
+node_index = node_cfg["node_index"]
+loop = pc.CascadeLoop(CONTROL_INTERVAL_US)
+rt = runtime.Runtime(loop.tick, loop.state_into, gc_policy.policy.idle, CONTROL_INTERVAL_US, loop.pos)
+pc.control_rt = rt  # teach_record/teach_replay run through the control thread
+gc_policy.configure()  # automatic GC is the backstop; the web loop marks collections due for idle()
+
+
+def start_control():
+    rt.start_thread()
+    # Only now: the control thread is what feeds it, and the WDT cannot be stopped once armed.
+    if node_cfg["watchdog"]:
+        pc.enable_watchdog()
+
+
+player = tone.TonePlayer(pc.motor, busy=lambda: not rt.stopped)
+if not (node_cfg["boot_tone"] and player.play(tone.MOTOR_ON, on_done=start_control)):
+    start_control()
+
+# Web server owns the main thread; its setpoints reach the control loop only through rt.
+# node_hooks turns the 1-based node id into this node's joint index.
+hooks = node_hooks.NodeHooks(node_index, rt, webserver.arm, player)
+hooks.install()
+webserver.arm.runner.res = pc.ENC_RES  # programs take the short way round the joint
+webserver.WebServer(net).run()
 
 # import chain_uart
+# chain_uart.receiver.add_handler(chain_proto.setpoint_handler(hooks.joint, rt.command, rt.read_state))
 
 # print("Starting Main Loop")
 # chain_uart.main_loop()
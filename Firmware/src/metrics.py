@@ -0,0 +1,147 @@
+# Runtime health metrics and the control-loop watchdog.
+# Recording is O(1) and allocation-free (fixed arrays); formatting only happens when the
+# /api/metrics endpoint is scraped. Output is Prometheus-style "name value" lines, which is
+# compact and trivially parsed by miniarm_host.metrics_collector.
+
+import gc
+from array import array
+from machine import WDT
+
+LATENCY_SLOTS = 64
+
+
+class LoopStats:
+    """Per-loop timing: rate, worst jitter and deadline misses."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.ticks = 0
+        self.misses = 0
+        self.jitter_max_us = 0
+        self.period_sum_us = 0
+        self.work_max_us = 0
+        self._last = None
+
+    def tick(self, now_us, period_us, work_us=0, ticks_diff=None):
+        """
+        Record one loop iteration starting at now_us with nominal period_us.
+        work_us is the time spent computing this tick. Returns True when the deadline was met.
+        """
+        on_time = work_us <= period_us
+        if self._last is not None:
+            dt = ticks_diff(now_us, self._last) if ticks_diff else now_us - self._last
+            self.period_sum_us += dt
+            j = dt - period_us
+            if j < 0:
+                j = -j
+            if j > self.jitter_max_us:
+                self.jitter_max_us = j
+            if dt > period_us + (period_us >> 1):
+                on_time = False
+        self._last = now_us
+        if work_us > self.work_max_us:
+            self.work_max_us = work_us
+        self.ticks += 1
+        if not on_time:
+            self.misses += 1
+        return on_time
+
+    def rate_hz(self):
+        n = self.ticks - 1
+        if n <= 0 or self.period_sum_us <= 0:
+            return 0.0
+        return n * 1e6 / self.period_sum_us
+
+
+class Metrics:
+
+    def __init__(self):
+        self.loop = LoopStats()
+        self.crc_errors = 0  # invalid encoder reads seen by the control loop
+        self.gc_count = 0
+        self.gc_time_us = 0
+        self.gc_max_us = 0
+        self.heap_low = None
+        self.requests = 0
+        self._lat = array('l', [0] * LATENCY_SLOTS)
+        self._lat_i = 0
+
+    def sample_heap(self):
+        free = gc.mem_free()
+        if self.heap_low is None or free < self.heap_low:
+            self.heap_low = free
+        return free
+
+    def record_gc(self, us):
+        self.gc_count += 1
+        self.gc_time_us += us
+        if us > self.gc_max_us:
+            self.gc_max_us = us
+
+    def record_request(self, us):
+        self._lat[self._lat_i] = us
+        self._lat_i = (self._lat_i + 1) % LATENCY_SLOTS
+        self.requests += 1
+
+    def latency_percentiles(self, ps=(50, 90, 99)):
+        n = min(self.requests, LATENCY_SLOTS)
+        if n == 0:
+            return [0 for _ in ps]
+        data = sorted(self._lat[:n])
+        return [data[min(n - 1, (p * n) // 100)] for p in ps]
+
+    def snapshot(self, extra=None):
+        free = self.sample_heap()
+        lp = self.loop
+        p50, p90, p99 = self.latency_percentiles()
+        out = [
+            ("loop_rate_hz", round(lp.rate_hz(), 1)),
+            ("loop_ticks", lp.ticks),
+            ("loop_jitter_max_us", lp.jitter_max_us),
+            ("loop_work_max_us", lp.work_max_us),
+            ("loop_deadline_misses", lp.misses),
+            ("encoder_crc_errors", self.crc_errors),
+            ("gc_count", self.gc_count),
+            ("gc_time_us", self.gc_time_us),
+            ("gc_max_us", self.gc_max_us),
+            ("heap_free", free),
+            ("heap_low", self.heap_low),
+            ("http_requests", self.requests),
+            ("http_latency_p50_us", p50),
+            ("http_latency_p90_us", p90),
+            ("http_latency_p99_us", p99),
+        ]
+        if extra:
+            out.extend(extra)
+        return out
+
+    def format(self, extra=None):
+        return "".join("miniarm_%s %s\n" % kv for kv in self.snapshot(extra))
+
+
+# ========== Watchdog ==========
+
+
+class LoopWatchdog:
+    """
+    Wraps machine.WDT. Only the control loop feeds it, and only on ticks that met their
+    deadline, so a stalled or chronically late loop resets the board.
+    Note the hardware WDT cannot be stopped once started.
+    """
+
+    def __init__(self, timeout_ms=500):
+        self.wdt = WDT(timeout=timeout_ms)
+        self.timeout_ms = timeout_ms
+        self.skipped = 0
+
+    def feed_if(self, on_time):
+        if on_time:
+            self.wdt.feed()
+        else:
+            self.skipped += 1
+
+
+# Shared instance, like supervisor.safety.
+stats = Metrics()
@@ -0,0 +1,258 @@
+# Motion programs: sequences of joint waypoints with move times.
+# Stored on flash in a compact binary form (prog_<id>.bin), loaded once and cached.
+# ProgramRunner is a non-blocking interpreter: call step() from any loop and it streams
+# interpolated setpoints (minimum-jerk per segment) plus velocities to a sink. Given the
+# encoder resolution it interpolates along the short way round, as the controller does.
+#
+# Binary layout (little endian):
+#   "MP" | u8 version | u8 n_joints | u16 n_steps | u8 name_len | name
+#   n_steps x ( u16 move_ms | n_joints x i32 position )
+
+import struct
+import utime
+import uos
+
+import config_store
+from fastpath import wrap_diff
+
+MAGIC = b"MP"
+VERSION = 1
+PROG_PREFIX = "prog_"
+PROG_SUFFIX = ".bin"
+MAX_JOINTS = 16
+MAX_STEPS = 512
+
+
+class Program:
+
+    def __init__(self, name, n_joints, steps):
+        """steps: list of (move_ms, (pos_j0, pos_j1, ...))"""
+        self.name = name
+        self.n_joints = n_joints
+        self.steps = steps
+
+    def duration_ms(self):
+        return sum(s[0] for s in self.steps)
+
+    # ========== Encoding ==========
+
+    def to_bytes(self):
+        name = self.name.encode()[:255]
+        out = bytearray(MAGIC)
+        out += struct.pack("<BBHB", VERSION, self.n_joints, len(self.steps), len(name))
+        out += name
+        fmt = "<H%di" % self.n_joints
+        for move_ms, pos in self.steps:
+            out += struct.pack(fmt, move_ms, *pos)
+        return bytes(out)
+
+    @staticmethod
+    def from_bytes(data):
+        if data[:2] != MAGIC:
+            raise ValueError("Not a motion program")
+        ver, nj, ns, nl = struct.unpack_from("<BBHB", data, 2)
+        if ver != VERSION:
+            raise ValueError("Unsupported program version %d" % ver)
+        off = 7
+        name = bytes(data[off:off + nl]).decode()
+        off += nl
+        fmt = "<H%di" % nj
+        size = struct.calcsize(fmt)
+        steps = []
+        for _ in range(ns):
+            v = struct.unpack_from(fmt, data, off)
+            steps.append((v[0], tuple(v[1:])))
+            off += size
+        return Program(name, nj, steps)
+
+    def to_json(self):
+        return {"name": self.name, "steps": [{"ms": ms, "pos": list(pos)} for ms, pos in self.steps]}
+
+    @staticmethod
+    def from_json(obj):
+        raw = obj.get("steps") or []
+        if not raw or len(raw) > MAX_STEPS:
+            raise ValueError("Program needs 1..%d steps" % MAX_STEPS)
+        nj = len(raw[0]["pos"])
+        if not 0 < nj <= MAX_JOINTS:
+            raise ValueError("Program needs 1..%d joints" % MAX_JOINTS)
+        steps = []
+        for s in raw:
+            pos = s["pos"]
+            if len(pos) != nj:
+                raise ValueError("All steps need %d joint positions" % nj)
+            ms = int(s.get("ms", 0))
+            if not 0 <= ms <= 0xFFFF:
+                raise ValueError("Step time out of range: %d" % ms)
+            steps.append((ms, tuple(int(p) for p in pos)))
+        return Program(str(obj.get("name", "")), nj, steps)
+
+
+# ========== Storage ==========
+
+
+class ProgramStore:
+    """Programs on flash, cached after the first load. `defaults` fill ids with no file."""
+
+    def __init__(self, root="", defaults=None):
+        self.root = root
+        self.defaults = defaults or {}
+        self._cache = {}
+
+    def _path(self, pid):
+        return "%s%s%d%s" % (self.root, PROG_PREFIX, pid, PROG_SUFFIX)
+
+    def get(self, pid):
+        prog = self._cache.get(pid)
+        if prog is not None:
+            return prog
+        try:
+            with open(self._path(pid), "rb") as f:
+                prog = Program.from_bytes(f.read())
+        except OSError:
+            prog = self.defaults.get(pid)
+        if prog is not None:
+            self._cache[pid] = prog
+        return prog
+
+    def put(self, pid, prog):
+        config_store.atomic_write(self._path(pid), prog.to_bytes())
+        self._cache[pid] = prog
+
+    def delete(self, pid):
+        try:
+            uos.remove(self._path(pid))
+        except OSError:
+            pass
+        self._cache.pop(pid, None)
+
+    def ids(self):
+        found = set(self.defaults)
+        try:
+            names = uos.listdir(self.root) if self.root else uos.listdir()
+        except OSError:
+            names = []
+        for n in names:
+            if n.startswith(PROG_PREFIX) and n.endswith(PROG_SUFFIX):
+                try:
+                    found.add(int(n[len(PROG_PREFIX):-len(PROG_SUFFIX)]))
+                except ValueError:
+                    pass
+        return sorted(found)
+
+    def list(self):
+        out = []
+        for pid in self.ids():
+            prog = self.get(pid)
+            if prog is not None:
+                out.append({"id": pid, "name": prog.name, "steps": len(prog.steps), "ms": prog.duration_ms()})
+        return out
+
+
+# ========== Interpreter ==========
+
+ST_IDLE = "idle"
+ST_RUNNING = "running"
+ST_DONE = "done"
+ST_STOPPED = "stopped"
+
+
+def min_jerk(tau):
+    """(s, ds/dtau) of the minimum-jerk profile at normalized time tau in [0, 1]."""
+    t2 = tau * tau
+    t3 = t2 * tau
+    s = t3 * (10 - 15 * tau + 6 * t2)
+    ds = 30 * t2 * (1 - 2 * tau + t2)
+    return s, ds
+
+
+def linear(tau):
+    """Constant-velocity profile, for dense waypoints such as teach recordings."""
+    return tau, 1.0
+
+
+class ProgramRunner:
+    """
+    sink(positions, velocities) receives per-joint setpoints (counts, counts/s).
+    The first segment starts from `start` (current joint positions). `profile(tau)` ->
+    (s, ds/dtau) shapes every segment; min_jerk unless start() is given another.
+    res: encoder counts per turn (power of two). When set, each segment takes the short way
+    round (a + wrap_diff(b, a)); positions may then leave [0, res), the controller wraps them.
+    """
+
+    def __init__(self, sink, res=None):
+        self.sink = sink
+        self.res = res
+        self.state = ST_IDLE
+        self.prog = None
+        self.program_id = None
+        self.index = 0
+        self._from = None
+        self._seg_start = 0
+        self._pos = None
+        self._vel = None
+        self.profile = min_jerk
+
+    def start(self, prog, start, program_id=None, now=None, profile=min_jerk):
+        if len(start) != prog.n_joints:
+            raise ValueError("Program is for %d joints, got %d" % (prog.n_joints, len(start)))
+        self.prog = prog
+        self.program_id = program_id
+        self.index = 0
+        self._from = tuple(start)
+        self._seg_start = utime.ticks_ms() if now is None else now
+        self._pos = list(start)
+        self._vel = [0.0] * prog.n_joints
+        self.profile = profile
+        self.state = ST_RUNNING
+
+    def stop(self):
+        if self.state == ST_RUNNING:
+            self.state = ST_STOPPED
+            if self._vel is not None:
+                for j in range(len(self._vel)):
+                    self._vel[j] = 0.0
+                self.sink(self._pos, self._vel)
+
+    def running(self):
+        return self.state == ST_RUNNING
+
+    def step(self, now=None):
+        if self.state != ST_RUNNING:
+            return self.state
+        if now is None:
+            now = utime.ticks_ms()
+        steps = self.prog.steps
+        pos = self._pos
+        vel = self._vel
+
+        while True:
+            move_ms, target = steps[self.index]
+            el = utime.ticks_diff(now, self._seg_start)
+            if el < move_ms:
+                break
+            # Segment finished: snap to the waypoint and move on without losing the overrun.
+            self._from = target
+            self._seg_start = utime.ticks_add(self._seg_start, move_ms)
+            self.index += 1
+            if self.index >= len(steps):
+                for j in range(len(pos)):
+                    pos[j] = target[j]
+                    vel[j] = 0.0
+                self.state = ST_DONE
+                self.sink(pos, vel)
+                return self.state
+
+        s, ds = self.profile(el / move_ms)
+        k = ds * 1000.0 / move_ms
+        src = self._from
+        res = self.res
+        for j in range(len(pos)):
+            d = wrap_diff(target[j], src[j], res) if res else target[j] - src[j]
+            pos[j] = src[j] + int(d * s)
+            vel[j] = d * k
+        self.sink(pos, vel)
+        return self.state
+
+    def status(self):
+        return {"state": self.state, "program": self.program_id, "step": self.index}
@@ -0,0 +1,87 @@
+# Motor characterization: direction mapping, static-friction deadband per direction and an
+# approximate velocity-per-duty gain. Runs open loop on the raw output (no compensation),
+# results are stored per node in motor.json (config_store "motor" section) and applied by
+# pid_control.set_motor().
+#   flip, deadband_fwd / deadband_rev (raw duty, positive H-bridge direction first),
+#   vel_per_duty (counts/s per duty above deadband)
+
+import utime
+
+import config_store
+
+
+def find_breakaway(read, drive, diff, sign, start=0, stop=1023, step=8, settle_ms=40, min_counts=4):
+    """Ramp duty in direction `sign` until the shaft moves; returns (duty, displacement) or (None, 0)."""
+    duty = start
+    try:
+        while duty <= stop:
+            p0 = read()
+            drive(sign * duty)
+            utime.sleep_ms(settle_ms)
+            d = diff(read(), p0)
+            if abs(d) >= min_counts:
+                return duty, d
+            duty += step
+    finally:
+        drive(0)
+    return None, 0
+
+
+def measure_velocity(read, drive, diff, duty, spin_up_ms=150, window_ms=200, sample_ms=5):
+    """Average counts/s at a fixed duty after spin-up."""
+    try:
+        drive(duty)
+        utime.sleep_ms(spin_up_ms)
+        prev = read()
+        d = 0
+        t0 = utime.ticks_us()
+        # Summed per sample, so the window may span more than half a turn.
+        while utime.ticks_diff(utime.ticks_us(), t0) < window_ms * 1000:
+            utime.sleep_ms(sample_ms)
+            cur = read()
+            d += diff(cur, prev)
+            prev = cur
+        dt = utime.ticks_diff(utime.ticks_us(), t0) / 1e6
+    finally:
+        drive(0)
+    return d / dt
+
+
+def characterize(read, drive, diff, stop=1023, step=8, settle_ms=40, min_counts=4, pause_ms=200):
+    res = config_store.MOTOR.defaults()
+
+    fwd, moved = find_breakaway(read, drive, diff, 1, 0, stop, step, settle_ms, min_counts)
+    if fwd is None:
+        raise RuntimeError("Motor did not move forward up to duty %d" % stop)
+    # Positive duty must increase the encoder count, otherwise swap outputs.
+    res["flip"] = moved < 0
+    utime.sleep_ms(pause_ms)
+
+    rev, _ = find_breakaway(read, drive, diff, -1, 0, stop, step, settle_ms, min_counts)
+    if rev is None:
+        raise RuntimeError("Motor did not move in reverse up to duty %d" % stop)
+    res["deadband_fwd"] = fwd
+    res["deadband_rev"] = rev
+    utime.sleep_ms(pause_ms)
+
+    # Two points above breakaway give the slope; direction sign is folded in.
+    sign = -1 if res["flip"] else 1
+    d1 = fwd + (stop - fwd) // 4
+    d2 = fwd + (stop - fwd) // 2
+    v1 = measure_velocity(read, drive, diff, d1) * sign
+    utime.sleep_ms(pause_ms)
+    v2 = measure_velocity(read, drive, diff, d2) * sign
+    if d2 > d1:
+        res["vel_per_duty"] = (v2 - v1) / (d2 - d1)
+    return res
+
+
+# ========== Storage ==========
+
+
+def load():
+    return dict(config_store.get("motor"))
+
+
+def save(res):
+    config_store.update("motor", **res)
@@ -0,0 +1,86 @@
+# Two-pin H-bridge output (DRV8833 style IN1/IN2) with 16-bit duty.
+# Commands stay on the ±1023 scale the controller uses, but fractional values are kept
+# and written with duty_u16, so the output has ~64x finer steps than duty().
+#
+# Decay modes:
+#   coast (fast decay): PWM on one input, the other low; stop = both low.
+#   brake (slow decay): one input high, the other gets the inverted PWM; stop = both high.
+
+from machine import PWM, Pin
+
+FULL_SCALE = 1023
+U16_MAX = 65535
+DEFAULT_FREQ = 20000  # above hearing range
+DECAY_COAST = "coast"
+DECAY_BRAKE = "brake"
+
+
+def _make_writer(pwm):
+    # Prefer duty_u16 (same probe as Play-note._duty_set), fall back to 10-bit duty().
+    if hasattr(pwm, "duty_u16"):
+        return pwm.duty_u16
+    return lambda d: pwm.duty(d >> 6)
+
+
+class MotorOutput:
+
+    def __init__(self, pin_a, pin_b, freq=DEFAULT_FREQ, decay=DECAY_COAST):
+        self.pwm_a = PWM(Pin(pin_a), freq=freq)
+        self.pwm_b = PWM(Pin(pin_b), freq=freq)
+        self._wa = _make_writer(self.pwm_a)
+        self._wb = _make_writer(self.pwm_b)
+        self.freq = freq
+        self.set_decay(decay)
+        self.power = 0.0
+        self.set(0)
+
+    def set_freq(self, freq):
+        self.pwm_a.freq(freq)
+        self.pwm_b.freq(freq)
+        self.freq = freq
+
+    def set_decay(self, decay):
+        if decay not in (DECAY_COAST, DECAY_BRAKE):
+            raise ValueError("Unknown decay mode: %s" % decay)
+        self.decay = decay
+        self._brake = decay == DECAY_BRAKE
+
+    def set(self, power):
+        """power in -1023..1023 (float ok); positive drives pin_a."""
+        if power > FULL_SCALE:
+            power = FULL_SCALE
+        elif power < -FULL_SCALE:
+            power = -FULL_SCALE
+        self.power = power
+        d = int(abs(power) * U16_MAX / FULL_SCALE)
+        if self._brake:
+            if power > 0:
+                self._wa(U16_MAX)
+                self._wb(U16_MAX - d)
+            elif power < 0:
+                self._wa(U16_MAX - d)
+                self._wb(U16_MAX)
+            else:
+                self._wa(U16_MAX)
+                self._wb(U16_MAX)
+        else:
+            if power > 0:
+                self._wa(d)
+                self._wb(0)
+            elif power < 0:
+                self._wa(0)
+                self._wb(d)
+            else:
+                self._wa(0)
+                self._wb(0)
+
+    def coast(self):
+        # Both inputs low regardless of decay mode, e.g. for teach mode.
+        self.power = 0.0
+        self._wa(0)
+        self._wb(0)
+
+    def deinit(self):
+        self.coast()
+        self.pwm_a.deinit()
+        self.pwm_b.deinit()
@@ -0,0 +1,135 @@
+# MT6701 configuration writer + EEPROM programming with read-back verify.
+# Works on the cached config block from mt6701_i2c: build a target image, write only the
+# registers that differ (one burst per contiguous run), burn, then verify.
+# Register reads return the shadow registers, which hold what was just written whether or
+# not the burn took. The EEPROM itself is only loaded into them at power-up, so a real
+# EEPROM check needs the sensor power-cycled (program(..., reload=fn)).
+
+import utime
+
+from mt6701_i2c import (CFG_FIRST, CFG_LEN, REG_ABZ_MUX, REG_ABZ_RES_HL, REG_ABZ_RES_L, REG_ZERO_H,
+                        REG_ZERO_L, REG_HYST_L, REG_OUTMODE)
+
+# EEPROM program sequence (datasheet): 0xB3 -> 0x09, 0x05 -> 0x0A, then wait >600 ms
+# with power held stable.
+REG_PROG_KEY = 0x09
+REG_PROG_CMD = 0x0A
+PROG_KEY = 0xB3
+PROG_CMD = 0x05
+PROG_WAIT_MS = 700
+
+# field name -> (register, shift, mask); multi-register fields are handled in set_field().
+FIELDS = {
+    "direction": (REG_ABZ_MUX, 1, 0x01),  # 0:CCW, 1:CW
+    "uvw_res": (REG_ABZ_RES_HL, 4, 0x0F),
+    "z_pulse_width": (REG_ZERO_H, 4, 0x07),
+    "pwm_freq": (REG_OUTMODE, 7, 0x01),
+    "pwm_pol": (REG_OUTMODE, 6, 0x01),
+    "out_mode": (REG_OUTMODE, 5, 0x01),
+}
+
+
+def _put(img, reg, shift, mask, value):
+    i = reg - CFG_FIRST
+    img[i] = (img[i] & ~(mask << shift) & 0xFF) | ((value & mask) << shift)
+
+
+def set_field(img, name, value):
+    if name == "zero":
+        # 12-bit ZERO: [11:8] in 0x32[3:0], [7:0] in 0x33
+        _put(img, REG_ZERO_H, 0, 0x0F, value >> 8)
+        _put(img, REG_ZERO_L, 0, 0xFF, value)
+    elif name == "abz_res":
+        _put(img, REG_ABZ_RES_HL, 0, 0x03, value >> 8)
+        _put(img, REG_ABZ_RES_L, 0, 0xFF, value)
+    elif name == "hyst":
+        # 3-bit HYST: [2] in 0x32[7], [1:0] in 0x34[7:6]
+        _put(img, REG_ZERO_H, 7, 0x01, value >> 2)
+        _put(img, REG_HYST_L, 6, 0x03, value)
+    elif name in FIELDS:
+        reg, shift, mask = FIELDS[name]
+        _put(img, reg, shift, mask, value)
+    else:
+        raise ValueError("Unknown MT6701 field: %s" % name)
+
+
+def build_image(current, **fields):
+    """Copy of the current config block with the given fields replaced."""
+    img = bytearray(current)
+    for name, value in fields.items():
+        set_field(img, name, int(value))
+    return img
+
+
+def diff_runs(old, new):
+    """[(reg, bytes)] for each contiguous run of changed registers."""
+    runs = []
+    start = None
+    for i in range(CFG_LEN):
+        if old[i] != new[i]:
+            if start is None:
+                start = i
+        elif start is not None:
+            runs.append((CFG_FIRST + start, bytes(new[start:i])))
+            start = None
+    if start is not None:
+        runs.append((CFG_FIRST + start, bytes(new[start:])))
+    return runs
+
+
+def zero_here(dev):
+    # ZERO value that makes the current position read 0. The angle register already has
+    # the current ZERO subtracted, so the reading adds to it. ZERO is 12-bit, the angle 14-bit.
+    cfg = dev.config_block()
+    zero = ((cfg[REG_ZERO_H - CFG_FIRST] & 0x0F) << 8) | cfg[REG_ZERO_L - CFG_FIRST]
+    return (zero + (dev.read_angle_counts() >> 2)) & 0xFFF
+
+
+def program(dev, burn=None, dry_run=False, reload=None, **fields):
+    """
+    Write `fields` (see set_field) to an MT6701I2C device and optionally burn EEPROM.
+    burn: True always burns (also when the registers already match, e.g. written earlier
+    without burning), False never, None burns only if something changed.
+    reload(): power-cycles the sensor so the EEPROM is loaded back into the registers;
+    without it only the shadow registers can be checked.
+    Report: shadow_ok (registers match the target after writing), eeprom_ok (registers
+    match after reload; None when not checked), plus runs/changed/burned.
+    """
+    current = bytes(dev.config_block())
+    target = build_image(current, **fields)
+    runs = diff_runs(current, target)
+    report = {
+        "runs": runs,
+        "changed": sum(len(d) for _, d in runs),
+        "burned": False,
+        "shadow_ok": True,
+        "eeprom_ok": None,
+    }
+    if dry_run:
+        return report
+    if burn is None:
+        burn = bool(runs)
+
+    for reg, data in runs:
+        dev.write_block(reg, data)
+    if runs:
+        dev.invalidate()
+        bad = diff_runs(target, dev.config_block())
+        if bad:
+            report["shadow_ok"] = False
+            report["mismatch"] = bad
+            return report  # never burn a block that did not read back
+
+    if burn:
+        dev.write_block(REG_PROG_KEY, bytes([PROG_KEY]))
+        dev.write_block(REG_PROG_CMD, bytes([PROG_CMD]))
+        utime.sleep_ms(PROG_WAIT_MS)
+        report["burned"] = True
+        if reload is not None:
+            reload()
+            dev.invalidate()
+            bad = diff_runs(target, dev.config_block())
+            report["eeprom_ok"] = not bad
+            if bad:
+                report["mismatch"] = bad
+    return report
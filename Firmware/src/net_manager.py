@@ -0,0 +1,162 @@
+# Non-blocking network bring-up.
+# The state machine is advanced by calling step() from whatever loop is already running
+# (web server accept loop, control idle slot, ...). Nothing in here ever sleeps, so motor and
+# encoder init can happen right after start() and the joint can hold position while Wi-Fi comes up.
+
+import network
+import utime
+
+# ========== States ==========
+ST_IDLE = "idle"
+ST_STA_CONNECTING = "sta_connecting"
+ST_STA_BACKOFF = "sta_backoff"
+ST_STA_CONNECTED = "sta_connected"
+ST_AP = "ap"
+
+HOSTNAME = "esp-miniarm"
+AP_ESSID = "RoboticArm_AP"
+AP_PASSWORD = "12345678"
+
+
+def _set_hostname(wlan, hostname):
+    # Some firmwares want this before connect(), older ones only know dhcp_hostname.
+    for key in ("hostname", "dhcp_hostname"):
+        try:
+            wlan.config(**{key: hostname})
+            return True
+        except Exception:
+            pass
+    return False
+
+
+class NetManager:
+    """
+    STA connect with exponential backoff, AP fallback once attempts run out,
+    and mDNS registration (via mdns_fn) once STA is up.
+    on_state(old, new, manager) is called on every transition.
+    """
+
+    def __init__(self,
+                 ssid,
+                 password="",
+                 hostname=HOSTNAME,
+                 on_state=None,
+                 mdns_fn=None,
+                 attempt_timeout_ms=8000,
+                 max_attempts=3,
+                 backoff_ms=500,
+                 backoff_max_ms=8000,
+                 wlan_factory=None):
+        self.ssid = ssid
+        self.password = password
+        self.hostname = hostname
+        self.on_state = on_state
+        self.mdns_fn = mdns_fn
+        self.attempt_timeout_ms = attempt_timeout_ms
+        self.max_attempts = max_attempts
+        self.backoff_ms = backoff_ms
+        self.backoff_max_ms = backoff_max_ms
+        self._wlan_factory = wlan_factory or network.WLAN
+
+        self.state = ST_IDLE
+        self.iface = None
+        self.attempts = 0
+        self.mdns_ok = False
+        self._sta = None
+        self._deadline = 0
+
+    # ========== Public API ==========
+
+    def start(self):
+        if self.state != ST_IDLE:
+            return
+        self._sta = self._wlan_factory(network.STA_IF)
+        self._sta.active(True)
+        _set_hostname(self._sta, self.hostname)
+        if self.ssid:
+            self._begin_attempt(utime.ticks_ms())
+        else:
+            self._start_ap()
+
+    def step(self, now=None):
+        """Advance the state machine. Cheap when nothing changes; never blocks."""
+        if now is None:
+            now = utime.ticks_ms()
+        st = self.state
+        if st == ST_STA_CONNECTING:
+            if self._sta.isconnected():
+                self._on_connected()
+            elif utime.ticks_diff(now, self._deadline) >= 0:
+                self._attempt_failed(now)
+        elif st == ST_STA_BACKOFF:
+            if utime.ticks_diff(now, self._deadline) >= 0:
+                self._begin_attempt(now)
+        elif st == ST_STA_CONNECTED:
+            if not self._sta.isconnected():
+                # Link dropped, start over with a fresh attempt budget.
+                self.attempts = 0
+                self.mdns_ok = False
+                self._begin_attempt(now)
+        return self.state
+
+    def is_up(self):
+        return self.state == ST_STA_CONNECTED or self.state == ST_AP
+
+    def is_ap(self):
+        return self.state == ST_AP
+
+    def ip(self):
+        if self.iface is None:
+            return None
+        return self.iface.ifconfig()[0]
+
+    # ========== Transitions ==========
+
+    def _set_state(self, new):
+        old = self.state
+        if old == new:
+            return
+        self.state = new
+        if self.on_state:
+            self.on_state(old, new, self)
+
+    def _begin_attempt(self, now):
+        self.attempts += 1
+        print("Connecting to WiFi: %s (attempt %d/%d)" % (self.ssid, self.attempts, self.max_attempts))
+        try:
+            self._sta.connect(self.ssid, self.password or None)
+        except OSError as e:
+            # connect() can raise if a previous attempt is still pending; let the timeout handle it.
+            print("WiFi connect error:", e)
+        self._deadline = utime.ticks_add(now, self.attempt_timeout_ms)
+        self._set_state(ST_STA_CONNECTING)
+
+    def _attempt_failed(self, now):
+        try:
+            self._sta.disconnect()
+        except Exception:
+            pass
+        if self.attempts >= self.max_attempts:
+            self._start_ap()
+            return
+        delay = min(self.backoff_ms << (self.attempts - 1), self.backoff_max_ms)
+        self._deadline = utime.ticks_add(now, delay)
+        self._set_state(ST_STA_BACKOFF)
+
+    def _on_connected(self):
+        self.iface = self._sta
+        self._set_state(ST_STA_CONNECTED)
+        if self.mdns_fn:
+            try:
+                self.mdns_ok = bool(self.mdns_fn(self.hostname, self._sta))
+            except Exception as e:
+                print("mDNS setup failed:", e)
+                self.mdns_ok = False
+
+    def _start_ap(self):
+        self._sta.active(False)
+        ap = self._wlan_factory(network.AP_IF)
+        ap.active(True)
+        ap.config(essid=AP_ESSID, password=AP_PASSWORD, authmode=network.AUTH_WPA_WPA2_PSK)
+        self.iface = ap
+        self._set_state(ST_AP)
@@ -0,0 +1,58 @@
+# Glue between the web server / chain traffic and this node's control runtime (main.py).
+# node_index is the node id from build.py -n (node.json): 1-based, the same number the
+# node tags chain frames with ("- via [id]"). Setpoint frames and the web arm's position
+# lists are 0-based per joint, so the id is converted to a joint index here and nowhere else.
+# Shared with the host checks (miniarm_host.node_chain_check), so no MicroPython-only imports.
+
+import chain_proto
+
+ST_POS = 0  # runtime.ST_POS
+
+
+def joint_of(node_index):
+    """Node id (1-based) -> joint index (0-based); -1 for an unconfigured node (id 0)."""
+    return node_index - 1 if node_index > 0 else -1
+
+
+class NodeHooks:
+    """
+    rt: runtime.Runtime (command, read_state). arm: webserver.RoboticArm, whose position
+    list holds every joint. player: tone.TonePlayer to silence before control takes over.
+    """
+
+    def __init__(self, node_index, rt, arm, player=None):
+        self.node_index = node_index
+        self.joint = joint_of(node_index)
+        self.rt = rt
+        self.arm = arm
+        self.player = player
+        if self.joint < 0:
+            print("node_index %d: no joint, setpoints are ignored" % node_index)
+
+    def _preempt(self):
+        if self.player is not None:
+            self.player.preempt()
+
+    def send_target(self, pos, vel):
+        self._preempt()
+        if 0 <= self.joint < len(pos):
+            self.rt.command(pos[self.joint], vel[self.joint])
+
+    def read_position(self):
+        pos = list(self.arm.position)
+        if 0 <= self.joint < len(pos):
+            pos[self.joint] = int(self.rt.read_state()[ST_POS])
+        return pos
+
+    def chain(self, payload):
+        # Host gateway setpoints over TCP (POST /api/chain), same protocol as the UART chain.
+        if self.joint < 0:
+            return b''
+        self._preempt()
+        return chain_proto.apply_setpoints(payload, self.joint, self.rt.command, self.rt.read_state)
+
+    def install(self):
+        self.arm.on_target = self.send_target
+        self.arm.read_position = self.read_position
+        self.arm.on_chain = self.chain
+        self.arm.read_state = self.rt.read_state
@@ -1,22 +1,40 @@
-import machine
 import time
-from machine import SPI, Pin, Timer
 
-from machine import Pin
+import config_store
+import encoders
+import encoder_cal
+import autotune
+import motor_char
+import motor_out
+import cascade
+from supervisor import safety
+import metrics
+import gc_policy
+import motion
+import teach
+import telemetry
+from metrics import stats
+from fastpath import wrap_diff
 
 # ========== Global State ==========
-i2c = None
-pwm_fwd = None
-pwm_rev = None
-PWM_FREQUENCEY = 2000
-# AS5600 config
-AS5600_ADDR = 0x36
+encoder = None
+motor = None
+watchdog = None
+PWM_FREQUENCEY = motor_out.DEFAULT_FREQ
 
 # Motor control pins (adjust as needed)
 PWM_PIN_FWD = 1
 PWM_PIN_REV = 3
-SCL_PIN = 4
-SDA_PIN = 5
+
+# Motor compensation, see motor_char. Applied in set_motor() without touching the PWM objects.
+motor_flip = False
+deadband_fwd = 0
+deadband_rev = 0
+vel_per_duty = 0.0
+
+# Encoder counts per turn; set from the fitted encoder in setup().
+ENC_RES = 4096
+ENC_HALF = ENC_RES // 2
 
 # PID state
 
@@ -31,144 +49,169 @@ class PIDParam:
 
 
 pid_param = PIDParam()
+cascade_param = cascade.CascadeParam()
 
 # ========== Setup Functions ==========
 
 
 def print_vars():
     print(f"pwm fwd pin{PWM_PIN_FWD} , rev pin {PWM_PIN_REV}")
-    print(f"I2C SCL {SCL_PIN} , SDA {SDA_PIN}")
+    print(f"Encoder {encoder.name if encoder else None} , resolution {ENC_RES}")
     print(f"PID param {pid_param}")
 
 
-def setup():
-    global pwm_fwd, pwm_rev, i2c
-
-    pwm_fwd = machine.PWM(machine.Pin(PWM_PIN_FWD), freq=PWM_FREQUENCEY)
-    pwm_rev = machine.PWM(machine.Pin(PWM_PIN_REV), freq=PWM_FREQUENCEY)
-    pwm_fwd.duty(0)
-    pwm_rev.duty(0)
-
-    # i2c = machine.I2C(0, scl=machine.Pin(SCL_PIN), sda=machine.Pin(SDA_PIN))
-
-    init_mt6701()
-    print("Hardware initialized.")
-
-
-# MT6701 SSI (24-bit: 14 angle + 4 status + 6 CRC) via SPI on ESP32/ESP32-C3
-# - SPI provides the clock burst (uses HW, typically DMA under the hood)
-# - CRC polynomial: x^6 + x + 1 (MSB-first over 18 bits: angle[13:0], status[3:0])
-#   Ref: MT6701 datasheet SSI format & timing.
-
-# ===== User config =====
-SPI_ID = 1  # ESP32/ESP32-C3: pick a usable SPI bus id
-PIN_SCK = 4  # to MT6701 CLK
-PIN_MISO = 5  # from MT6701 DO
-PIN_CS = 6  # to MT6701 CSN (active low)
-SPI_BAUD = 1_000_00  # 1 MHz (datasheet allows higher if wiring is good)
-SPI_MODE = 1  # CPOL=0, CPHA=1: sample on falling edge (data changes on rising)
-
-BITS_POS = 14
-BITS_STAT = 4
-BITS_CRC = 6
-FRAME_BITS = BITS_POS + BITS_STAT + BITS_CRC  # 24
+def load_node_config():
+    # Cached by config_store; node.json is read once per boot.
+    return config_store.get("node")
+
+
+def set_encoder(enc):
+    global encoder, ENC_RES, ENC_HALF
+    if enc.resolution & (enc.resolution - 1):
+        # fastpath.wrap_diff masks instead of taking the modulo.
+        raise ValueError("Encoder resolution must be a power of two: %d" % enc.resolution)
+    encoder = enc
+    ENC_RES = enc.resolution
+    ENC_HALF = ENC_RES // 2
+
+
+def setup(node_cfg=None):
+    global motor
+
+    if node_cfg is None:
+        node_cfg = load_node_config()
+    motor = motor_out.MotorOutput(PWM_PIN_FWD,
+                                  PWM_PIN_REV,
+                                  freq=node_cfg.get("pwm_freq", PWM_FREQUENCEY),
+                                  decay=node_cfg.get("decay", motor_out.DECAY_COAST))
+    enc = encoders.make_encoder(node_cfg)
+    table = encoder_cal.load_table()
+    if table is not None:
+        enc = encoder_cal.LinearizedEncoder(enc, table)
+        print("Encoder linearization table loaded.")
+    set_encoder(enc)
+    load_pid()
+    load_cascade()
+    apply_motor_char(motor_char.load())
+    if node_cfg.get("char_on_boot") and not vel_per_duty:
+        # Opt-in: spins the joint open loop, so only for joints that are free to move.
+        try:
+            characterize_motor()
+        except RuntimeError as e:
+            print("Motor characterization failed:", e)
+    safety.on_trip = motor_off
+    print("Hardware initialized. Encoder:", encoder.name)
+
+
+def enable_watchdog(timeout_ms=500):
+    # Irreversible: from here on the control loop must keep running and meet its deadlines.
+    global watchdog
+    watchdog = metrics.LoopWatchdog(timeout_ms)
+
+
+def calibrate_encoder(duty=300, turns=2):
+    # Fit on the raw sensor, then save and apply the new table.
+    raw = encoder.enc if isinstance(encoder, encoder_cal.LinearizedEncoder) else encoder
+    table = encoder_cal.calibrate(raw, set_motor, duty=duty, turns=turns)
+    encoder_cal.save_table(table)
+    set_encoder(encoder_cal.LinearizedEncoder(raw, table))
+    print("Encoder calibrated, max correction:", max(abs(x) for x in table))
+    return table
+
+
+# ===== MT6701 SSI debug helpers =====
 DEG_PER_TURN = 360.0
 
-# ===== Init =====
-
-
-def init_mt6701():
-    global cs, spi
-    cs = Pin(PIN_CS, Pin.OUT, value=1)
-    spi = SPI(SPI_ID, baudrate=SPI_BAUD, polarity=0, phase=1, sck=Pin(PIN_SCK), mosi=None, miso=Pin(PIN_MISO))
-
-
-# ===== CRC-6 (poly x^6 + x + 1) helper =====
-# Polynomial (including top bit) is 0b1_000011 = 0x43; use lower 6 bits (0x03) in feedback form.
-def crc6_mt6701_msb_first(value_18bits):
-    rem = 0  # 6-bit remainder
-    poly_lo = 0x03  # polynomial without the x^6 term
-    for i in range(17, -1, -1):  # process 18 bits MSB->LSB
-        bit = (value_18bits >> i) & 1
-        fb = ((rem >> 5) & 1) ^ bit
-        rem = ((rem << 1) & 0x3F)
-        if fb:
-            rem ^= poly_lo
-    return rem  # 6-bit CRC
-
-
-# ===== Low-level: read one 24-bit SSI frame =====
-def _read_frame24():
-    buf = bytearray(3)
-    cs.value(0)
-    # small setup/hold margins; datasheet margins are sub-µs, so 1 µs is safe
-    time.sleep_us(30)
-    spi.readinto(buf)  # clocks 24 SCK edges; hardware handles shifting
-    time.sleep_us(1)
-    cs.value(1)
-    return (buf[0] << 16) | (buf[1] << 8) | buf[2]
-
 
-# ===== Parse + CRC check =====
 def read_mt6701():
-    raw24 = _read_frame24()
+    # Only meaningful when the SSI encoder is selected; reports the frame even on CRC failure.
+    enc = encoders.sensor(encoder)
+    enc.read()
+    raw24 = enc.raw
     # Bits: [23:10]=angle(14), [9:6]=status(4), [5:0]=crc(6)  (MSB-first)
     angle14 = (raw24 >> 10) & 0x3FFF
     status4 = (raw24 >> 6) & 0x000F
     crc_rx = raw24 & 0x003F
+    crc_calc = encoders.crc6((angle14 << 4) | status4)
+    angle_deg = (angle14 * DEG_PER_TURN) / enc.resolution
+    return angle_deg, angle14, status4, crc_rx, crc_calc, enc.crc_ok
 
-    # Compute CRC over the 18-bit concatenation of angle+status (MSB-first)
-    data18 = (angle14 << 4) | status4
-    crc_calc = crc6_mt6701_msb_first(data18)
-    crc_ok = (crc_calc == crc_rx)
 
-    # Convert to degrees (0..360)
-    angle_deg = (angle14 * DEG_PER_TURN) / (1 << BITS_POS)
-    return angle_deg, angle14, status4, crc_rx, crc_calc, crc_ok
-
-
-# ===== Example: poll at 500 Hz and print when CRC passes =====
+# ===== Example: poll at 500 Hz and print each frame =====
 
 
 def loop_mt6707_read(duration_s=1):
     start_time = time.ticks_ms()
     while time.ticks_diff(time.ticks_ms(), start_time) < duration_s * 1000:
         ang_deg, angle14, stat, crc_rx, crc_calc, ok = read_mt6701()
-        if ok:
-            print("deg=%.3f  angle14=%5d  status=0x%X  CRC ok" % (ang_deg, angle14, stat))
+        if not ok:
+            print("CRC FAIL: rx=%02X calc=%02X  status=0x%X" % (crc_rx, crc_calc, stat))
+        elif stat & encoders.MT6701_STATUS_BAD:
+            print("deg=%.3f  angle14=%5d  status=0x%X  CRC ok, STATUS BAD" % (ang_deg, angle14, stat))
         else:
             print("deg=%.3f  angle14=%5d  status=0x%X  CRC ok" % (ang_deg, angle14, stat))
-            print("CRC FAIL: rx=%02X calc=%02X  status=0x%X" % (crc_rx, crc_calc, stat))
         time.sleep(0.002)  # 2 ms
 
 
+def encoder_quality(duration_s=1, interval_ms=1):
+    # Read at the control rate and print the oversampling pipeline's totals. The oversampler
+    # may sit under the linearization table, so look through the wrappers for it.
+    over = encoders.find_layer(encoder, encoders.OversampledEncoder)
+    if over is None:
+        print("Encoder is not oversampled (set enc_samples in node.json)")
+        return None
+    over.reset_stats()
+    spread = 0
+    start_time = time.ticks_ms()
+    while time.ticks_diff(time.ticks_ms(), start_time) < duration_s * 1000:
+        read_encoder()
+        spread = max(spread, over.spread)
+        time.sleep_ms(interval_ms)
+    s = over.stats()
+    s["max_spread"] = spread
+    print(s)
+    return s
+
+
 # ========== Encoder and Motor Utilities ==========
 
 
 def read_encoder():
-    raw = i2c.readfrom_mem(AS5600_ADDR, 0x0C, 2)
-    return ((raw[0] << 8) | raw[1]) & 0x0FFF
+    return encoder.read()
 
 
 def round_angle(encoder_raw):
-    return (encoder_raw + 2048) % 4096 - 2048
+    return wrap_diff(encoder_raw, 0, ENC_RES)
 
 
 def angle_diff(a, b):
-    return (a - b + 2048) % 4096 - 2048
+    return wrap_diff(a, b, ENC_RES)
 
 
 def set_motor(power):
-    power = max(min(int(power), 1023), -1023)
+    # A latched safety fault overrides every command until safety.reset().
+    # Planner feed-forward happens upstream in cascade.Cascade (vel_ff, vel_kff), not here.
+    if safety.fault:
+        motor.set(0)
+        return
+    # Deadband compensation: any nonzero command starts at the breakaway duty.
+    # Deadbands are per raw H-bridge direction, so flip first.
+    if motor_flip:
+        power = -power
     if power > 0:
-        pwm_fwd.duty(power)
-        pwm_rev.duty(0)
+        power += deadband_fwd
     elif power < 0:
-        pwm_fwd.duty(0)
-        pwm_rev.duty(-power)
-    else:
-        pwm_fwd.duty(0)
-        pwm_rev.duty(0)
+        power -= deadband_rev
+    motor.set(power)
+
+
+def motor_off():
+    motor.set(0)
+
+
+def drive_raw(power):
+    # Direct H-bridge output, no flip or compensation.
+    motor.set(power)
 
 
 # ========== Test Utilities ==========
@@ -209,11 +252,28 @@ def is_motor_positive_encoder_increment():
 
 
 def auto_flip_motor():
+    global motor_flip
     if not is_motor_positive_encoder_increment():
         print("Motor direction is wrong, flipping Pins.")
-        global pwm_fwd, pwm_rev
-        pwm_fwd = machine.PWM(machine.Pin(PWM_PIN_REV), freq=PWM_FREQUENCEY)
-        pwm_rev = machine.PWM(machine.Pin(PWM_PIN_FWD), freq=PWM_FREQUENCEY)
+        motor_flip = not motor_flip
+
+
+def apply_motor_char(res):
+    global motor_flip, deadband_fwd, deadband_rev, vel_per_duty
+    motor_flip = bool(res["flip"])
+    deadband_fwd = int(res["deadband_fwd"])
+    deadband_rev = int(res["deadband_rev"])
+    vel_per_duty = float(res["vel_per_duty"])
+
+
+def characterize_motor(save=True):
+    res = motor_char.characterize(read_encoder, drive_raw, angle_diff)
+    print(f"Motor: flip={res['flip']} deadband fwd={res['deadband_fwd']} rev={res['deadband_rev']} "
+          f"vel/duty={res['vel_per_duty']:.3f}")
+    apply_motor_char(res)
+    if save:
+        motor_char.save(res)
+    return res
 
 
 # ========== PID Control Loop ==========
@@ -237,6 +297,8 @@ def pid_run(target_position, duration_ms=2000, interval_us=10000):
         pos = read_encoder()
 
         dt = time.ticks_diff(now, last_time) / 1000000.0
+        if dt <= 0:
+            dt = interval_us / 1e6
         err = angle_diff(target_position, pos)
         velocity = angle_diff(pos, last_pos)
 
@@ -263,6 +325,8 @@ def pid_run(target_position, duration_ms=2000, interval_us=10000):
             print(f"Warning: Output saturated to {output}")
             output = MAX_OUTPUT if output > 0 else -MAX_OUTPUT
 
+        if not safety.check(output, err, velocity / dt, encoder.valid):
+            break
         set_motor(output)
 
         print(
@@ -279,6 +343,295 @@ def pid_run(target_position, duration_ms=2000, interval_us=10000):
     set_motor(0)
 
 
+class CascadeLoop:
+    """
+    One joint's cascade controller as a tick() call, shared by cascade_run() and the
+    threaded runtime. tick() reads the encoder, runs safety and drives the motor.
+    """
+
+    def __init__(self, interval_us=1000, param=None):
+        # Gains are taken when the loop is built; setup() has loaded the stored ones by then.
+        self.interval_us = interval_us
+        self.ctl = cascade.Cascade(param or cascade_param)
+        self.last_pos = read_encoder()
+        self.last_time = time.ticks_us()
+        self.pos = self.last_pos
+        self.err = 0
+        self.output = 0.0
+
+    def tick(self, target_position, vel_ff=0.0):
+        """Returns False once the safety supervisor has latched a fault."""
+        now = time.ticks_us()
+        pos = read_encoder()
+        dt = time.ticks_diff(now, self.last_time) / 1000000.0
+        if dt <= 0:
+            dt = self.interval_us / 1e6
+        err = wrap_diff(target_position, pos, ENC_RES)
+        vel = wrap_diff(pos, self.last_pos, ENC_RES) / dt
+
+        output = self.ctl.update(err, vel, dt, vel_ff)
+        if not encoder.valid:
+            stats.crc_errors += 1
+        ok = safety.check(output, err, vel, encoder.valid)
+        set_motor(output if ok else 0)
+
+        work_us = time.ticks_diff(time.ticks_us(), now)
+        on_time = stats.loop.tick(now, self.interval_us, work_us, time.ticks_diff)
+        if watchdog:
+            watchdog.feed_if(on_time)
+
+        self.last_time = now
+        self.last_pos = pos
+        self.pos = pos
+        self.err = err
+        self.output = output
+        return ok
+
+    def state_into(self, out):
+        # (pos, err, output, fault) for runtime.Runtime, written in place.
+        out[0] = self.pos
+        out[1] = self.err
+        out[2] = self.output
+        out[3] = safety.fault
+
+
+def cascade_run(target_position, duration_ms=2000, interval_us=1000, verbose=False, log=None):
+    # Inner velocity loop at interval_us, outer position loop every cascade_param.divider ticks.
+    # log: file name for binary per-tick telemetry (miniarm_host.loganalyze reads it).
+    loop = CascadeLoop(interval_us)
+    next_time = time.ticks_us()
+    start_time = time.ticks_ms()
+    tl = telemetry.TelemetryWriter(log, telemetry.CASCADE_FIELDS, interval_us) if log else None
+
+    # Automatic GC stays off for the whole run; collections only happen in idle slots.
+    with gc_policy.Critical():
+        while time.ticks_diff(time.ticks_ms(), start_time) < duration_ms:
+            if not loop.tick(target_position):
+                break
+
+            if verbose:
+                ctl = loop.ctl
+                print(f"t:{loop.last_time} ,\t pos:{loop.pos} ,\t err:{loop.err} ,\t "
+                      f"vcmd:{ctl.vel_cmd:.1f} , vel:{ctl.vel_est:.1f} , output:{loop.output:.2f}")
+            if tl:
+                ctl = loop.ctl
+                tl.add(loop.last_time, target_position, loop.pos, loop.err, ctl.vel_cmd, ctl.vel_est,
+                       loop.output, safety.fault)
+
+            # Fixed-rate schedule rather than a fixed sleep, so loop work doesn't stretch the period.
+            next_time = time.ticks_add(next_time, interval_us)
+            # Spare time before the next tick is the GC's idle slot.
+            gc_policy.policy.idle(time.ticks_diff(next_time, time.ticks_us()))
+            wait = time.ticks_diff(next_time, time.ticks_us())
+            if wait > 0:
+                time.sleep_us(wait)
+            else:
+                next_time = time.ticks_us()
+
+    set_motor(0)
+    if tl:
+        tl.close()
+
+
+# ========== Teach and Replay ==========
+
+# Compliant teaching: a soft cascade that holds an anchor which creeps after the joint,
+# so the arm can be pushed around but does not drop under its own weight.
+TEACH_FOLLOW = 0.02  # fraction of the anchor error removed per tick
+
+
+# Set by main.py to its runtime.Runtime: while that thread runs it owns the motor, so
+# teach_record/teach_replay go through it instead of running a second loop.
+control_rt = None
+
+
+def _running_rt(rt):
+    rt = rt if rt is not None else control_rt
+    return rt if rt is not None and not rt.stopped else None
+
+
+def teach_param():
+    p = cascade.CascadeParam()
+    p.pos_kp = cascade_param.pos_kp * 0.1
+    p.pos_ki = 0.0
+    p.vel_kp = cascade_param.vel_kp * 0.3
+    p.vel_ki = 0.0
+    p.out_limit = 300.0
+    return p
+
+
+class _TeachTick:
+    """
+    Teach mode as a per-tick controller: coast (limp) or run the soft cascade, and sample
+    the joint into rec. tick()/state_into() have runtime.Runtime's signatures, so the same
+    object runs in the local loop or in the control thread (Runtime.set_tick).
+    """
+
+    def __init__(self, rec, track, loop=None):
+        self.rec = rec
+        self.track = track
+        self.loop = loop
+        self.anchor = loop.pos if loop else 0
+        self.limp = False
+        self.sampled = False
+
+    def tick(self, _target=0, _vel_ff=0.0):
+        ok = True
+        loop = self.loop
+        if loop:
+            self.anchor += angle_diff(loop.pos, self.anchor) * TEACH_FOLLOW
+            ok = loop.tick(round_angle(int(self.anchor)))
+        else:
+            if not self.limp:
+                # First tick, so it lands after the last tick of whatever held the joint before.
+                motor.coast()
+                self.limp = True
+            # No loop.tick to feed the watchdog while limp; the thread running is enough.
+            if watchdog:
+                watchdog.feed_if(True)
+        self.sampled = self.rec.sample()
+        return ok
+
+    def state_into(self, out):
+        if self.loop:
+            self.loop.state_into(out)
+            return
+        out[0] = self.track[0]
+        out[1] = 0
+        out[2] = 0
+        out[3] = safety.fault
+
+
+def teach_record(slot=0,
+                 duration_ms=10000,
+                 interval_ms=teach.DEFAULT_INTERVAL_MS,
+                 tolerance=teach.DEFAULT_TOLERANCE,
+                 compliant=False,
+                 tick_us=1000,
+                 rt=None):
+    """
+    Record this joint into teach_<slot>.bin. Limp (motor coasting) by default; compliant
+    runs the soft teach_param() cascade instead. Returns (samples, keyframes, bytes).
+    With a running control runtime (rt, default control_rt) the teach tick replaces the
+    position loop in the control thread and this thread only drains samples to flash;
+    afterwards the loop resumes holding wherever the joint was left.
+    """
+    rt = _running_rt(rt)
+    # Unwrapped, so a move across the encoder wrap replays as the same move.
+    track = [read_encoder(), 0]
+
+    def read_unwrapped():
+        pos = read_encoder()
+        track[1] += angle_diff(pos, track[0])
+        track[0] = pos
+        return track[1]
+
+    track[1] = track[0]
+    rec = teach.Recorder(read_unwrapped, interval_ms)
+    loop = None
+    if compliant:
+        loop = CascadeLoop(tick_us, teach_param())
+    tt = _TeachTick(rec, track, loop)
+    old = rt.set_tick(tt.tick, tt.state_into) if rt is not None else None
+    start = time.ticks_ms()
+    next_time = time.ticks_us()
+    with open(teach.TEACH_FILE % slot, "wb") as f:
+        writer = teach.KeyframeWriter(f, interval_ms, tolerance)
+        try:
+            while time.ticks_diff(time.ticks_ms(), start) < duration_ms:
+                if rt is not None:
+                    # Control thread samples; flash writes stay on this side of the ring.
+                    rec.drain(writer)
+                    time.sleep_ms(interval_ms)
+                    continue
+                tt.tick()
+                # Flash writes happen between samples, a few samples at a time.
+                if tt.sampled and rec.samples % 8 == 0:
+                    rec.drain(writer)
+                next_time = time.ticks_add(next_time, tick_us)
+                wait = time.ticks_diff(next_time, time.ticks_us())
+                if wait > 0:
+                    time.sleep_us(wait)
+                else:
+                    next_time = time.ticks_us()
+        finally:
+            if old is not None:
+                rt.command(track[0])  # hold where the joint was left, not the old setpoint
+                rt.set_tick(*old)
+            else:
+                set_motor(0)
+            rec.drain(writer)
+            writer.close()
+    print(f"Teach: {rec.samples} samples -> {writer.count} keyframes, {writer.bytes} bytes, "
+          f"{rec.dropped} dropped")
+    return rec.samples, writer.count, writer.bytes
+
+
+def teach_replay(slot=0, speed=1.0, interval_us=1000, lead_in_ms=teach.DEFAULT_LEAD_IN_MS, rt=None):
+    """
+    Play teach_<slot>.bin back through motion.ProgramRunner, `speed` times as fast. With a
+    running control runtime (rt, default control_rt) the setpoints go to it through
+    rt.command() like any other program; otherwise this runs its own control loop.
+    Keyframes are unwrapped and can be more than half a turn apart, so the runner
+    interpolates them as plain numbers; only the lead-in start is unwrapped next to the
+    recorded start pose, so the joint takes the short way there.
+    """
+    rt = _running_rt(rt)
+    prog = teach.TeachProgram(teach.TEACH_FILE % slot, speed, lead_in_ms)
+    rec_start = prog.steps.start
+    sp = [0, 0.0]
+
+    def sink(pos, vel):
+        sp[0] = round_angle(pos[0])
+        sp[1] = vel[0]
+        if rt is not None:
+            rt.command(sp[0], sp[1])
+
+    runner = motion.ProgramRunner(sink)
+    if rt is not None:
+        start = int(rt.read_state()[0])  # runtime.ST_POS
+        start = rec_start + angle_diff(start, rec_start)
+        runner.start(prog, (start, ), "teach_%d" % slot, profile=motion.linear)
+        try:
+            while runner.step() == motion.ST_RUNNING:
+                if rt.read_state()[3]:  # runtime.ST_FAULT
+                    runner.stop()
+                    break
+                time.sleep_ms(max(1, interval_us // 1000))
+        finally:
+            prog.close()
+        return runner.state
+
+    loop = CascadeLoop(interval_us)
+    sp[0] = loop.pos
+    start = rec_start + angle_diff(loop.pos, rec_start)
+    runner.start(prog, (start, ), "teach_%d" % slot, profile=motion.linear)
+    next_time = time.ticks_us()
+    try:
+        with gc_policy.Critical():
+            while runner.step() == motion.ST_RUNNING:
+                if not loop.tick(sp[0], sp[1]):
+                    runner.stop()
+                    break
+                next_time = time.ticks_add(next_time, interval_us)
+                gc_policy.policy.idle(time.ticks_diff(next_time, time.ticks_us()))
+                wait = time.ticks_diff(next_time, time.ticks_us())
+                if wait > 0:
+                    time.sleep_us(wait)
+                else:
+                    next_time = time.ticks_us()
+    finally:
+        prog.close()
+        set_motor(0)
+    return runner.state
+
+
+def test_cascade(increment_angle=400, duration_ms=2000, interval_us=1000):
+    current_pos = read_encoder()
+    target_position = round_angle(current_pos + increment_angle)
+    cascade_run(target_position, duration_ms, interval_us)
+
+
 def test_pid(increment_angle=400, duration_ms=2000, interval_us=10000):
     current_pos = read_encoder()
     target_position = round_angle(current_pos + increment_angle)
@@ -297,3 +650,73 @@ def set_pid(kp, ki, kd):
     pid_param.ki = ki
     pid_param.kd = kd
     print(f"PID updated to {pid_param}")
+
+
+def load_pid():
+    # Per-node gains written by save_pid()/run_autotune(), next to node.json.
+    g = config_store.get("pid")
+    set_pid(g["kp"], g["ki"], g["kd"])
+
+
+def save_pid():
+    config_store.update("pid", kp=pid_param.kp, ki=pid_param.ki, kd=pid_param.kd)
+
+
+CASCADE_GAINS = ("pos_kp", "vel_kp", "vel_ki")
+
+
+def set_cascade(**gains):
+    # pos_kp / vel_kp / vel_ki; takes effect for CascadeLoops built afterwards.
+    for k, v in gains.items():
+        if k not in CASCADE_GAINS:
+            raise ValueError("Unknown cascade gain: %s" % k)
+        setattr(cascade_param, k, float(v))
+    print(f"Cascade updated to {cascade_param}")
+
+
+def load_cascade():
+    # Only the gains stored in cascade.json; the rest keep the CascadeParam defaults.
+    g = config_store.get("cascade")
+    gains = {k: g[k] for k in CASCADE_GAINS if k in g}
+    if gains:
+        set_cascade(**gains)
+
+
+def save_cascade():
+    config_store.update("cascade", **{k: getattr(cascade_param, k) for k in CASCADE_GAINS})
+
+
+def run_autotune(method="relay", rule=autotune.DEFAULT_RULE, amplitude=400, save=True, loop="pid"):
+    """
+    Tune pid_run's gains (loop="pid") or the CascadeLoop gains (loop="cascade", step
+    method only). Nothing is applied or saved when the experiment gives unusable gains.
+    """
+    if loop == "cascade":
+        if method != "step":
+            raise ValueError("Cascade autotune needs the step method")
+        log = autotune.step_test(read_encoder, set_motor, angle_diff, duty=amplitude)
+        k, tau = autotune.analyze_step(log, amplitude)
+        print(f"Step: K={k:.4f} counts/s/duty tau={tau:.4f}s")
+        pos_kp, vel_kp, vel_ki = autotune.gains_for_cascade(k, tau)
+        set_cascade(pos_kp=pos_kp, vel_kp=vel_kp, vel_ki=vel_ki)
+        if save:
+            save_cascade()
+        return cascade_param
+    if loop != "pid":
+        raise ValueError("Unknown autotune loop: %s" % loop)
+    if method == "relay":
+        log = autotune.relay_test(read_encoder, set_motor, angle_diff, amplitude=amplitude)
+        ku, tu = autotune.analyze_relay(log, amplitude)
+        print(f"Relay: Ku={ku:.4f} Tu={tu:.4f}s")
+        kp, ki, kd = autotune.gains_from_relay(ku, tu, rule)
+    elif method == "step":
+        log = autotune.step_test(read_encoder, set_motor, angle_diff, duty=amplitude)
+        k, tau = autotune.analyze_step(log, amplitude)
+        print(f"Step: K={k:.4f} counts/s/duty tau={tau:.4f}s")
+        kp, ki, kd = autotune.gains_from_model(k, tau)
+    else:
+        raise ValueError("Unknown autotune method: %s" % method)
+    set_pid(kp, ki, kd)
+    if save:
+        save_pid()
+    return pid_param
@@ -0,0 +1,212 @@
+# Control / networking split.
+# The control loop runs on its own (a _thread on ESP32, or a hardware Timer that schedules
+# the tick with micropython.schedule), the web server keeps the main thread. The two sides
+# only talk through SPSCRing buffers, so the network side never holds anything the control
+# loop waits on. Works on CPython with real threads for host testing.
+
+import _thread
+import utime
+from array import array
+from machine import Timer
+
+try:
+    import micropython
+except ImportError:
+    micropython = None
+
+# Setpoint slot: (position counts, velocity feed-forward counts/s)
+SP_POS = 0
+SP_VEL = 1
+SP_WIDTH = 2
+# State slot: (position, error, output, fault code)
+ST_POS = 0
+ST_ERR = 1
+ST_OUT = 2
+ST_FAULT = 3
+ST_WIDTH = 4
+
+
+class SPSCRing:
+    """
+    Single-producer / single-consumer ring of fixed-width float records.
+    The producer only writes _head, the consumer only writes _tail; slots are preallocated
+    so push/pop never allocate. One slot is kept empty to tell full from empty.
+    """
+
+    def __init__(self, slots, width):
+        self._n = slots
+        self._buf = [array('f', [0.0] * width) for _ in range(slots)]
+        self._head = 0
+        self._tail = 0
+        self.width = width
+        self.dropped = 0
+
+    def push(self, *values):
+        h = self._head
+        nxt = h + 1
+        if nxt == self._n:
+            nxt = 0
+        if nxt == self._tail:
+            self.dropped += 1
+            return False
+        slot = self._buf[h]
+        for i in range(len(values)):
+            slot[i] = values[i]
+        # Publish only after the slot is fully written.
+        self._head = nxt
+        return True
+
+    def push_from(self, src):
+        # Allocation-free variant of push() for the control side.
+        h = self._head
+        nxt = h + 1
+        if nxt == self._n:
+            nxt = 0
+        if nxt == self._tail:
+            self.dropped += 1
+            return False
+        slot = self._buf[h]
+        for i in range(self.width):
+            slot[i] = src[i]
+        self._head = nxt
+        return True
+
+    def pop_into(self, out):
+        t = self._tail
+        if t == self._head:
+            return False
+        src = self._buf[t]
+        for i in range(self.width):
+            out[i] = src[i]
+        t += 1
+        self._tail = 0 if t == self._n else t
+        return True
+
+    def latest_into(self, out):
+        """Drain everything, keep the newest record. Returns False if nothing was queued."""
+        got = False
+        while self.pop_into(out):
+            got = True
+        return got
+
+    def __len__(self):
+        return (self._head - self._tail) % self._n
+
+
+class Runtime:
+    """
+    tick(target, vel_ff) -> bool is the per-tick controller (pid_control.CascadeLoop.tick),
+    state_into(out) fills (pos, err, output, fault) after each tick, idle(slack_us) gets
+    the spare time (gc_policy.policy.idle).
+    """
+
+    def __init__(self, tick, state_into, idle=None, interval_us=1000, initial_target=0):
+        self._tick = tick
+        self._state_into = state_into
+        self._idle = idle
+        self.interval_us = interval_us
+        self.setpoints = SPSCRing(8, SP_WIDTH)
+        self.state = SPSCRing(8, ST_WIDTH)
+        self._sp = array('f', [initial_target, 0.0])
+        self._st = array('f', [0.0] * ST_WIDTH)
+        self._last_state = array('f', [0.0] * ST_WIDTH)
+        self._running = False
+        self._timer = None
+        self.ticks = 0
+        self.stopped = True
+        # Bound once here: creating a bound method inside the ISR would allocate.
+        self._scheduled_ref = self._scheduled
+
+    # ========== Network side ==========
+
+    def command(self, position, vel_ff=0.0):
+        return self.setpoints.push(position, vel_ff)
+
+    def read_state(self):
+        """Newest (pos, err, output, fault) published by the control side."""
+        ring = self.state
+        if len(ring) < ring._n - 1 or self.stopped:
+            ring.latest_into(self._last_state)
+            return self._last_state
+        # Full ring: nobody read for a while and the control side has been dropping the new
+        # records, so what is queued is old. Drain it and wait for the next tick's record.
+        ring.latest_into(self._last_state)
+        t0 = utime.ticks_us()
+        while not ring.latest_into(self._last_state):
+            if utime.ticks_diff(utime.ticks_us(), t0) > 3 * self.interval_us:
+                break
+            utime.sleep_us(100)
+        return self._last_state
+
+    def set_tick(self, tick, state_into):
+        """
+        Hand the control thread another per-tick controller (teach mode) from the next tick
+        on; returns the previous (tick, state_into) for putting back. The setpoint ring is
+        still read every tick, so push a fresh command before restoring a position loop.
+        """
+        old = (self._tick, self._state_into)
+        self._state_into = state_into
+        self._tick = tick
+        return old
+
+    # ========== Control side ==========
+
+    def _step(self):
+        self.setpoints.latest_into(self._sp)
+        ok = self._tick(int(self._sp[SP_POS]), self._sp[SP_VEL])
+        st = self._st
+        self._state_into(st)
+        # A full state ring just means nobody is reading; the control side never waits.
+        self.state.push_from(st)
+        self.ticks += 1
+        return ok
+
+    def _thread_main(self):
+        next_time = utime.ticks_us()
+        try:
+            while self._running:
+                self._step()
+                next_time = utime.ticks_add(next_time, self.interval_us)
+                if self._idle:
+                    self._idle(utime.ticks_diff(next_time, utime.ticks_us()))
+                wait = utime.ticks_diff(next_time, utime.ticks_us())
+                if wait > 0:
+                    utime.sleep_us(wait)
+                else:
+                    next_time = utime.ticks_us()
+        finally:
+            self.stopped = True
+
+    def start_thread(self, stack_size=8192):
+        self._running = True
+        self.stopped = False
+        try:
+            _thread.stack_size(stack_size)
+        except (AttributeError, ValueError):
+            pass
+        _thread.start_new_thread(self._thread_main, ())
+
+    def start_timer(self, timer_id=0):
+        # Timer ISR only schedules the tick; the tick itself runs as a soft callback.
+        self._running = True
+        self.stopped = False
+        self._timer = Timer(timer_id)
+        self._timer.init(period=max(1, self.interval_us // 1000), mode=Timer.PERIODIC, callback=self._isr)
+
+    def _isr(self, _t):
+        try:
+            micropython.schedule(self._scheduled_ref, 0)
+        except RuntimeError:
+            # Schedule queue full: the previous tick is still pending, skip this one.
+            pass
+
+    def _scheduled(self, _arg):
+        if self._running:
+            self._step()
+
+    def stop(self):
+        self._running = False
+        if self._timer is not None:
+            self._timer.deinit()
+            self._timer = None
+            self.stopped = True
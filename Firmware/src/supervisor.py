@@ -0,0 +1,108 @@
+# Safety supervisor, checked once per control tick.
+# Every check is a couple of compares and a counter update, so the cost is constant and
+# does not depend on history length. A fault latches: the motor-off callback runs once and
+# set_motor() refuses output until reset() is called (web API or chain bus).
+
+FAULT_NONE = 0
+FAULT_STALL = 1  # output saturated but the shaft is not moving
+FAULT_RUNAWAY = 2  # moving fast away from the target
+FAULT_ENCODER = 3  # consecutive invalid encoder reads (CRC / magnet status)
+FAULT_ESTOP = 4  # requested by the operator
+
+FAULT_NAMES = {
+    FAULT_NONE: "none",
+    FAULT_STALL: "stall",
+    FAULT_RUNAWAY: "runaway",
+    FAULT_ENCODER: "encoder",
+    FAULT_ESTOP: "estop",
+}
+
+
+class SafetyParam:
+    out_max = 1023.0
+    stall_out_frac = 0.9  # |output| above this fraction of out_max counts as saturated
+    stall_vel = 50.0  # counts/s below which the shaft is considered stopped
+    stall_ticks = 300
+    runaway_vel = 4000.0  # counts/s
+    runaway_err = 200  # only when this far from target, so normal overshoot is ignored
+    runaway_ticks = 50
+    encoder_fail_ticks = 5
+
+
+class Supervisor:
+
+    def __init__(self, param=None, on_trip=None):
+        self.param = param or SafetyParam()
+        self.on_trip = on_trip
+        self.fault = FAULT_NONE
+        self.trips = 0
+        self._stall = 0
+        self._runaway = 0
+        self._enc_fail = 0
+        self.encoder_errors = 0
+
+    @property
+    def tripped(self):
+        return self.fault != FAULT_NONE
+
+    def check(self, output, err, vel, encoder_ok=True):
+        """Call once per tick. Returns True when the joint may keep driving."""
+        if self.fault:
+            return False
+        p = self.param
+
+        if encoder_ok:
+            self._enc_fail = 0
+        else:
+            self.encoder_errors += 1
+            self._enc_fail += 1
+            if self._enc_fail >= p.encoder_fail_ticks:
+                self.trip(FAULT_ENCODER)
+                return False
+
+        av = vel if vel >= 0 else -vel
+        ao = output if output >= 0 else -output
+        if ao >= p.out_max * p.stall_out_frac and av < p.stall_vel:
+            self._stall += 1
+            if self._stall >= p.stall_ticks:
+                self.trip(FAULT_STALL)
+                return False
+        else:
+            self._stall = 0
+
+        # Away from target: velocity and error have opposite signs.
+        if av > p.runaway_vel and (err > p.runaway_err and vel < 0 or err < -p.runaway_err and vel > 0):
+            self._runaway += 1
+            if self._runaway >= p.runaway_ticks:
+                self.trip(FAULT_RUNAWAY)
+                return False
+        else:
+            self._runaway = 0
+        return True
+
+    def trip(self, fault):
+        if self.fault:
+            return
+        self.fault = fault
+        self.trips += 1
+        print("SAFETY TRIP:", FAULT_NAMES.get(fault, fault))
+        if self.on_trip:
+            self.on_trip()
+
+    def reset(self):
+        self.fault = FAULT_NONE
+        self._stall = 0
+        self._runaway = 0
+        self._enc_fail = 0
+
+    def status(self):
+        return {
+            "tripped": self.tripped,
+            "fault": FAULT_NAMES.get(self.fault, self.fault),
+            "trips": self.trips,
+            "encoder_errors": self.encoder_errors,
+        }
+
+
+# Shared instance: pid_control, the web server and the chain bus all look at this one.
+safety = Supervisor()
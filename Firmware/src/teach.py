@@ -0,0 +1,264 @@
+# Teach-and-replay for this node's joint.
+# While teaching, the joint position is sampled at a fixed rate into a preallocated ring;
+# the ring is drained into a streaming keyframe compressor that writes straight to flash,
+# so RAM use does not grow with the recording length. Replay reads keyframes back one at a
+# time and feeds them to motion.ProgramRunner (linear segments, optional time scaling).
+#
+# Compression: swing-door style keyframe decimation (every sample stays within `tolerance`
+# counts of the straight line between the kept keyframes), then each keyframe is stored as
+# varint(dt in sample intervals) + zigzag varint(position delta).
+#
+# File layout (little endian):
+#   "TR" | u8 version | u8 n_joints | u16 interval_ms | u32 n_keyframes | i32 start_pos
+#   n_keyframes x ( varint dt_samples | zigzag varint dpos )
+
+import struct
+import utime
+from array import array
+
+MAGIC = b"TR"
+VERSION = 1
+HEADER = "<BBHIi"
+HEADER_SIZE = 2 + struct.calcsize(HEADER)
+TEACH_FILE = "teach_%d.bin"
+DEFAULT_INTERVAL_MS = 20
+DEFAULT_TOLERANCE = 8  # counts
+DEFAULT_LEAD_IN_MS = 1000
+_POS_INF = float("inf")
+_NEG_INF = -_POS_INF
+
+# ========== Varint ==========
+
+
+def write_varint(f, buf, value):
+    # buf: preallocated bytearray(5), enough for 32 bits
+    n = 0
+    while True:
+        b = value & 0x7F
+        value >>= 7
+        if value:
+            buf[n] = b | 0x80
+            n += 1
+        else:
+            buf[n] = b
+            n += 1
+            break
+    f.write(memoryview(buf)[:n])
+    return n
+
+
+def zigzag(v):
+    return (v << 1) if v >= 0 else ((-v << 1) - 1)
+
+
+def unzigzag(u):
+    return (u >> 1) if not u & 1 else -((u + 1) >> 1)
+
+
+# ========== Recording ==========
+
+
+class Recorder:
+    """
+    read() -> counts is sampled every interval_ms by sample(now); samples wait in a
+    fixed ring until drain() moves them into the compressor. A full ring drops samples
+    and counts them in .dropped. sample() only writes _head and drain() only _tail, so
+    the control thread can sample while another thread drains to flash.
+    """
+
+    def __init__(self, read, interval_ms=DEFAULT_INTERVAL_MS, capacity=256):
+        self.read = read
+        self.interval_ms = interval_ms
+        self._buf = array('l', [0] * capacity)
+        self._n = capacity
+        self._head = 0
+        self._tail = 0
+        self._next = None
+        self.samples = 0
+        self.dropped = 0
+
+    def sample(self, now=None):
+        """Call as often as you like; takes a sample only when one is due. Returns True if it did."""
+        if now is None:
+            now = utime.ticks_ms()
+        if self._next is None:
+            self._next = now
+        late = utime.ticks_diff(now, self._next)
+        if late < 0:
+            return False
+        # Fall back into step after a stall instead of bursting to catch up.
+        self._next = utime.ticks_add(now if late >= self.interval_ms else self._next, self.interval_ms)
+        h = self._head + 1
+        if h == self._n:
+            h = 0
+        if h == self._tail:
+            self.dropped += 1
+            return True
+        self._buf[self._head] = self.read()
+        self._head = h
+        self.samples += 1
+        return True
+
+    def drain(self, sink):
+        """Pass every buffered sample to sink.add(); returns how many."""
+        n = 0
+        while self._tail != self._head:
+            sink.add(self._buf[self._tail])
+            t = self._tail + 1
+            self._tail = 0 if t == self._n else t
+            n += 1
+        return n
+
+
+class KeyframeWriter:
+    """Streaming swing-door compressor writing the TR format to an open binary file."""
+
+    def __init__(self, f, interval_ms=DEFAULT_INTERVAL_MS, tolerance=DEFAULT_TOLERANCE):
+        self.f = f
+        self.interval_ms = interval_ms
+        self.tol = tolerance
+        self.count = 0
+        self.bytes = HEADER_SIZE
+        self._vbuf = bytearray(5)
+        self._t = 0  # sample index of the newest sample
+        self._anchor = None  # (t, pos) of the last keyframe written
+        self._prev = None  # (t, pos) of the previous sample
+        self._lo = _NEG_INF
+        self._hi = _POS_INF
+        self._start = 0
+        f.write(MAGIC + struct.pack(HEADER, VERSION, 1, interval_ms, 0, 0))
+
+    def _emit(self, t, pos):
+        at, ap = self._anchor
+        self.bytes += write_varint(self.f, self._vbuf, t - at)
+        self.bytes += write_varint(self.f, self._vbuf, zigzag(pos - ap))
+        self.count += 1
+        self._anchor = (t, pos)
+
+    def add(self, pos):
+        t = self._t
+        self._t += 1
+        if self._anchor is None:
+            # The first sample is the start position kept in the header.
+            self._start = pos
+            self._anchor = (t, pos)
+            self._prev = None
+            self._lo = _NEG_INF
+            self._hi = _POS_INF
+            return
+        at, ap = self._anchor
+        dt = t - at
+        if self._prev is not None:
+            # A line from the anchor to this sample must pass within tol of every sample
+            # in between; if it cannot, the previous sample (which still could) is kept.
+            slope = (pos - ap) / dt
+            if slope < self._lo or slope > self._hi:
+                pt, pp = self._prev
+                self._emit(pt, pp)
+                at, ap = pt, pp
+                dt = t - at
+                self._lo = _NEG_INF
+                self._hi = _POS_INF
+        lo = (pos - self.tol - ap) / dt
+        hi = (pos + self.tol - ap) / dt
+        if lo > self._lo:
+            self._lo = lo
+        if hi < self._hi:
+            self._hi = hi
+        self._prev = (t, pos)
+
+    def close(self):
+        """Write the final keyframe and patch the header; does not close the file."""
+        if self._prev is not None:
+            self._emit(*self._prev)
+            self._prev = None
+        self.f.seek(0)
+        self.f.write(MAGIC + struct.pack(HEADER, VERSION, 1, self.interval_ms, self.count, self._start))
+        self.f.seek(self.bytes)
+        return self.count
+
+
+# ========== Replay ==========
+
+
+class KeyframeSteps:
+    """
+    motion.Program-compatible step list read from a TR file on demand: steps[i] is
+    (move_ms, (pos,)), scaled by 1/speed. Forward access decodes one keyframe at a time;
+    going back re-reads from the start. Step 0 is the lead-in to the recorded start pose.
+    """
+
+    def __init__(self, path, speed=1.0, lead_in_ms=DEFAULT_LEAD_IN_MS):
+        self.path = path
+        self.speed = speed
+        self.lead_in_ms = lead_in_ms
+        with open(path, "rb") as f:
+            head = f.read(HEADER_SIZE)
+        if head[:2] != MAGIC:
+            raise ValueError("Not a teach recording")
+        ver, nj, interval_ms, count, start = struct.unpack_from(HEADER, head, 2)
+        if ver != VERSION:
+            raise ValueError("Unsupported recording version %d" % ver)
+        self.n_joints = nj
+        self.interval_ms = interval_ms
+        self.count = count
+        self.start = start
+        self._f = None
+        self._rewind()
+
+    def _rewind(self):
+        if self._f:
+            self._f.close()
+        self._f = open(self.path, "rb")
+        self._f.seek(HEADER_SIZE)
+        self._i = 0
+        self._cur = (int(self.lead_in_ms / self.speed), (self.start, ))
+        self._pos = self.start
+
+    def _varint(self):
+        shift = 0
+        value = 0
+        while True:
+            b = self._f.read(1)
+            if not b:
+                raise ValueError("Truncated recording")
+            value |= (b[0] & 0x7F) << shift
+            if not b[0] & 0x80:
+                return value
+            shift += 7
+
+    def __len__(self):
+        return self.count + 1
+
+    def __getitem__(self, i):
+        if i < self._i:
+            self._rewind()
+        if not 0 <= i <= self.count:
+            raise IndexError(i)
+        while self._i < i:
+            dt = self._varint()
+            self._pos += unzigzag(self._varint())
+            self._cur = (int(dt * self.interval_ms / self.speed), (self._pos, ))
+            self._i += 1
+        return self._cur
+
+    def close(self):
+        if self._f:
+            self._f.close()
+            self._f = None
+
+
+class TeachProgram:
+    """Wraps KeyframeSteps as a motion.Program for ProgramRunner (use motion.linear)."""
+
+    def __init__(self, path, speed=1.0, lead_in_ms=DEFAULT_LEAD_IN_MS):
+        self.name = path
+        self.steps = KeyframeSteps(path, speed, lead_in_ms)
+        self.n_joints = self.steps.n_joints
+
+    def duration_ms(self):
+        steps = self.steps
+        return sum(steps[i][0] for i in range(len(steps)))
+
+    def close(self):
+        self.steps.close()
@@ -0,0 +1,49 @@
+# Binary per-tick telemetry for control runs, read back on the host by
+# miniarm_host.loganalyze. Fixed-size records go into a preallocated block that is written
+# out when full, so a tick costs one pack_into and the file grows in whole blocks.
+#
+# File layout (little endian):
+#   "TL" | u8 version | u8 n_fields | u16 interval_us | u16 names_len | names (comma separated)
+#   records: u32 t_us (ticks_us) | n_fields x f32
+
+import struct
+
+MAGIC = b"TL"
+VERSION = 1
+HEADER = "<BBHH"
+CASCADE_FIELDS = ("target", "pos", "err", "vel_cmd", "vel", "output", "fault")
+
+
+class TelemetryWriter:
+
+    def __init__(self, path, fields, interval_us=0, block_records=64):
+        self.fields = fields
+        self.n = len(fields)
+        self._fmt = "<I%df" % self.n
+        self._size = struct.calcsize(self._fmt)
+        self._block = bytearray(self._size * block_records)
+        self._mv = memoryview(self._block)
+        self._cap = block_records
+        self._used = 0
+        self.records = 0
+        names = ",".join(fields).encode()
+        self._f = open(path, "wb")
+        self._f.write(MAGIC + struct.pack(HEADER, VERSION, self.n, interval_us, len(names)) + names)
+
+    def add(self, t_us, *values):
+        struct.pack_into(self._fmt, self._block, self._used * self._size, t_us & 0xFFFFFFFF, *values)
+        self._used += 1
+        self.records += 1
+        if self._used == self._cap:
+            self.flush()
+
+    def flush(self):
+        if self._used:
+            self._f.write(self._mv[:self._used * self._size])
+            self._used = 0
+
+    def close(self):
+        if self._f:
+            self.flush()
+            self._f.close()
+            self._f = None
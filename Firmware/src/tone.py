@@ -0,0 +1,158 @@
+# Tones through the motor coil, without blocking.
+# A melody is compiled once into a flat event array of (freq Hz, duration ms) pairs, rests
+# and inter-note gaps included (freq 0). TonePlayer walks it from a one-shot machine.Timer:
+# each expiry schedules the next event (micropython.schedule, same split as runtime.py)
+# which retunes the PWM and re-arms the timer, so boot and the web server keep running
+# while a jingle plays. Replaces the blocking Play-note.play_sequence.
+#
+# The motor belongs to control first: play() refuses while busy() says the control loop
+# owns the output, and preempt() silences the player and restores the PWM frequency
+# before control takes over.
+
+import utime
+from array import array
+from machine import Timer
+
+try:
+    import micropython
+except ImportError:
+    micropython = None
+
+# degree -> Hz, as in Play-note.py: 1..7 = C4..B4, 11..17 = C5..B5, anything else rests
+DEGREE_FREQ = {
+    1: 261,
+    2: 294,
+    3: 329,
+    4: 349,
+    5: 392,
+    6: 440,
+    7: 494,
+    11: 523,
+    12: 587,
+    13: 659,
+    14: 698,
+    15: 784,
+    16: 880,
+    17: 988,
+}
+DEFAULT_GAP_MS = 20
+DEFAULT_POWER = 80  # on the ±1023 motor scale; well below breakaway, so the shaft stays put
+TONE_TIMER_ID = 1  # runtime.start_timer() uses 0
+
+
+def compile_sequence(sequence, gap_ms=DEFAULT_GAP_MS):
+    """[(degree, duration_s)] -> array('H') of freq, ms pairs."""
+    ev = array('H')
+    for degree, dur in sequence:
+        ev.append(DEGREE_FREQ.get(degree, 0))
+        ev.append(int(dur * 1000))
+        if gap_ms:
+            ev.append(0)
+            ev.append(gap_ms)
+    return ev
+
+
+def status_code(n, freq=880, on_ms=120, off_ms=120):
+    """n short beeps, for reporting a number (fault code, node index) by ear."""
+    ev = array('H')
+    for _ in range(n):
+        ev.append(freq)
+        ev.append(on_ms)
+        ev.append(0)
+        ev.append(off_ms)
+    return ev
+
+
+MOTOR_ON = compile_sequence([(7, 0.2), (13, 0.2), (17, 0.2)])
+READY = compile_sequence([(17, 0.15), (17, 0.15)])
+FAULT = compile_sequence([(5, 0.2), (3, 0.2), (1, 0.4)])
+
+
+class TonePlayer:
+    """
+    motor: motor_out.MotorOutput. busy() -> True while the control loop drives the motor.
+    on_done (per play()) runs once when the sequence ends or is preempted.
+    """
+
+    def __init__(self, motor, busy=None, power=DEFAULT_POWER, timer_id=TONE_TIMER_ID):
+        self.motor = motor
+        self.busy = busy
+        self.power = power
+        self.timer_id = timer_id
+        self._timer = None
+        self._ev = None
+        self._i = 0
+        self._saved_freq = motor.freq
+        self._on_done = None
+        self.active = False
+        # Bound once: creating a bound method inside the ISR would allocate.
+        self._advance_ref = self._advance
+        self._isr_ref = self._isr
+
+    def play(self, events, on_done=None):
+        """Start events (from compile_sequence/status_code); returns False if control owns the motor."""
+        if self.busy is not None and self.busy():
+            return False
+        if self.active:
+            self._finish()
+        if self._timer is None:
+            self._timer = Timer(self.timer_id)
+        self._ev = events
+        self._i = 0
+        self._on_done = on_done
+        self._saved_freq = self.motor.freq
+        self.active = True
+        self._advance(0)
+        return True
+
+    def _isr(self, _t):
+        if micropython is None:
+            self._advance(0)
+            return
+        try:
+            micropython.schedule(self._advance_ref, 0)
+        except RuntimeError:
+            # Queue full: retry on a short timer rather than drop the rest of the tune.
+            self._timer.init(period=1, mode=Timer.ONE_SHOT, callback=self._isr_ref)
+
+    def _advance(self, _arg):
+        if not self.active:
+            return
+        ev = self._ev
+        i = self._i
+        if i >= len(ev):
+            self._finish()
+            return
+        freq = ev[i]
+        ms = ev[i + 1]
+        self._i = i + 2
+        motor = self.motor
+        if freq:
+            motor.set_freq(freq)
+            motor.set(self.power)
+        else:
+            motor.set(0)
+        self._timer.init(period=max(1, ms), mode=Timer.ONE_SHOT, callback=self._isr_ref)
+
+    def _finish(self):
+        self.active = False
+        if self._timer is not None:
+            self._timer.deinit()
+        self.motor.set(0)
+        self.motor.set_freq(self._saved_freq)
+        done = self._on_done
+        self._on_done = None
+        if done is not None:
+            done()
+
+    def preempt(self):
+        """Silence now and hand the motor back; runs the pending on_done."""
+        if self.active:
+            self._finish()
+
+    def wait(self, timeout_ms=10000):
+        # For scripts and the REPL; boot code should use on_done instead.
+        t0 = utime.ticks_ms()
+        while self.active and utime.ticks_diff(utime.ticks_ms(), t0) < timeout_ms:
+            utime.sleep_ms(10)
+        return not self.active
@@ -1,7 +1,6 @@
 # main.py — ESP32-C3 (MicroPython 官方固件)
 # 仅在 STA 模式启用内置 mDNS（若可用），广播 esp-miniarm.local
 
-import network
 import socket
 import ujson
 import utime
@@ -10,6 +9,14 @@ import uos
 import gc
 import ubinascii
 
+import motion
+from supervisor import safety, FAULT_ESTOP
+from metrics import stats
+import gc_policy
+import config_store
+import api_batch
+from net_manager import NetManager, ST_STA_CONNECTED, ST_AP, AP_ESSID, AP_PASSWORD
+
 # ==================== 网页模板 ====================
 WEB_CONFIG = """
 <!DOCTYPE html>
@@ -180,67 +187,39 @@ WEB_SYSTEM_INFO = """
 
 
 # ==================== 配置管理 ====================
+# config.json 由 config_store 缓存并原子写入
 def load_config():
-    try:
-        with open('config.json', 'r') as f:
-            return ujson.load(f)
-    except:
-        return {"ssid": "", "password": ""}
+    return config_store.get("config")
 
 
 def save_config(ssid, password):
-    config = {"ssid": ssid, "password": password}
-    with open('config.json', 'w') as f:
-        ujson.dump(config, f)
+    config_store.update("config", ssid=ssid, password=password)
 
 
 # ==================== 网络连接 ====================
-def connect_wifi():
-    wlan = network.WLAN(network.STA_IF)
-    wlan.active(True)
-
-    # 提前设置我们希望的主机名（有的固件需要在连接前设置）
-    try:
-        wlan.config(hostname="esp-miniarm")
-        print("Set STA hostname=esp-miniarm")
-    except Exception:
-        try:
-            wlan.config(dhcp_hostname="esp-miniarm")
-            print("Set STA dhcp_hostname=esp-miniarm")
-        except Exception:
-            pass
-
-    config = load_config()
-    if config["ssid"]:
-        print("Connecting to WiFi:", config["ssid"])
-        wlan.connect(config["ssid"], config["password"] or None)
-
-        for _ in range(20):  # 最多等 20 秒
-            if wlan.isconnected():
-                print("Connected! IP:", wlan.ifconfig()[0])
-                return wlan, True
-            utime.sleep(1)
-
-    return wlan, False
-
-
-def start_ap_mode():
-    # AP 模式不启用 mDNS（按你的要求）
-    ap = network.WLAN(network.AP_IF)
-    ap.active(True)
-    ap.config(essid="RoboticArm_AP", password="12345678", authmode=network.AUTH_WPA_WPA2_PSK)
-    print("AP Mode. Connect to: RoboticArm_AP")
-    print("AP IP:", ap.ifconfig()[0])
-    return ap
+def _log_net_state(old, new, net):
+    print("[net] %s -> %s" % (old, new))
+    if new == ST_STA_CONNECTED:
+        print("Connected! IP:", net.ip())
+        if net.mdns_ok:
+            print("mDNS ready (builtin): %s.local" % net.hostname)
+        else:
+            print("mDNS API not available; hostname set. Many stacks still resolve %s.local" % net.hostname)
+    elif new == ST_AP:
+        # AP 模式不启用 mDNS（按你的要求）
+        print("AP Mode: Connect to '%s' with password '%s'" % (AP_ESSID, AP_PASSWORD))
+        print("Then visit: http://%s" % net.ip())
 
 
 def setup_network():
-    wlan, connected = connect_wifi()
-    if not connected:
-        print("Starting AP mode for configuration")
-        ap = start_ap_mode()
-        return ap, True  # 返回 AP 接口与“AP 模式标志”
-    return wlan, False  # 返回 STA 接口与“非 AP 模式标志”
+    # 非阻塞：只启动状态机，由 WebServer.run() 循环推进
+    config = load_config()
+    net = NetManager(config["ssid"],
+                     config["password"],
+                     on_state=_log_net_state,
+                     mdns_fn=try_start_builtin_mdns)
+    net.start()
+    return net
 
 
 # ==================== 仅在 STA 模式尝试启用内置 mDNS ====================
@@ -297,15 +276,63 @@ def try_start_builtin_mdns(hostname: str, wlan_iface):
 
 
 # ==================== 机械臂控制 ====================
+ARM_JOINTS = 3
+
+# 没有上传文件时使用的内置程序（单位：编码器计数）
+DEFAULT_PROGRAMS = {
+    1: motion.Program("Pick and Place", ARM_JOINTS, [(800, (0, 1200, -800)), (600, (0, 1800, -1400)),
+                                                     (800, (2000, 1200, -800)), (800, (0, 0, 0))]),
+    2: motion.Program("Custom Routine", ARM_JOINTS, [(1000, (1500, 0, 0)), (1000, (0, 0, 0))]),
+    3: motion.Program("Test Sequence", ARM_JOINTS, [(500, (400, 400, 400)), (500, (-400, -400, -400)),
+                                                    (500, (0, 0, 0))]),
+}
+PROGRAM_ESTOP = 4
+
+
 class RoboticArm:
 
     def __init__(self):
+        self.position = [0] * ARM_JOINTS
+        self.target = [0] * ARM_JOINTS
+        self.target_vel = [0.0] * ARM_JOINTS
+        self.store = motion.ProgramStore(defaults=DEFAULT_PROGRAMS)
+        self.runner = motion.ProgramRunner(self.set_target)
+        # 可选钩子：on_target(pos, vel) 把设定值送到控制环，
+        # read_position() 返回当前关节位置
+        self.on_target = None
+        self.read_position = None
+        # on_chain(payload) -> bytes：处理网关发来的 chain_proto 帧，返回要附加的状态
+        self.on_chain = None
+        # read_state() -> (pos, err, output, fault)：本关节控制环的最新状态
+        # （批量 API 的 state 查询）
+        self.read_state = None
         print("RoboticArm initialized")
 
-    def move_to_position(self, position):
-        print("Moving to position:", position)
+    def set_target(self, pos, vel):
+        # 由程序解释器调用；控制环从 target / target_vel 取设定值
+        for j in range(ARM_JOINTS):
+            self.target[j] = pos[j]
+            self.target_vel[j] = vel[j]
+        if self.on_target:
+            self.on_target(self.target, self.target_vel)
+
+    def start_program(self, program_id):
+        prog = self.store.get(program_id)
+        if prog is None:
+            return False
+        if safety.tripped:
+            raise RuntimeError("safety fault '%s' latched, reset first" % safety.status()["fault"])
+        if self.read_position:
+            self.position = list(self.read_position())
+        self.runner.start(prog, self.position, program_id)
+        return True
+
+    def step(self):
+        self.runner.step()
 
     def emergency_stop(self):
+        self.runner.stop()
+        safety.trip(FAULT_ESTOP)
         print("EMERGENCY STOP ACTIVATED!")
 
 
@@ -313,59 +340,151 @@ arm = RoboticArm()
 
 
 def execute_program(program_id):
+    # 非阻塞：只启动程序，由 arm.step() 推进
     try:
-        if program_id == 1:
-            arm.move_to_position("pickup")
-            return "Program 1 completed successfully"
-        elif program_id == 2:
-            arm.move_to_position("position1")
-            return "Program 2 completed successfully"
-        elif program_id == 3:
-            arm.move_to_position("123123")
-            return "Program 3 completed successfully"
-        elif program_id == 4:
+        if program_id == PROGRAM_ESTOP:
             arm.emergency_stop()
             return "EMERGENCY STOP activated"
-        else:
-            return "Unknown program ID: %s" % program_id
+        if arm.start_program(program_id):
+            return "Program %d started" % program_id
+        return "Unknown program ID: %s" % program_id
     except Exception as e:
         return "Error executing program: %s" % str(e)
 
 
 # ==================== Web服务器 ====================
+ACCEPT_TIMEOUT_S = 0.02  # also paces arm.step() while idle
+CLIENT_TIMEOUT_S = 2  # 单个请求的读写上限，避免慢客户端卡住 arm.step()
+FS_CACHE_S = 10  # statvfs 结果缓存时间；写文件后立即失效
+
+
 class WebServer:
 
-    def __init__(self):
-        self.ap_mode = False
-        self.wlan, self.ap_mode = setup_network()
+    def __init__(self, net=None):
+        self.net = net or setup_network()
         self.start_time = utime.time()
+        # 静态信息只算一次（设备 ID、存储总量），剩余空间按 FS_CACHE_S 缓存
+        self._device_id = None
+        self._fs_kb = None
+        self._fs_time = 0
+
+    @property
+    def ap_mode(self):
+        return self.net.is_ap()
 
     def get_uptime(self):
         return utime.time() - self.start_time
 
+    def device_id(self):
+        if self._device_id is None:
+            try:
+                self._device_id = ubinascii.hexlify(machine.unique_id()).decode()
+            except:
+                self._device_id = "unknown"
+        return self._device_id
+
+    def storage_kb(self):
+        # (free, total) KB；失败时为 None
+        now = utime.time()
+        if self._fs_kb is None or now - self._fs_time >= FS_CACHE_S:
+            try:
+                fs_stat = uos.statvfs('/')
+                block_size = fs_stat[0]
+                self._fs_kb = ((block_size * fs_stat[3]) // 1024, (block_size * fs_stat[2]) // 1024)
+            except:
+                self._fs_kb = None
+            self._fs_time = now
+        return self._fs_kb
+
+    def storage_changed(self):
+        self._fs_kb = None
+
     def get_system_info(self):
-        try:
-            device_id = ubinascii.hexlify(machine.unique_id()).decode()
-        except:
-            device_id = "unknown"
-        free_mem = gc.mem_free()
-        try:
-            fs_stat = uos.statvfs('/')
-            block_size = fs_stat[0]
-            total_blocks = fs_stat[2]
-            free_blocks = fs_stat[3]
-            total_size = (block_size * total_blocks) // 1024
-            free_size = (block_size * free_blocks) // 1024
-            storage_info = "%dKB free / %dKB total" % (free_size, total_size)
-        except:
+        fs = self.storage_kb()
+        if fs is None:
             storage_info = "unknown"
+            fs = (0, 0)
+        else:
+            storage_info = "%dKB free / %dKB total" % fs
         return {
-            "device_id": device_id,
-            "free_memory": free_mem,
+            "device_id": self.device_id(),
+            "free_memory": gc.mem_free(),
             "storage": storage_info,
+            "storage_free_kb": fs[0],
+            "storage_total_kb": fs[1],
             "uptime": int(self.get_uptime())
         }
 
+    # ==================== 批量 API ====================
+    def query(self, name):
+        if name == "system":
+            return self.get_system_info()
+        if name == "uptime":
+            return int(self.get_uptime())
+        if name == "position":
+            return list(arm.read_position()) if arm.read_position else arm.position
+        if name == "target":
+            return arm.target
+        if name == "state":
+            return list(arm.read_state()) if arm.read_state else [0, 0.0, 0.0, safety.fault]
+        if name == "safety":
+            return safety.status()
+        if name == "program_status":
+            return arm.runner.status()
+        if name == "metrics":
+            return dict(stats.snapshot())
+        raise ValueError("Unknown query: %s" % name)
+
+    def run_command(self, cmd):
+        op = cmd.get("op")
+        if op == "target":
+            pos = cmd["pos"]
+            arm.set_target(pos, cmd.get("vel") or [0.0] * len(pos))
+            return "ok"
+        if op == "execute":
+            return execute_program(int(cmd["program"]))
+        if op == "estop":
+            arm.emergency_stop()
+            return "ok"
+        if op == "safety_reset":
+            safety.reset()
+            return "ok"
+        return "error: unknown op %s" % op
+
+    def wants_binary(self, request):
+        for line in request.split('\r\n'):
+            if line.lower().startswith('accept:'):
+                return api_batch.CONTENT_TYPE in line
+            if not line:
+                break
+        return False
+
+    def handle_batch(self, client_socket, request, method):
+        # GET /api/batch?q=a,b  或  POST /api/batch  {"q": [...], "do": [...]}
+        if method == 'POST':
+            data = ujson.loads(self.read_body(client_socket, request) or '{}')
+            queries = [q for q in data.get('q', ()) if q in api_batch.QUERY_IDS]
+            commands = data.get('do')
+        else:
+            queries = api_batch.parse_queries(self.parse_query(request).get('q', ''))
+            commands = None
+        done = None
+        if commands:
+            done = []
+            for cmd in commands:
+                try:
+                    done.append(self.run_command(cmd))
+                except Exception as e:
+                    done.append("error: %s" % e)
+        results = [(q, self.query(q)) for q in queries]
+        if self.wants_binary(request):
+            self.send_response(client_socket, api_batch.encode(results, done), api_batch.CONTENT_TYPE)
+            return
+        out = dict(results)
+        if done is not None:
+            out['do'] = done
+        self.send_json_response(client_socket, out)
+
     def parse_request(self, request):
         lines = request.split('\r\n')
         if lines:
@@ -376,7 +495,46 @@ class WebServer:
                 return method, path
         return None, None
 
+    def parse_query(self, request):
+        first_line = request.split('\r\n', 1)[0]
+        params = {}
+        if '?' in first_line:
+            query_str = first_line.split('?', 1)[1].split(' ')[0]
+            for pair in query_str.split('&'):
+                if '=' in pair:
+                    key, value = pair.split('=', 1)
+                    params[key] = value
+        return params
+
+    def read_body(self, client_socket, request):
+        content_length = 0
+        for line in request.split('\r\n'):
+            if line.lower().startswith('content-length:'):
+                content_length = int(line.split(':', 1)[1].strip())
+                break
+        body = request.split('\r\n\r\n', 1)[1] if '\r\n\r\n' in request else ''
+        while len(body) < content_length:
+            chunk = client_socket.recv(min(content_length - len(body), 1024))
+            if not chunk:
+                break
+            body += chunk.decode('utf-8')
+        return body
+
     def handle_request(self, client_socket, addr):
+        t0 = utime.ticks_us()
+        self._handle_request(client_socket, addr)
+        stats.record_request(utime.ticks_diff(utime.ticks_us(), t0))
+
+    def get_metrics(self):
+        extra = [
+            ("uptime_s", int(self.get_uptime())),
+            ("safety_tripped", int(safety.tripped)),
+            ("safety_trips", safety.trips),
+            ("ap_mode", int(self.ap_mode)),
+        ]
+        return stats.format(extra)
+
+    def _handle_request(self, client_socket, addr):
         try:
             request = client_socket.recv(1024).decode('utf-8')
             if not request:
@@ -398,11 +556,32 @@ class WebServer:
                     self.send_json_response(client_socket, info)
                 elif path.startswith('/api/execute'):
                     self.handle_execute(client_socket, request)
+                elif path == '/api/programs':
+                    self.send_json_response(client_socket, arm.store.list())
+                elif path == '/api/program':
+                    self.handle_get_program(client_socket, request)
+                elif path == '/api/program_status':
+                    self.send_json_response(client_socket, arm.runner.status())
+                elif path == '/api/metrics':
+                    self.send_response(client_socket, self.get_metrics(), 'text/plain')
+                elif path == '/api/safety':
+                    self.send_json_response(client_socket, safety.status())
+                elif path == '/api/batch':
+                    self.handle_batch(client_socket, request, method)
                 else:
                     self.send_response(client_socket, 'Not found', 'text/plain', 404)
             elif method == 'POST':
                 if path == '/api/config':
                     self.handle_config(client_socket, request)
+                elif path == '/api/program':
+                    self.handle_put_program(client_socket, request)
+                elif path == '/api/chain':
+                    self.handle_chain(client_socket, request)
+                elif path == '/api/batch':
+                    self.handle_batch(client_socket, request, method)
+                elif path == '/api/safety/reset':
+                    safety.reset()
+                    self.send_json_response(client_socket, {'status': 'success', 'message': 'Safety reset'})
                 else:
                     self.send_response(client_socket, 'Not found', 'text/plain', 404)
             else:
@@ -415,17 +594,10 @@ class WebServer:
                 client_socket.close()
 
     def handle_execute(self, client_socket, request):
-        lines = request.split('\r\n')
-        first_line = lines[0]
-        if '?' in first_line:
-            query_str = first_line.split('?')[1].split(' ')[0]
-            params = {}
-            for pair in query_str.split('&'):
-                if '=' in pair:
-                    key, value = pair.split('=', 1)
-                    params[key] = value
+        params = self.parse_query(request)
+        if 'program' in params:
             try:
-                program_id = int(params.get('program', 1))
+                program_id = int(params['program'])
             except:
                 program_id = 1
             result = execute_program(program_id)
@@ -434,19 +606,41 @@ class WebServer:
             response = {'status': 'error', 'message': 'No program specified'}
         self.send_json_response(client_socket, response)
 
+    def handle_get_program(self, client_socket, request):
+        try:
+            prog = arm.store.get(int(self.parse_query(request).get('id', '')))
+        except ValueError:
+            prog = None
+        if prog is None:
+            self.send_response(client_socket, 'Not found', 'text/plain', 404)
+        else:
+            self.send_json_response(client_socket, prog.to_json())
+
+    def handle_put_program(self, client_socket, request):
+        # POST /api/program?id=N  body: {"name": ..., "steps": [{"ms": 500, "pos": [..]}, ...]}
+        try:
+            program_id = int(self.parse_query(request)['id'])
+            prog = motion.Program.from_json(ujson.loads(self.read_body(client_socket, request)))
+            arm.store.put(program_id, prog)
+            self.storage_changed()
+            msg = 'Program %d saved (%d steps)' % (program_id, len(prog.steps))
+            response = {'status': 'success', 'message': msg}
+        except Exception as e:
+            response = {'status': 'error', 'message': 'Program error: %s' % str(e)}
+        self.send_json_response(client_socket, response)
+
+    def handle_chain(self, client_socket, request):
+        # POST /api/chain  body: chain_proto 帧内容；返回同一帧并附加本关节状态
+        # （主机网关的 TCP 通道）
+        payload = self.read_body(client_socket, request).encode()
+        if arm.on_chain is None:
+            self.send_response(client_socket, 'Chain not attached', 'text/plain', 503)
+            return
+        self.send_response(client_socket, (payload + arm.on_chain(payload)).decode(), 'text/plain')
+
     def handle_config(self, client_socket, request):
         try:
-            content_length = 0
-            lines = request.split('\r\n')
-            for line in lines:
-                if line.startswith('Content-Length:'):
-                    content_length = int(line.split(':', 1)[1].strip())
-                    break
-            body = request.split('\r\n\r\n', 1)[1]
-            if len(body) < content_length:
-                remaining = content_length - len(body)
-                body += client_socket.recv(remaining).decode('utf-8')
-            data = ujson.loads(body)
+            data = ujson.loads(self.read_body(client_socket, request))
             save_config(data.get('ssid', ''), data.get('password', ''))
             response = {'status': 'success', 'message': 'WiFi config saved. Device will reboot...'}
             self.send_json_response(client_socket, response)
@@ -457,11 +651,12 @@ class WebServer:
             self.send_json_response(client_socket, response)
 
     def send_response(self, client_socket, content, content_type='text/html', status_code=200):
-        response = "HTTP/1.1 %d OK\r\n" % status_code
-        response += "Content-Type: %s\r\n" % content_type
-        response += "Connection: close\r\n\r\n"
-        response += content
-        client_socket.send(response.encode('utf-8'))
+        # content 可以是 str 或 bytes（二进制批量响应）
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        head = "HTTP/1.1 %d OK\r\nContent-Type: %s\r\nContent-Length: %d\r\nConnection: close\r\n\r\n" % (
+            status_code, content_type, len(content))
+        client_socket.send(head.encode('utf-8') + content)
         client_socket.close()
 
     def send_json_response(self, client_socket, data):
@@ -475,23 +670,23 @@ class WebServer:
             pass
         server_socket.bind(('0.0.0.0', 80))
         server_socket.listen(5)
+        # 短超时的 accept，让网络状态机在等待请求的同时继续推进
+        server_socket.settimeout(ACCEPT_TIMEOUT_S)
 
         print("Web server started on port 80")
-        if self.ap_mode:
-            print("AP Mode: Connect to 'RoboticArm_AP' with password '12345678'")
-            print("Then visit: http://192.168.4.1")
-        else:
-            # 仅在 STA 模式启用 mDNS
-            hostname = "esp-miniarm"
-            print("STA Mode: Configuring mDNS for %s.local ..." % hostname)
-            if try_start_builtin_mdns(hostname, self.wlan):
-                print("mDNS ready (builtin): %s.local" % hostname)
-            else:
-                print("mDNS API not available; hostname set. Many stacks still resolve %s.local" % hostname)
 
         while True:
+            self.net.step()
+            arm.step()
+            # 网络线程只判断是否该回收，回收本身在控制线程 tick 之后的空闲时间里做
+            gc_policy.policy.background()
             try:
                 client_socket, addr = server_socket.accept()
+            except OSError:
+                # accept 超时
+                continue
+            try:
+                client_socket.settimeout(CLIENT_TIMEOUT_S)
                 self.handle_request(client_socket, addr)
             except Exception as e:
                 print("Server error:", e)
@@ -500,7 +695,8 @@ class WebServer:
 
 # ==================== 主程序 ====================
 def main():
-    gc.collect()
+    gc_policy.configure()
+    gc_policy.collect()
     print("Free memory:", gc.mem_free())
     server = WebServer()
     server.run()